@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -*- mode: python -*-
+"""
+:mod:`dependency_manager.artifact_downloader` -- parallel artifact downloads
+============================================================================
+
+===================
+Artifact Downloader
+===================
+
+Contains class used to download artifacts from jenkins.
+
+Artifacts are downloaded by a bounded number of worker threads over the
+pooled connections of a JenkinsClient. Each response is streamed to disk
+in chunks, into a partial file which is renamed when the download is
+complete. Connection errors and server errors are retried, and the
+throughput of each file and of the whole download is logged.
+
+The md5 sum of each artifact is computed while it is streamed, and is
+checked against the md5 file of the artifact as soon as both are on disk.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .common import die
+from .common import NullHandler
+from .common import verify_md5
+from .jenkins_client import get_client
+
+# define logger
+logger = logging.getLogger("dbc." + __name__)
+logger.addHandler(NullHandler())
+
+DOWNLOAD_WORKERS = 8
+CHUNK_SIZE = 1024 * 1024
+RETRIES = 3
+RETRY_DELAY = 2
+
+
+class TransientDownloadError(Exception):
+    """ Exception class to signal a download failure worth retrying
+    """
+    pass
+
+
+TRANSIENT_ERRORS = (TransientDownloadError,
+                    requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout,
+                    requests.exceptions.ChunkedEncodingError)
+
+
+class ArtifactDownloader(object):
+    """ Bounded concurrency downloader streaming artifacts to disk
+    """
+    def __init__(self, jenkins_client=None, max_workers=DOWNLOAD_WORKERS, retries=RETRIES, retry_delay=RETRY_DELAY, chunk_size=CHUNK_SIZE):
+        """ Initializes artifact downloader
+
+            :param jenkins_client: JenkinsClient whose pooled session is
+                                   used. If not specified, the process wide
+                                   client is used.
+            :param max_workers: Maximum number of concurrent downloads.
+            :param retries: Number of times a transient failure is retried.
+            :param retry_delay: Seconds to wait before first retry, doubled
+                                for each following retry.
+            :param chunk_size: Number of bytes written to disk at a time.
+        """
+        self.client = jenkins_client
+        if self.client is None:
+            self.client = get_client()
+        self.max_workers = max_workers
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.chunk_size = chunk_size
+        self.md5_sums = {}
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def download_all(self, downloads):
+        """ Downloads urls to paths, using up to max_workers threads
+
+            :param downloads: list of (url, path) tuples
+            :return: list of downloaded sizes in bytes, in the order of downloads
+        """
+        downloads = list(downloads)
+        if not downloads:
+            return []
+
+        start = time.time()
+        self._pending.update([path for url, path in downloads])
+        workers = max(1, min(self.max_workers, len(downloads)))
+        logger.info("Downloading %s artifacts with %s workers" % (len(downloads), workers))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            sizes = list(executor.map(lambda x: self.download(*x), downloads))
+
+        elapsed = time.time() - start
+        logger.info("Downloaded %s artifacts, %s in %.1f s (%s)" %
+                    (len(downloads), format_size(sum(sizes)), elapsed, format_throughput(sum(sizes), elapsed)))
+        return sizes
+
+    def download(self, url, path):
+        """ Downloads url to path, retrying transient failures.
+            The md5 sum of the artifact is kept in md5_sums.
+
+            :return: downloaded size in bytes
+        """
+        size, md5 = self._retry(self._download, url, path)
+        self._check(path, md5)
+        return size
+
+    def open(self, url):
+        """ Opens streamed response for url, retrying transient failures.
+            Failures after content is read from the response are not retried.
+
+            :return: requests response. The caller must close it.
+        """
+        return self._retry(self._open, url)
+
+    def _retry(self, function, url, *args):
+        """ Calls function with url and args, retrying transient failures """
+        delay = self.retry_delay
+        for attempt in range(self.retries + 1):
+            try:
+                return function(url, *args)
+            except TRANSIENT_ERRORS as e:
+                if attempt == self.retries:
+                    die("Could not download '%s' after %s attempts: %s" % (url, attempt + 1, e))
+                logger.warning("Download of '%s' failed (%s), retrying in %s s" % (url, e, delay))
+                time.sleep(delay)
+                delay *= 2
+
+    def _open(self, url):
+        response = self.client.get(url, stream=True)
+        if response.status_code >= 500:
+            response.close()
+            raise TransientDownloadError("server answered %s" % response.status_code)
+        if response.status_code != requests.codes.ok:
+            response.close()
+            die("Could not download '%s', server answered %s" % (url, response.status_code))
+        return response
+
+    def _download(self, url, path):
+        """ Streams url into a partial file, which is renamed to path when complete
+
+            :return: tuple of downloaded size in bytes and md5 sum
+        """
+        logger.debug("downloading '%s' to '%s'" % (url, path))
+        start = time.time()
+        size = 0
+        md5 = hashlib.md5()
+        partial_path = path + '.part'
+
+        response = self._open(url)
+        try:
+            with open(partial_path, 'wb') as fh:
+                for chunk in response.iter_content(self.chunk_size):
+                    fh.write(chunk)
+                    md5.update(chunk)
+                    size += len(chunk)
+            os.replace(partial_path, path)
+        finally:
+            response.close()
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+
+        elapsed = time.time() - start
+        logger.info("downloaded '%s', %s in %.1f s (%s)" % (os.path.basename(path), format_size(size), elapsed, format_throughput(size, elapsed)))
+        return size, md5.hexdigest()
+
+    def _check(self, path, md5):
+        """ Records md5 sum of path, and verifies the artifact against its
+            md5 file once both the artifact and the md5 file are downloaded.
+            An md5 file not downloaded by this downloader is used if it exists.
+        """
+        artifact_path = path[:-len('.md5')] if path.endswith('.md5') else path
+        md5_path = artifact_path + '.md5'
+        with self._lock:
+            self.md5_sums[path] = md5
+            if artifact_path not in self.md5_sums:
+                return
+            if md5_path in self._pending and md5_path not in self.md5_sums:
+                return
+            if not os.path.exists(md5_path):
+                return
+        verify_md5(artifact_path, self.md5_sums[artifact_path])
+
+
+class ResponseReader(object):
+    """ Read only file object over a streamed response, computing the md5
+        sum of the content as it is read
+    """
+    def __init__(self, response, chunk_size=CHUNK_SIZE):
+        self.md5 = hashlib.md5()
+        self.size = 0
+        self._chunks = response.iter_content(chunk_size)
+        self._chunk = b''
+        self._position = 0
+
+    def read(self, size=-1):
+        """ Reads up to size bytes, or all remaining content if size is negative """
+        parts = []
+        while size != 0:
+            if self._position >= len(self._chunk):
+                self._chunk = next(self._chunks, None)
+                self._position = 0
+                if self._chunk is None:
+                    self._chunk = b''
+                    break
+                continue
+            end = len(self._chunk) if size < 0 else min(len(self._chunk), self._position + size)
+            parts.append(self._chunk[self._position:end])
+            if size > 0:
+                size -= end - self._position
+            self._position = end
+
+        data = b''.join(parts)
+        self.md5.update(data)
+        self.size += len(data)
+        return data
+
+
+def download_files(downloads, jenkins_client=None, max_workers=DOWNLOAD_WORKERS):
+    """ Downloads urls to paths with an ArtifactDownloader
+
+        :param downloads: list of (url, path) tuples
+        :return: dictionary of md5 sums by downloaded path
+    """
+    downloader = ArtifactDownloader(jenkins_client, max_workers=max_workers)
+    downloader.download_all(downloads)
+    return downloader.md5_sums
+
+
+def format_size(size):
+    """ Formats number of bytes for humans """
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            break
+        size /= 1024.0
+    return "%.1f %s" % (size, unit)
+
+
+def format_throughput(size, elapsed):
+    """ Formats throughput of size bytes in elapsed seconds for humans """
+    if elapsed <= 0:
+        return "- /s"
+    return "%s/s" % format_size(size / elapsed)
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -*- mode: python -*-
+"""
+:mod:`dependency_manager.artifact_selector` -- artifact filename selection
+==========================================================================
+
+=================
+Artifact Selector
+=================
+
+Contains class used to match artifact filenames against a set of patterns.
+
+Patterns have the semantics of re.match, ie. they are anchored at the
+start of the filename only. Patterns are compiled once. Patterns without
+regular expression syntax are literal prefixes, or literal filenames if
+they end with '$', and are looked up in sets instead of being matched.
+
+The selector reports which pattern matched a filename, so several
+selections, eg. download filtering and symlink creation, can be made in
+a single pass over the artifacts::
+
+    selector = ArtifactSelector(['foo-.*\\.jar', 'bar\\.war$'])
+    selector.match('bar.war')  # -> 1
+"""
+import collections
+import logging
+import re
+
+from .common import NullHandler
+
+# define logger
+logger = logging.getLogger("dbc." + __name__)
+logger.addHandler(NullHandler())
+
+_SPECIAL_CHARACTERS = set('.^$*+?{}[]\\|()')
+
+
+class ArtifactSelector(object):
+    """ Compiled set of filename patterns
+    """
+    def __init__(self, patterns):
+        """ Initializes selector
+
+            :param patterns: list of regular expressions
+        """
+        self.patterns = list(patterns)
+        self._exact = {}
+        self._prefixes = collections.defaultdict(dict)
+        self._expressions = []
+
+        for index, pattern in enumerate(self.patterns):
+            literal = literal_pattern(pattern)
+            if literal is None:
+                self._expressions.append((index, re.compile(pattern)))
+            elif literal[1]:
+                self._exact.setdefault(literal[0], index)
+            else:
+                self._prefixes[len(literal[0])].setdefault(literal[0], index)
+        self._prefix_lengths = sorted(self._prefixes)
+
+        logger.debug("Compiled %s patterns, %s literal" % (len(self.patterns), len(self.patterns) - len(self._expressions)))
+
+    def match(self, name):
+        """ Finds the first pattern matching name
+
+            :return: index of the first matching pattern, or None
+        """
+        index = self._match_literals(name)
+        for expression_index, expression in self._expressions:
+            if index is not None and expression_index > index:
+                break
+            if expression.match(name):
+                return expression_index
+        return index
+
+    def match_all(self, name):
+        """ Finds all patterns matching name
+
+            :return: sorted list of indexes of matching patterns
+        """
+        indexes = []
+        if name in self._exact:
+            indexes.append(self._exact[name])
+        for length in self._prefix_lengths:
+            if length > len(name):
+                break
+            if name[:length] in self._prefixes[length]:
+                indexes.append(self._prefixes[length][name[:length]])
+        indexes += [index for index, expression in self._expressions if expression.match(name)]
+        return sorted(indexes)
+
+    def select(self, names):
+        """ Selects the names matching any pattern
+
+            :return: list of (name, index of first matching pattern) tuples
+        """
+        selected = []
+        for name in names:
+            index = self.match(name)
+            if index is not None:
+                selected.append((name, index))
+        return selected
+
+    def _match_literals(self, name):
+        """ Finds the first literal pattern matching name, or None """
+        index = self._exact.get(name)
+        for length in self._prefix_lengths:
+            if length > len(name):
+                break
+            prefix_index = self._prefixes[length].get(name[:length])
+            if prefix_index is not None and (index is None or prefix_index < index):
+                index = prefix_index
+        return index
+
+
+def create_selector(pattern):
+    """ Creates ArtifactSelector from a single pattern, a list of patterns,
+        or returns pattern if it is already a selector
+    """
+    if isinstance(pattern, ArtifactSelector):
+        return pattern
+    if isinstance(pattern, str):
+        return ArtifactSelector([pattern])
+    return ArtifactSelector(pattern)
+
+
+def literal_pattern(pattern):
+    """ Finds the literal text of pattern if it has no regular expression syntax
+
+        :return: tuple of literal text and whether pattern ends with '$', or
+                 None if pattern is not a literal
+    """
+    chars = []
+    position = 0
+    while position < len(pattern):
+        char = pattern[position]
+        if char == '\\':
+            if position + 1 == len(pattern) or pattern[position + 1].isalnum():
+                return None
+            chars.append(pattern[position + 1])
+            position += 2
+            continue
+        if char == '$' and position == len(pattern) - 1:
+            return ''.join(chars), True
+        if char in _SPECIAL_CHARACTERS:
+            return None
+        chars.append(char)
+        position += 1
+    return ''.join(chars), False
@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -*- mode: python -*-
+"""
+:mod:`dependency_manager.artifact_store` -- local store of downloaded artifacts
+===============================================================================
+
+==============
+Artifact Store
+==============
+
+Contains class used to keep downloaded artifacts between runs.
+
+Artifacts are stored once per content, named by their md5 sum, and can
+be found both by the (job, build, filename) they were downloaded as and
+by their md5 sum. Artifacts are copied into the store, and copied from
+the store into a target folder, so a placed artifact never shares its
+content with the stored file and can be changed without affecting later
+runs. Stored files are made read-only.
+
+The total size of the store is capped, and the least recently used
+artifacts are evicted, together with the keys referring to them, when
+the cap is exceeded.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import stat
+import tempfile
+import threading
+
+from .common import NullHandler
+from .common import md5_sum
+from .common import read_md5_file
+
+# define logger
+logger = logging.getLogger("dbc." + __name__)
+logger.addHandler(NullHandler())
+
+DEFAULT_STORE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'dependency-manager-artifacts')
+MAX_SIZE = 10 * 1024 * 1024 * 1024
+
+
+class ArtifactStore(object):
+    """ Size capped content addressed artifact store with least recently used eviction
+    """
+    def __init__(self, directory, max_size=MAX_SIZE):
+        """ Initializes artifact store
+
+            :param directory: folder holding the stored artifacts. Created
+                              if it does not exist.
+            :param max_size: maximum total size in bytes of stored artifacts
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self.objects_directory = os.path.join(directory, 'objects')
+        self.keys_directory = os.path.join(directory, 'keys')
+        self._lock = threading.Lock()
+
+        for folder in (self.objects_directory, self.keys_directory):
+            if not os.path.exists(folder):
+                os.makedirs(folder)
+
+        self._sizes = {}
+        for md5 in os.listdir(self.objects_directory):
+            self._sizes[md5] = os.path.getsize(os.path.join(self.objects_directory, md5))
+        self._size = sum(self._sizes.values())
+
+    def get(self, key):
+        """ Retrieves path of the artifact stored for key
+
+            :param key: tuple of job name, build number and filename
+            :return: path of stored artifact, or None if not stored
+        """
+        try:
+            with open(self._key_path(key)) as fh:
+                md5 = json.load(fh)['md5']
+        except (IOError, OSError, ValueError, KeyError):
+            return None
+        return self.find(md5)
+
+    def find(self, md5):
+        """ Retrieves path of the artifact stored with md5 sum
+
+            :return: path of stored artifact, or None if not stored
+        """
+        path = os.path.join(self.objects_directory, md5)
+        try:
+            os.utime(path, None)
+        except OSError:
+            return None
+        return path
+
+    def add(self, key, path, md5=None):
+        """ Stores the file at path for key
+
+            :param key: tuple of job name, build number and filename
+            :param path: path of the downloaded file. The file is copied
+                         into the store.
+            :param md5: md5 sum of the file, computed if not specified
+            :return: md5 sum of the file
+        """
+        if md5 is None:
+            md5 = md5_sum(path)
+
+        object_path = os.path.join(self.objects_directory, md5)
+        if not os.path.exists(object_path):
+            fd, tmp_path = tempfile.mkstemp(dir=self.objects_directory, prefix='.', suffix='.tmp')
+            os.close(fd)
+            os.remove(tmp_path)
+            shutil.copyfile(path, tmp_path)
+            os.chmod(tmp_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+            os.replace(tmp_path, object_path)
+
+            with self._lock:
+                size = os.path.getsize(object_path)
+                self._size += size - self._sizes.get(md5, 0)
+                self._sizes[md5] = size
+
+        self._write_key(key, md5)
+
+        with self._lock:
+            if self._size > self.max_size:
+                self._evict()
+        return md5
+
+    def fetch(self, key, target_path):
+        """ Places the artifact stored for key at target_path
+
+            :return: md5 sum of the placed artifact, or None if not stored
+        """
+        return self._place(self.get(key), target_path)
+
+    def fetch_md5(self, md5, target_path):
+        """ Places the artifact stored with md5 sum at target_path
+
+            :return: md5 sum of the placed artifact, or None if not stored
+        """
+        return self._place(self.find(md5), target_path)
+
+    def _place(self, object_path, target_path):
+        if object_path is None:
+            return None
+        if os.path.lexists(target_path):
+            os.remove(target_path)
+        md5 = os.path.basename(object_path)
+        logger.debug("Using stored artifact %s for %s" % (md5, target_path))
+        shutil.copyfile(object_path, target_path)
+        return md5
+
+    def _write_key(self, key, md5):
+        fd, tmp_path = tempfile.mkstemp(dir=self.keys_directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as fh:
+            json.dump({'key': list(key), 'md5': md5}, fh)
+        os.replace(tmp_path, self._key_path(key))
+
+    def _key_path(self, key):
+        name = hashlib.sha1(json.dumps(list(key)).encode('utf-8')).hexdigest()
+        return os.path.join(self.keys_directory, name)
+
+    def _evict(self):
+        """ Removes least recently used artifacts until store is below its size cap,
+            and the keys referring to removed artifacts
+        """
+        def last_used(md5):
+            try:
+                return os.path.getmtime(os.path.join(self.objects_directory, md5))
+            except OSError:
+                return 0
+
+        for md5 in sorted(self._sizes, key=last_used):
+            if self._size <= self.max_size:
+                break
+            logger.debug("Evicting stored artifact %s" % md5)
+            try:
+                os.remove(os.path.join(self.objects_directory, md5))
+            except OSError:
+                pass
+            self._size -= self._sizes.pop(md5)
+
+        self._remove_dangling_keys()
+
+    def _remove_dangling_keys(self):
+        """ Removes keys referring to artifacts no longer stored """
+        for name in os.listdir(self.keys_directory):
+            path = os.path.join(self.keys_directory, name)
+            try:
+                with open(path) as fh:
+                    md5 = json.load(fh)['md5']
+            except (IOError, OSError, ValueError, KeyError):
+                continue
+            if md5 not in self._sizes:
+                logger.debug("Removing key of evicted artifact %s" % md5)
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+def create_store(store_dir):
+    """ Creates artifact store in store_dir, or None if store_dir is empty """
+    if not store_dir:
+        return None
+    return ArtifactStore(store_dir)
+
+
+def download_with_store(store, downloads, download):
+    """ Places artifacts in their target paths from the store, downloading
+        and storing only those not already stored.
+
+        Artifacts are first looked up by key. Artifacts with an md5
+        companion among the downloads are then looked up by the md5 sum
+        in the companion, so unchanged content is reused even when the
+        build number changed.
+
+        :param store: ArtifactStore
+        :param downloads: list of (key, url, path) tuples
+        :param download: function downloading a list of (url, path) tuples,
+                         returning a dictionary of md5 sums by path
+        :return: dictionary of md5 sums by path of all placed artifacts
+    """
+    paths = set([x[2] for x in downloads])
+    described = [x for x in downloads if not x[2].endswith('.md5') and x[2] + '.md5' in paths]
+    others = [x for x in downloads if x not in described]
+
+    md5_sums = {}
+    downloaded = _fetch_missing(store, others, download, md5_sums)
+
+    remaining = []
+    for key, url, path in described:
+        md5 = store.fetch(key, path)
+        if md5 is None:
+            expected = read_md5_file(path + '.md5')
+            md5 = store.fetch_md5(expected, path) if expected else None
+            if md5 is not None:
+                store.add(key, path, md5)
+        if md5 is None:
+            remaining.append((key, url, path))
+        else:
+            md5_sums[path] = md5
+
+    downloaded += _fetch_missing(store, remaining, download, md5_sums)
+    logger.info("Used %s stored artifacts, downloaded %s" % (len(downloads) - downloaded, downloaded))
+    return md5_sums
+
+
+def _fetch_missing(store, downloads, download, md5_sums):
+    """ Places stored artifacts, and downloads and stores the rest.
+        md5 sums of all placed artifacts are added to md5_sums.
+
+        :return: number of downloaded artifacts
+    """
+    missing = []
+    for key, url, path in downloads:
+        md5 = store.fetch(key, path)
+        if md5 is None:
+            missing.append((key, url, path))
+        else:
+            md5_sums[path] = md5
+
+    downloaded = download([(url, path) for key, url, path in missing]) or {}
+    for key, url, path in missing:
+        md5_sums[path] = store.add(key, path, downloaded.get(path))
+    return len(missing)
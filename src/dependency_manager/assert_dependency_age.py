@@ -5,8 +5,12 @@ import logging
 
 from .common import NullHandler
 from .common import die
+from .jenkins_client import JenkinsClient
 from .jenkins_project import JenkinsProject
 from .dependency_list import DependencyList
+from .response_cache import DEFAULT_CACHE_DIR
+from .response_cache import TTL
+from .response_cache import create_cache
 
 
 logger = logging.getLogger("dbc." + __name__)
@@ -19,6 +23,18 @@ def cli():
     usage = "Assert that the specified jobs dependency built within the required time.\nVerifies that the specified dependency of the job is not too old to release"
     parser = OptionParser(usage="%prog [options] master_job master_build dependency maximum-jobage-in-hours\n" + usage)
 
+    parser.add_option("-w", "--workers", type="int", action="store", dest="workers", default=8,
+                      help="Number of upstream projects resolved concurrently. default is 8")
+
+    parser.add_option("--cache-dir", type="string", action="store", dest="cache_dir", default=DEFAULT_CACHE_DIR,
+                      help="Folder used to cache jenkins responses between runs. default is '%s'" % DEFAULT_CACHE_DIR)
+
+    parser.add_option("--no-cache", action="store_const", const=None, dest="cache_dir",
+                      help="Do not cache jenkins responses.")
+
+    parser.add_option("--cache-ttl", type="int", action="store", dest="cache_ttl", default=TTL,
+                      help="Number of seconds cached job information is used without asking jenkins. default is %s, ie. job information is always requested" % TTL)
+
     parser.add_option("-v", "--verbose", action="store_true", dest="verbose",
                       help="Verbose output.")
 
@@ -52,9 +68,10 @@ def main():
     setup_logger(options.verbose)
 
     max_age = age*3600
-    project = JenkinsProject(JENKINS_SERVER, master_job, master_build)
+    jenkins_client = JenkinsClient(cache=create_cache(options.cache_dir, options.cache_ttl))
+    project = JenkinsProject(JENKINS_SERVER, master_job, master_build, jenkins_client=jenkins_client)
     
-    dependencies = DependencyList(JENKINS_SERVER, project, DEPENDENCY_FILENAME, REPOSITORY_PROJECT, recursive=True)
+    dependencies = DependencyList(JENKINS_SERVER, project, DEPENDENCY_FILENAME, REPOSITORY_PROJECT, recursive=True, jenkins_client=jenkins_client, max_workers=options.workers)
 
     dependency = dependencies._get_dependency(dependency_name)
     
@@ -2,31 +2,164 @@
 # -*- coding: utf-8 -*-
 # -*- mode: python -*-
 import logging
+import time
 
 from .common import NullHandler
 from .common import die
-from .jenkins_project import JenkinsProject
+from .jenkins_client import JenkinsClient
 
 
 logger = logging.getLogger("dbc." + __name__)
 logger.addHandler(NullHandler())
 
+JOB_TREE = "lastStableBuild[number,timestamp]"
+JOBS_TREE = "jobs[name,%s]" % JOB_TREE
+
+
+def jobs_query(jenkins_server, view=None, view_user=None):
+    """ Creates json api query for the last stable build of all jobs on
+        jenkins_server, or of the jobs in view.
+
+        :param view_user: owner of view, if view is a personal view
+        :return: tuple of url and query parameters
+    """
+    if not jenkins_server.endswith('/'):
+        jenkins_server += '/'
+    url = jenkins_server
+    if view is not None and view_user is not None:
+        url += "user/%s/my-views/view/%s/" % (view_user, view)
+    elif view is not None:
+        url += "view/%s/" % view
+    return url + "api/json", {'tree': JOBS_TREE}
+
+
+def get_job_ages(jenkins_server, jenkins_client, view=None, view_user=None, job_names=(), now=None):
+    """ Retrieves the age of the last stable build of jobs with a single request
+
+        Jobs in folders are not part of the listing. Each of job_names
+        missing from the listing is therefore retrieved with a request of
+        its own.
+
+        :param job_names: names of jobs which must be retrieved, eg. 'folder/job/name'
+        :param now: The time now in seconds since epoch (used for unittesting - if None time.time() is used)
+        :return: dictionary of job name to seconds since last stable build,
+                 or None if the job never had a stable build. Jobs that do
+                 not exist are not present.
+    """
+    query_url, params = jobs_query(jenkins_server, view, view_user)
+    content = jenkins_client.get_json(query_url, params=params)
+    if now is None:
+        now = time.time()
+
+    ages = {}
+    for job in content['jobs']:
+        ages[job['name']] = _build_age(job.get('lastStableBuild'), now)
+
+    if not jenkins_server.endswith('/'):
+        jenkins_server += '/'
+    for job_name in job_names:
+        if job_name in ages:
+            continue
+        logger.debug("Job %s not in listing, retrieving it" % job_name)
+        try:
+            job = jenkins_client.get_json("%sjob/%s/api/json" % (jenkins_server, job_name), params={'tree': JOB_TREE})
+        except RuntimeError:
+            continue
+        ages[job_name] = _build_age(job.get('lastStableBuild'), now)
+    return ages
+
+
+def _build_age(build, now):
+    """ Seconds since build, or None if there is no build """
+    if not build or build.get('timestamp') is None:
+        return None
+    return round(now - int(build['timestamp']) / 1000.0)
+
+
+def find_violations(ages, thresholds):
+    """ Finds the jobs older than their maximum age
+
+        :param ages: dictionary of job name to age in seconds, as given by get_job_ages
+        :param thresholds: dictionary of job name to maximum age in seconds
+        :return: list of messages describing each violation, sorted by job name
+    """
+    violations = []
+    for job_name in sorted(thresholds):
+        max_age = thresholds[job_name]
+        if job_name not in ages:
+            violations.append("%s: job not found" % job_name)
+        elif ages[job_name] is None:
+            violations.append("%s: no stable build" % job_name)
+        elif ages[job_name] > max_age:
+            violations.append("%s: Actual age: %s seconds is older than maximum age: %s seconds" % (job_name, ages[job_name], max_age))
+        else:
+            logger.info("%s: Actual age: %s seconds is younger than maximum age: %s seconds" % (job_name, ages[job_name], max_age))
+    return violations
+
+
+def read_thresholds(filename):
+    """ Reads jobs and maximum ages in hours from file with a
+        'job_name maximum-jobage-in-hours' pair on each line
+
+        :return: dictionary of job name to maximum age in hours
+    """
+    thresholds = {}
+    with open(filename) as fh:
+        for line in fh:
+            line = line.split('#')[0].strip()
+            if not line:
+                continue
+            fields = line.split()
+            if len(fields) != 2:
+                die("Invalid line in %s: '%s'" % (filename, line))
+            thresholds[fields[0]] = float(fields[1])
+    return thresholds
+
+
 def cli():
 
     from optparse import OptionParser
 
-    usage = "Assert that the specified job is build stable within the required time.\nVerifies that the specified job is not too old"
-    parser = OptionParser(usage="%prog [options] job_name maximum-jobage-in-hours\n" + usage)
+    usage = "Assert that the specified jobs are build stable within the required time.\nVerifies that the specified jobs are not too old" \
+            "\nWith --view, all jobs in the view are checked against --max-age, unless a job is given its own maximum age"
+    parser = OptionParser(usage="%prog [options] [job_name maximum-jobage-in-hours ...]\n" + usage)
+
+    parser.add_option("-f", "--jobs-file", type="string", action="store", dest="jobs_file", default=None,
+                      help="File with a 'job_name maximum-jobage-in-hours' pair on each line")
+
+    parser.add_option("--view", type="string", action="store", dest="view", default=None,
+                      help="Check all jobs in view")
+
+    parser.add_option("--view-user", type="string", action="store", dest="view_user", default=None,
+                      help="Owner of view, if view is a personal view")
+
+    parser.add_option("--max-age", type="float", action="store", dest="max_age", default=None,
+                      help="Maximum age in hours of jobs in view without their own maximum age")
 
     parser.add_option("-v", "--verbose", action="store_true", dest="verbose",
                       help="Verbose output.")
 
     (options, args) = parser.parse_args()
 
-    if len(args) < 2:
+    if len(args) % 2 != 0:
+        parser.error("need pairs of job name and expected age")
+
+    thresholds = {}
+    if options.jobs_file:
+        thresholds.update(read_thresholds(options.jobs_file))
+    try:
+        for job_name, age in zip(args[0::2], args[1::2]):
+            thresholds[job_name] = float(age)
+    except ValueError:
+        parser.error("expected age must be a number of hours")
+
+    if options.view and options.max_age is None:
+        parser.error("--view needs --max-age")
+
+    if not options.view and not thresholds:
         parser.error("need job name and expected age")
 
-    return (options, args[0], int(args[1]))
+    return (options, thresholds)
 
 
 def setup_logger(verbose):
@@ -45,18 +178,22 @@ def main():
 
     JENKINS_SERVER = 'http://is.dbc.dk'
 
-    (options, job_name, age) = cli()
+    (options, thresholds) = cli()
     setup_logger(options.verbose)
 
-    max_age = age*3600
-    proj = JenkinsProject(JENKINS_SERVER, job_name)
+    ages = get_job_ages(JENKINS_SERVER, JenkinsClient(), view=options.view, view_user=options.view_user, job_names=sorted(thresholds))
+
+    if options.view:
+        for job_name in ages:
+            thresholds.setdefault(job_name, options.max_age)
+
+    violations = find_violations(ages, dict((x, int(y * 3600)) for x, y in thresholds.items()))
+    for violation in violations:
+        logger.error(violation)
 
-    age = proj.get_seconds_since_build()
-    
-    if age > max_age:
-        die("Actual age: %s seconds is older than maximum age: %s seconds" % (age, max_age))
-    else:
-        logger.info("Actual age: %s seconds is younger than maximum age: %s seconds" % (age, max_age))
+    if violations:
+        die("%s of %s jobs are older than their maximum age:\n%s" % (len(violations), len(thresholds), "\n".join(violations)))
+    logger.info("All %s jobs are younger than their maximum age" % len(thresholds))
 
 if __name__ == '__main__':
     main()
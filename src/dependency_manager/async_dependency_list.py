@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -*- mode: python -*-
+"""
+:mod:`dependency_manager.async_dependency_list` -- asyncio dependency list builder
+==================================================================================
+
+=====================
+Async Dependency List
+=====================
+
+Builds DependencyList objects with asyncio.
+
+The resolver fetches the master project, all upstream projects, their
+dependency files and the repository projects listed in them concurrently
+on the event loop. Jobs listed in dependency files are not fetched, their
+version information is taken from the dependency file. The fetched
+projects and parsed dependency files are put in the project registry,
+after which a regular DependencyList is created from the registry
+without further requests. Ordering and dependency
+mismatch detection are therefore the same as for the sync builder.
+
+Several jobs can be resolved at once from a single event loop, eg.::
+
+    resolver = AsyncDependencyResolver(server, 'dependencies.txt', repository)
+    lists = await asyncio.gather(*[resolver.build_dependency_list(job) for job in jobs])
+"""
+import asyncio
+import logging
+
+from .async_jenkins_client import AsyncJenkinsClient
+from .async_jenkins_client import AsyncJenkinsProject
+from .async_jenkins_client import MAX_IN_FLIGHT
+from .common import DependencyException
+from .common import NullHandler
+from .dependency_file import parse_dependency_file
+from .dependency_list import DependencyList
+from .dependency_list import _dependency_file_key
+from .dependency_list import _parse_upstream_dependencies
+from .dependency_list import _project_key
+from .dependency_list import _repository_project_key
+from .jenkins_project import build_info_query
+from .jenkins_project import is_finished_build
+from .project_registry import ProjectRegistry
+from .repository_project import JenkinsRepositoryProject
+from .repository_project import REPOSITORY_BUILD_TREE
+from .repository_project import get_repository_index
+from .repository_project import repository_info_query
+
+# define logger
+logger = logging.getLogger("dbc." + __name__)
+logger.addHandler(NullHandler())
+
+
+class AsyncDependencyResolver(object):
+    """ Resolves dependency lists for jenkins projects with asyncio
+    """
+    def __init__(self, jenkins_server, dependency_filename, repository_project, client=None, registry=None):
+        """ Initializes resolver
+
+            :param jenkins_server: url of the jenkins server hosting projects
+            :param dependency_filename: Name of the dependency file to check
+                                        upstream projects for.
+            :param repository_project: Name of the jenkins repository project
+            :param client: AsyncJenkinsClient used for all requests
+            :param registry: ProjectRegistry the resolved projects are put in.
+                             If not specified, a registry of its own is used,
+                             so projects resolved to the last successful
+                             build are not kept beyond this resolver.
+        """
+        self.jenkins_server = jenkins_server
+        self.dependency_filename = dependency_filename
+        self.repository_project = repository_project
+        self.client = client
+        if self.client is None:
+            self.client = AsyncJenkinsClient()
+        self.registry = registry
+        if self.registry is None:
+            self.registry = ProjectRegistry()
+
+        self._projects = {}
+        self._futures = {}
+
+    async def build_dependency_list(self, job_name, build_number=None):
+        """ Resolves the dependencies of a project build
+
+            :return: DependencyList for the project build
+        """
+        master_project = await self.get_project(job_name, build_number, load_info=True)
+
+        if 'upstreamProjects' in master_project.info:
+            await asyncio.gather(*[self._resolve_upstream(x) for x in master_project.get_upstreams()])
+
+        return DependencyList(self.jenkins_server, master_project, self.dependency_filename, self.repository_project,
+                              jenkins_client=self.client.client, registry=self.registry)
+
+    async def get_project(self, name, build_number=None, load_info=False):
+        """ Retrieves registered JenkinsProject, fetching it if not registered
+
+            :param load_info: If True project information is fetched even if
+                              the build number is known.
+        """
+        key = _project_key(self.jenkins_server, name, build_number)
+        project = await self._get_async_project(key, name, build_number, load_info).get_project()
+        return self.registry.get_project(key, lambda: project)
+
+    async def get_repository_project(self, name, build_number):
+        """ Retrieves registered JenkinsRepositoryProject, fetching it if not registered.
+
+            The repository information is only fetched if build_number is
+            not specified. The repository build is fetched once and put in
+            the repository index, so creating the project makes no requests.
+        """
+        key = _repository_project_key(self.jenkins_server, name, self.repository_project, build_number)
+        project = self.registry.find_project(key)
+        if project is None:
+            info = None
+            number = build_number
+            if not number:
+                info = await self._once(('repository', self.repository_project), self._get_repository_info)
+                number = int(info['lastSuccessfulBuild']['number'])
+
+            index = get_repository_index(self.jenkins_server.rstrip('/') + '/', self.repository_project, self.client.client)
+            build = await self._once(('repository', self.repository_project, number), lambda: self._get_repository_build(number))
+            index.get_artifacts(number, lambda: build)
+            project = self.registry.get_project(key, lambda: JenkinsRepositoryProject(
+                self.jenkins_server, name, self.repository_project, build_number=number,
+                jenkins_client=self.client.client, info=info, index=index))
+        return project
+
+    async def _resolve_upstream(self, upstream_name):
+        """ Fetches upstream project, its dependency file and every project listed in it """
+        async_project = self._get_async_project(_project_key(self.jenkins_server, upstream_name, None), upstream_name, None)
+        upstream_project = await self.get_project(upstream_name)
+
+        key = _dependency_file_key(self.jenkins_server, upstream_project, self.dependency_filename)
+        if self.registry.find_dependency_file(key) is not None:
+            return
+
+        content = await self._once(key, lambda: async_project.get_dependency_file_content(self.dependency_filename))
+        if content:
+            # Listed jobs are registered lazily when parsing, their version
+            # information is taken from the dependency file
+            dependency_file = parse_dependency_file(content, self.repository_project)
+            await asyncio.gather(*[self.get_repository_project(x.name, x.build_number)
+                                   for x in dependency_file.records if x.is_repository])
+
+        # Every listed repository project is registered now, so parsing makes no requests
+        self.registry.get_dependency_file(key, lambda: _parse_upstream_dependencies(
+            self.jenkins_server, content, self.repository_project, self.client.client, self.registry))
+
+    def _get_async_project(self, key, name, build_number, load_info=False):
+        """ Retrieves AsyncJenkinsProject for key, wrapping the registered project if present """
+        if key not in self._projects:
+            self._projects[key] = AsyncJenkinsProject(self.jenkins_server, name, build_number, client=self.client,
+                                                      project=self.registry.find_project(key), load_info=load_info)
+        return self._projects[key]
+
+    async def _get_repository_info(self):
+        query_url, params = repository_info_query(self.jenkins_server.rstrip('/') + '/', self.repository_project)
+        return await self.client.get_json(query_url, params=params)
+
+    async def _get_repository_build(self, build_number):
+        query_url, params = build_info_query(self.jenkins_server.rstrip('/') + '/', self.repository_project, build_number, tree=REPOSITORY_BUILD_TREE)
+        return await self.client.get_json(query_url, params=params, immutable=is_finished_build)
+
+    def _once(self, key, function):
+        """ Runs coroutine function once per key, concurrent callers share the result """
+        if key not in self._futures:
+            self._futures[key] = asyncio.ensure_future(function())
+        return self._futures[key]
+
+
+async def async_build_dependency_file(job_name, build_number, dependency_filename, jenkins_server, repository_project, client=None, registry=None):
+    """ Builds dependency file with asyncio.
+
+        :param job_name: name of master project to build dependency file for
+        :param build_number: Build number of master project
+        :param dependency_filename: name of dependency file
+        :param jenkins_server: The url of the jenkins server
+        :param repository_project: Name of repository project
+        :param client: AsyncJenkinsClient used for all requests
+        :param registry: ProjectRegistry the resolved projects are put in
+    """
+    logger.info("Building dependency file for project %s-%s" % (job_name, build_number))
+    resolver = AsyncDependencyResolver(jenkins_server, dependency_filename, repository_project, client=client, registry=registry)
+    try:
+        dependency_list = await resolver.build_dependency_list(job_name, build_number)
+    except DependencyException as e:
+        logger.warning("Aborting build %s-%s, dependency mismatch detected" % (job_name, build_number))
+        project = await resolver.get_project(job_name, build_number)
+        await asyncio.get_running_loop().run_in_executor(None, project.abort_build)
+        raise e
+
+    dependency_list.tofile(dependency_filename)
+    logger.info("Dependency file '%s' created" % dependency_filename)
+    return dependency_list
+
+
+def build_dependency_file(job_name, build_number, dependency_filename, jenkins_server, repository_project, jenkins_client=None, registry=None, max_in_flight=MAX_IN_FLIGHT):
+    """ Builds dependency file, running async_build_dependency_file on a new event loop.
+
+        :param jenkins_client: JenkinsClient providing credentials and response cache
+        :param max_in_flight: Maximum number of concurrent requests
+    """
+    async def build():
+        client = AsyncJenkinsClient(jenkins_client, max_in_flight=max_in_flight)
+        try:
+            return await async_build_dependency_file(job_name, build_number, dependency_filename, jenkins_server,
+                                                     repository_project, client=client, registry=registry)
+        finally:
+            await client.close()
+
+    return asyncio.run(build())
@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -*- mode: python -*-
+"""
+:mod:`dependency_manager.async_jenkins_client` -- asyncio access to jenkins
+===========================================================================
+
+====================
+Async Jenkins Client
+====================
+
+Contains asyncio counterparts of the jenkins data access layer.
+
+AsyncJenkinsClient wraps a JenkinsClient and shares its credentials and
+response cache. Requests are made with aiohttp on the event loop, so
+many requests can be in flight on a single thread. If aiohttp is not
+installed, requests are handed to the sync client on a pool of
+FALLBACK_WORKERS threads, which limits the number of requests in flight
+accordingly. The response cache reads and writes files, and is used
+from the loops default executor so it does not block the event loop.
+
+AsyncJenkinsProject fetches project information, configuration, builds,
+artifacts and dependency files without blocking the event loop, and
+hands the fetched data to a regular JenkinsProject.
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from .common import die
+from .common import NullHandler
+from .jenkins_client import POOL_SIZE
+from .jenkins_client import get_client
+from .jenkins_project import JenkinsProject
+from .jenkins_project import build_info_query
+from .jenkins_project import is_finished_build
+from .jenkins_project import project_config_url
+from .jenkins_project import project_info_query
+
+# define logger
+logger = logging.getLogger("dbc." + __name__)
+logger.addHandler(NullHandler())
+
+MAX_IN_FLIGHT = 1000
+FALLBACK_WORKERS = POOL_SIZE
+
+
+class AsyncJenkinsClient(object):
+    """ Asyncio http client for a jenkins server
+    """
+    def __init__(self, jenkins_client=None, max_in_flight=MAX_IN_FLIGHT):
+        """ Initializes async jenkins client
+
+            :param jenkins_client: JenkinsClient providing credentials and
+                                   response cache. If not specified, the
+                                   process wide client is used.
+            :param max_in_flight: Maximum number of concurrent requests.
+        """
+        self.client = jenkins_client
+        if self.client is None:
+            self.client = get_client()
+        self.max_in_flight = max_in_flight
+        self._semaphore = None
+        self._session = None
+        self._executor = None
+
+    async def get_content(self, url, params=None, immutable=False):
+        """ Retrieves content of url as bytes
+
+            :param immutable: True if the content never changes, ie. it
+                              belongs to a specific finished build. May also
+                              be a function deciding this from the content.
+        """
+        cache = self.client.cache
+        if cache is None:
+            status_code, content, headers = await self._fetch(url, params, None)
+            return content
+
+        # The response cache reads and writes files, so it is used off the event loop
+        loop = asyncio.get_running_loop()
+        key, entry, headers = await loop.run_in_executor(None, self.client.prepare_request, url, params)
+        if entry and cache.is_fresh(entry):
+            logger.debug("Using cached response for '%s'" % key)
+            return entry.content
+
+        status_code, content, response_headers = await self._fetch(url, params, headers)
+        return await loop.run_in_executor(None, functools.partial(self.client.process_response, key, entry, immutable,
+                                                                  status_code, content, response_headers))
+
+    async def get_text(self, url, params=None, immutable=False):
+        """ Retrieves content of url as text """
+        content = await self.get_content(url, params=params, immutable=immutable)
+        return content.decode('utf-8', 'replace')
+
+    async def get_json(self, url, params=None, immutable=False):
+        """ Retrieves and parses json content of url """
+        content = await self.get_content(url, params=params, immutable=immutable)
+        try:
+            return json.loads(content.decode('utf-8'))
+        except ValueError:
+            die("Couldn't parse json content from url '%s' (response '%s')" % (url, content))
+
+    async def close(self):
+        """ Closes the aiohttp session, or the fallback thread pool, if one was opened """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    async def _fetch(self, url, params, headers):
+        """ Performs get request against url
+
+            :return: tuple of status code, content and response headers
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+
+        async with self._semaphore:
+            logger.debug("Querying with url '%s'" % url)
+            if aiohttp is None:
+                loop = asyncio.get_running_loop()
+                response = await loop.run_in_executor(self._get_executor(), functools.partial(self.client.get, url, params=params, headers=headers))
+                return response.status_code, response.content, response.headers
+
+            async with self._get_session().get(url, params=params, headers=headers) as response:
+                content = await response.read()
+                return response.status, content, response.headers
+
+    def _get_session(self):
+        if self._session is None:
+            auth = None
+            if self.client.authentication is not None:
+                auth = aiohttp.BasicAuth(self.client.authentication.username, self.client.authentication.password)
+            connector = aiohttp.TCPConnector(limit=self.max_in_flight)
+            self._session = aiohttp.ClientSession(auth=auth, connector=connector)
+        return self._session
+
+    def _get_executor(self):
+        if self._executor is None:
+            workers = min(self.max_in_flight, FALLBACK_WORKERS)
+            logger.warning("aiohttp is not installed, making at most %s requests at a time" % workers)
+            self._executor = ThreadPoolExecutor(max_workers=workers)
+        return self._executor
+
+
+class AsyncJenkinsProject(object):
+    """ Asyncio data access for a jenkins project
+    """
+    def __init__(self, jenkins_url, project_name, build_number=None, client=None, project=None, load_info=False):
+        """ Initializes async jenkins project
+
+            :param jenkins_url: url of the jenkins server hosting project
+            :param project_name: Name of the jenkins project
+            :param build_number: build number of the project. If not specified,
+                                 build number of last stable build is used.
+            :param client: AsyncJenkinsClient used for all requests
+            :param project: Already loaded JenkinsProject to wrap
+            :param load_info: If True project information is fetched even
+                              if the build number is known.
+        """
+        self.url = jenkins_url
+        if not self.url.endswith('/'):
+            self.url += '/'
+        self.name = project_name
+        self.build_number = build_number
+        self.client = client
+        if self.client is None:
+            self.client = AsyncJenkinsClient()
+
+        self.project = project
+        self.load_info = load_info
+        self._futures = {}
+
+    async def get_info(self):
+        """ Retrieves project information """
+        return await self._once('info', self._get_info)
+
+    async def get_config(self):
+        """ Retrieves project configuration xml """
+        return await self._once('config', self._get_config)
+
+    async def get_build_info(self):
+        """ Retrieves information for the project build by its number """
+        return await self._once('build', self._get_build_info)
+
+    async def get_project(self):
+        """ Retrieves JenkinsProject holding the fetched information and configuration """
+        if self.project is None:
+            self.project = await self._once('project', self._get_project)
+        return self.project
+
+    async def get_build(self):
+        """ Retrieves build information for the project build """
+        project = await self.get_project()
+        return project.build
+
+    async def get_artifacts(self):
+        """ Retrieves artifact dictionary of artifact names and download urls """
+        project = await self.get_project()
+        return project.get_artifacts()
+
+    async def get_dependency_file_content(self, dependency_file_name):
+        """ Retrieves the content of dependency file for project, if present.
+
+            :return: content of dependency file, None if no dependency file is present
+        """
+        project = await self.get_project()
+        artifacts = project.get_artifacts()
+        if dependency_file_name in artifacts:
+            return await self.client.get_text(artifacts[dependency_file_name], immutable=True)
+
+        logger.warning('No %s found among artifacts for project %s-%s' % (dependency_file_name, project.name, project.build_number))
+        return None
+
+    async def _get_info(self):
+        logger.debug("Getting info for project %s" % self.name)
+        query_url, params = project_info_query(self.url, self.name)
+        return await self.client.get_json(query_url, params=params)
+
+    async def _get_build_info(self):
+        logger.debug("Getting build %s for project %s" % (self.build_number, self.name))
+        query_url, params = build_info_query(self.url, self.name, self.build_number)
+        return await self.client.get_json(query_url, params=params, immutable=is_finished_build)
+
+    async def _get_config(self):
+        logger.debug("Getting config for project %s" % self.name)
+        return await self.client.get_content(project_config_url(self.url, self.name))
+
+    async def _get_project(self):
+        """ Fetches the configuration and, like JenkinsProject, the project
+            information only if the build number is unknown or load_info is
+            set. A known build missing from the information is fetched by number.
+        """
+        info = None
+        build = None
+        if self.build_number is None or self.load_info:
+            info, config = await asyncio.gather(self.get_info(), self.get_config())
+            if self.build_number is not None and not [x for x in info.get('builds', []) if x['number'] == self.build_number]:
+                build = await self.get_build_info()
+        else:
+            build, config = await asyncio.gather(self.get_build_info(), self.get_config())
+
+        return JenkinsProject(self.url, self.name, self.build_number, jenkins_client=self.client.client,
+                              info=info, config=config, build=build)
+
+    def _once(self, name, function):
+        """ Runs coroutine function once, concurrent callers share the result """
+        if name not in self._futures:
+            self._futures[name] = asyncio.ensure_future(function())
+        return self._futures[name]
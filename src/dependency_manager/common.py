@@ -11,6 +11,7 @@ Common Functions
 
 Contains common functions and classes for the dependency-manager project.
 """
+import hashlib
 import logging
 
 
@@ -34,3 +35,36 @@ class DependencyException(Exception):
     """ Exception class to signal dependency build number mismatch
     """
     pass
+
+
+BLOCK_SIZE = 1024 * 1024
+
+
+def md5_sum(path):
+    """ Computes md5 sum of file at path """
+    md5 = hashlib.md5()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(BLOCK_SIZE), b''):
+            md5.update(block)
+    return md5.hexdigest()
+
+
+def read_md5_file(path):
+    """ Reads md5 sum from md5 file of format '<md5>' or '<md5>  <filename>' """
+    with open(path) as fh:
+        return parse_md5(fh.read())
+
+
+def parse_md5(content):
+    """ Parses md5 sum from md5 file content """
+    content = content.split()
+    if not content:
+        return None
+    return content[0].strip().lower()
+
+
+def verify_md5(path, md5):
+    """ Dies if md5 does not match the sum in the md5 file of path """
+    expected = read_md5_file(path + '.md5')
+    if md5 != expected:
+        die("md5 sum for file %s didn't match: %s != %s" % (path, md5, expected))
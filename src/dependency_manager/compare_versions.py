@@ -1,142 +1,323 @@
 
+import json
 import logging
-import re
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
+from .common import die
 from .common import NullHandler
+from .dependency_file import find_record
+from .dependency_file import mapped_file
+from .dependency_file import parse_dependency_file
+from .dependency_file import read_dependency_file
+from .git_mirror import DEFAULT_MIRROR_DIR
+from .git_mirror import GitMirror
+from .git_mirror import parse_git_revision
+from .jenkins_client import JenkinsClient
+from .jenkins_project import JenkinsProject
+from .response_cache import DEFAULT_CACHE_DIR
+from .response_cache import create_cache
 
 
 logger = logging.getLogger("dbc." + __name__)
 logger.addHandler(NullHandler())
 
-def svn_log( old_revision, new_revision, svn_path, options ):
+SVN_WORKERS = 8
+MISSING = object()
+
+def svn_log( old_revision, new_revision, svn_path, options, cache=None ):
     logger.debug("diff %s to %s for %s" % ( old_revision, new_revision, svn_path ) )
     revision_arg = "-r%s:%s" % ( int(old_revision) + 1, new_revision )
 
-    if options.diff:
-        command = "svn diff -r%s:%s %s" % ( int(old_revision) + 1, new_revision, svn_path)
-    else:
-        command = "svn log -r%s:%s %s" % ( int(old_revision) + 1, new_revision, svn_path)
-    logger.debug("Execute %s"%command )
-    #output = subprocess.check_output(  command )
-    result = subprocess.Popen( command, shell=True, stderr=subprocess.PIPE, stdout=subprocess.PIPE )
+    command = [ "svn", "diff" if options.diff else "log", revision_arg, svn_path ]
+    # ranges between two revision numbers never change, so their output is kept
+    key = None
+    if cache is not None and str( new_revision ).isdigit():
+        key = " ".join( command )
+        entry = cache.get( key )
+        if entry is not None:
+            logger.debug("Using cached output of %s" % key )
+            return entry.content.decode( 'utf-8' )
+
+    logger.debug("Execute %s" % command )
+    result = subprocess.Popen( command, stderr=subprocess.PIPE, stdout=subprocess.PIPE, universal_newlines=True )
     ( stdout, stderr ) = result.communicate()
 
     if result.returncode != 0:
-        mesg = "Error encountered during svn command. cmd = '%s'\nstdout = '%s'\nstderr = '%s'\nreturncode = '%s'"%( command, stdout, stderr, result.returncode )
+        mesg = "Error encountered during svn command. cmd = '%s'\nstdout = '%s'\nstderr = '%s'\nreturncode = '%s'"%( " ".join( command ), stdout, stderr, result.returncode )
         logger.error( mesg )
         raise RuntimeError( mesg )
-    return stdout;
 
-def compare_revisions( old_svn_info, new_svn_info, options ):
+    if key is not None:
+        cache.put( key, stdout.encode( 'utf-8' ), immutable=True )
+    return stdout
+
+def git_log( old_commit, new_commit, git_url, options, mirror ):
+    logger.debug("diff %s to %s for %s" % ( old_commit, new_commit, git_url ) )
+    return mirror.log( git_url, old_commit, new_commit, diff=options.diff )
+
+def compare_revisions( old_svn_info, new_svn_info, options, cache=None, max_workers=SVN_WORKERS, mirror=None ):
+    """ Prints the changes of each module between old and new revisions.
+        svn and git commands run concurrently, and their output is printed in
+        the order of new_svn_info as soon as it and the output before it is ready.
+        Git modules are looked up in mirror, by default a GitMirror in its
+        default folder.
+    """
     print( "Modules:" )
 
-    for (new_path, new_revision) in new_svn_info:
-        for (old_path, old_revision) in old_svn_info:
-            if new_path == old_path:
-                if old_revision != new_revision:
-                    print( "==========" )
-                    print(( "%s: revision %s -> %s" % ( new_path, old_revision, new_revision ) ))
-                    print( "----------" )
-                    print( "Changes:" )
-                    print(( svn_log( old_revision, new_revision, new_path, options ) ))
-
-                else:
-                    print(( "%s: revision %s same revision" % ( new_path, new_revision ) ))
-
-
-def compare_versions( old_dependencies_file, new_dependencies_file, job_name, options ):
+    old_revisions = {}
+    for ( old_path, old_revision ) in old_svn_info:
+        old_revisions.setdefault( old_path, old_revision )
+
+    with ThreadPoolExecutor( max_workers=max( 1, max_workers ) ) as executor:
+        modules = []
+        for ( new_path, new_revision ) in new_svn_info:
+            if new_path not in old_revisions:
+                continue
+            old_revision = old_revisions[ new_path ]
+            old_commit = parse_git_revision( old_revision )
+            new_commit = parse_git_revision( new_revision )
+            changes = None
+            if old_commit and new_commit:
+                if old_commit != new_commit:
+                    if mirror is None:
+                        mirror = GitMirror()
+                    changes = executor.submit( git_log, old_commit, new_commit, new_path, options, mirror )
+            elif old_revision != new_revision:
+                changes = executor.submit( svn_log, old_revision, new_revision, new_path, options, cache )
+            modules.append( ( new_path, old_revision, new_revision, changes ) )
+
+        for ( path, old_revision, new_revision, changes ) in modules:
+            if changes is None:
+                print(( "%s: revision %s same revision" % ( path, new_revision ) ))
+                continue
+            print( "==========" )
+            print(( "%s: revision %s -> %s" % ( path, old_revision, new_revision ) ))
+            print( "----------" )
+            print( "Changes:" )
+            print(( changes.result() ))
+
+
+def compare_versions( old_dependencies_file, new_dependencies_file, job_name, options, cache=None, mirror=None ):
     logger.info( "Comparing %s to %s for job %s" % ( old_dependencies_file, new_dependencies_file, job_name ) )
 
-    with open(new_dependencies_file) as fh:
-        content_new = fh.read()
-
-    with open(old_dependencies_file) as fh:
-        content_old = fh.read()
-
-    dependencies_old = parse_dependency_string( content_old )
-    logger.debug("Old dependencies: %s" % dependencies_old )
+    project_old = find_job_record( old_dependencies_file, job_name )
+    logger.debug("Old dependency: %s" % ( project_old, ) )
 
-    dependencies_new = parse_dependency_string( content_new )
-    logger.debug("New dependencies: %s" % dependencies_new )
+    project_new = find_job_record( new_dependencies_file, job_name )
+    logger.debug("New dependency: %s" % ( project_new, ) )
 
-    project_old = [proj for proj in dependencies_old if proj['name'] == job_name] [0]
-    project_new = [proj for proj in dependencies_new if proj['name'] == job_name] [0]
-
-    svn_old = project_old['svn']
-    build_old = project_old['build_number']
+    svn_old = project_old.scm
+    build_old = project_old.build_number
     logger.debug("Old svn info: %s" % svn_old )
 
-    svn_new = project_new['svn']
-    build_new = project_new['build_number']
+    svn_new = project_new.scm
+    build_new = project_new.build_number
     logger.debug("New svn info: %s" % svn_new )
 
     print(( "Revision information for changes in job '%s' between build %s and build %s:" % ( job_name, build_old, build_new) ))
-    compare_revisions( svn_old, svn_new, options )
-
-
-# Based on dependency_list.parse_dependency_string and loads svn revision data from file:
-def parse_dependency_string( dependency_string):
-    dependencies = []
-    project = []
-
-    for line in [x for x in dependency_string.split('\n') if x != ""]:
-        if not line.startswith('#'):
-
-            if not line.startswith(' '):
+    compare_revisions( svn_old, svn_new, options, cache=cache, max_workers=getattr( options, 'workers', SVN_WORKERS ), mirror=mirror )
 
-                if project:
-                    dependencies.append(add_project(project))
-                project = []
-                project.append(line.strip())
 
-            else:
-                project.append(line.strip())
+def diff_dependency_files( old_dependencies_file, new_dependencies_file ):
+    """ Diffs all entries of two dependency files without contacting jenkins or svn
+
+        :return: dictionary with the master project and lists of added,
+                 removed and rebuilt projects, sorted by name. Rebuilt
+                 projects have a changed build number or scm revisions.
+    """
+    old = read_dependency_file( old_dependencies_file )
+    new = read_dependency_file( new_dependencies_file )
+
+    old_records = dict( ( x.name, x ) for x in old.records )
+    new_records = dict( ( x.name, x ) for x in new.records )
+
+    rebuilt = []
+    for name in sorted( set( old_records ) & set( new_records ) ):
+        entry = _diff_entry( name, old_records[ name ].build_number, new_records[ name ].build_number,
+                             old_records[ name ].scm, new_records[ name ].scm )
+        if entry[ 'build_delta' ] or entry[ 'scm' ]:
+            rebuilt.append( entry )
+
+    return { 'master': _diff_entry( new.name, old.build_number, new.build_number, old.scm, new.scm ),
+             'added': [ { 'name': x, 'build': new_records[ x ].build_number } for x in sorted( set( new_records ) - set( old_records ) ) ],
+             'removed': [ { 'name': x, 'build': old_records[ x ].build_number } for x in sorted( set( old_records ) - set( new_records ) ) ],
+             'rebuilt': rebuilt,
+             'unchanged': len( set( old_records ) & set( new_records ) ) - len( rebuilt ) }
+
+
+def _diff_entry( name, old_build, new_build, old_scm, new_scm ):
+    """ Diffs build number and scm revisions of a project """
+    old_revisions = dict( old_scm )
+    new_revisions = dict( new_scm )
+    scm = [ { 'path': path, 'old_revision': old_revisions.get( path ), 'new_revision': new_revisions.get( path ) }
+            for path in sorted( set( old_revisions ) | set( new_revisions ) )
+            if old_revisions.get( path ) != new_revisions.get( path ) ]
+    return { 'name': name, 'old_build': old_build, 'new_build': new_build, 'build_delta': new_build - old_build, 'scm': scm }
+
+
+def format_diff( diff ):
+    """ Formats dependency file diff as text """
+    master = diff[ 'master' ]
+    lines = [ "Project %s: build %s -> %s" % ( master[ 'name' ], master[ 'old_build' ], master[ 'new_build' ] ) ]
+    lines += _format_scm_diff( master[ 'scm' ] )
+
+    lines.append( "Added projects (%s):" % len( diff[ 'added' ] ) )
+    lines += [ "  + %s build %s" % ( x[ 'name' ], x[ 'build' ] ) for x in diff[ 'added' ] ]
+
+    lines.append( "Removed projects (%s):" % len( diff[ 'removed' ] ) )
+    lines += [ "  - %s build %s" % ( x[ 'name' ], x[ 'build' ] ) for x in diff[ 'removed' ] ]
+
+    lines.append( "Rebuilt projects (%s):" % len( diff[ 'rebuilt' ] ) )
+    for entry in diff[ 'rebuilt' ]:
+        lines.append( "  * %s build %s -> %s (%+d)" % ( entry[ 'name' ], entry[ 'old_build' ], entry[ 'new_build' ], entry[ 'build_delta' ] ) )
+        lines += _format_scm_diff( entry[ 'scm' ] )
+
+    lines.append( "Unchanged projects: %s" % diff[ 'unchanged' ] )
+    return "\n".join( lines )
+
+
+def _format_scm_diff( scm ):
+    return [ "      %s: revision %s -> %s" % ( x[ 'path' ], x[ 'old_revision' ], x[ 'new_revision' ] ) for x in scm ]
+
+
+def dependency_state( dependency_file, name ):
+    """ Finds the state of an upstream project or scm module in a parsed dependency file
+
+        :param dependency_file: DependencyFile
+        :param name: name of an upstream project, or scm path of a module
+        :return: build number and scm lines of the upstream project, revision
+                 of the module, or None if name is not in the dependency file
+    """
+    for record in dependency_file.records:
+        if record.name == name:
+            return ( record.build_number, tuple( record.scm ) )
+
+    for ( path, revision ) in dependency_file.scm + [ x for record in dependency_file.records for x in record.scm ]:
+        if path == name:
+            return revision
+    return None
+
+
+def bisect_builds( jenkins_server, job_name, first_build, last_build, name, jenkins_client=None, dependency_filename='dependencies.txt' ):
+    """ Finds the first build of job_name in the range first_build to last_build
+        where the upstream project or module name differs from first_build.
+
+        The archived dependency file of a build is only fetched when the
+        search probes the build, so O(log N) files are fetched. Builds
+        without a dependency file are skipped.
+
+        :return: tuple of first changed build number, state in first_build
+                 and state in the changed build, or None if name did not change
+    """
+    fetched = {}
+
+    def state( build_number ):
+        if build_number not in fetched:
+            logger.debug( "Fetching %s of %s build %s" % ( dependency_filename, job_name, build_number ) )
+            try:
+                project = JenkinsProject( jenkins_server, job_name, build_number=build_number, jenkins_client=jenkins_client )
+                content = project.get_dependency_file_content( dependency_filename )
+            except RuntimeError:
+                content = None
+            fetched[ build_number ] = MISSING if content is None else dependency_state( parse_dependency_file( content ), name )
+        return fetched[ build_number ]
+
+    first_state = state( first_build )
+    if first_state is MISSING:
+        die( "No %s found for build %s of %s" % ( dependency_filename, first_build, job_name ) )
+
+    candidates = list( range( first_build + 1, last_build + 1 ) )
+    while candidates and state( candidates[ -1 ] ) is MISSING:
+        candidates.pop()
+    if not candidates or state( candidates[ -1 ] ) == first_state:
+        logger.info( "Fetched %s dependency files" % len( fetched ) )
+        return None
+
+    low, high = 0, len( candidates ) - 1
+    while low < high:
+        middle = ( low + high ) // 2
+        middle_state = state( candidates[ middle ] )
+        if middle_state is MISSING:
+            del candidates[ middle ]
+            high -= 1
+        elif middle_state == first_state:
+            low = middle + 1
+        else:
+            high = middle
+
+    logger.info( "Fetched %s dependency files" % len( fetched ) )
+    return ( candidates[ high ], first_state, state( candidates[ high ] ) )
+
+
+def find_job_record( dependencies_file, job_name ):
+    """ Finds the entry for job_name in dependencies_file, stopping at the first match """
+    with mapped_file( dependencies_file ) as data:
+        record = find_record( data, job_name )
+
+    if record is None:
+        die( "Could not find job '%s' in %s" % ( job_name, dependencies_file ) )
+    return record
 
-    if project:
-        dependencies.append(add_project(project))
+def cli():
 
-    return dependencies
+    from optparse import OptionParser
 
-def add_project(project):
+    usage = "Compare the version information for a named job in two different dependencies files\nPrint subversion or git log for changes in the modules used by the job" \
+            "\nWith --bisect, find the first build of a job in a build range where an upstream project or module changed"
 
-    name = project[0]
-    logger.debug("name: %s" % name )
+    parser = OptionParser(usage="%prog old_dependencies_file new_dependencies_file job_name_to_filter\n       %prog --graph old_dependencies_file new_dependencies_file\n       %prog --bisect job first_build last_build upstream_or_module_path\n" + usage)
 
-    build_number = int(project[2].replace("Build: ", ""))
-    logger.debug("build: %s" % build_number )
+    parser.add_option("--mirror-dir", type="string", action="store", dest="mirror_dir", default=DEFAULT_MIRROR_DIR,
+                      help="Folder holding local mirrors of git repositories. default is '%s'" % DEFAULT_MIRROR_DIR)
 
-    svn = []
+    parser.add_option("-g", "--graph", action="store_true", dest="graph", default=False,
+                      help="Diff all projects of the two dependency files without contacting jenkins or svn")
 
-    for i in range(3, len(project) ):
-        data = re.sub("(SVN/GIT|SVN): ", "", project[i]).split()
-        url = data[0]
-        revision = data[2].replace( ')', '' )
-        logger.debug("Adding svn module: '%s', revision %s" % ( url, revision ) )
-        svn.append( ( url, revision ) )
+    parser.add_option("-f", "--format", type="choice", choices=["text", "json"], action="store", dest="format", default="text",
+                      help="Output format of --graph, 'text' or 'json'. default is 'text'")
 
-    return {
-        'name': name,
-        'build_number': build_number,
-        'svn': svn }
+    parser.add_option("-b", "--bisect", action="store_true", dest="bisect", default=False,
+                      help="Search the archived dependency files of a build range for the first build where an upstream project or module changed")
 
-def cli():
+    parser.add_option("-d", "--diff", action="store_true", dest="diff", default=False,
+                      help="Include diff report in svn log")
 
-    from optparse import OptionParser
+    parser.add_option("-w", "--workers", type="int", action="store", dest="workers", default=SVN_WORKERS,
+                      help="Number of svn commands run concurrently. default is %s" % SVN_WORKERS)
 
-    usage = "Compare the version information for a named job in two different dependencies files\nPrint subversion log for changes in the modules used by the job"
-    
-    parser = OptionParser(usage="%prog old_dependencies_file new_dependencies_file job_name_to_filter" + usage)
+    parser.add_option("--cache-dir", type="string", action="store", dest="cache_dir", default=DEFAULT_CACHE_DIR,
+                      help="Folder used to cache svn output between runs. default is '%s'" % DEFAULT_CACHE_DIR)
 
-    parser.add_option("-d", "--diff", action="store_true", dest="diff", default=False,
-                      help="Include diff report in svn log")
+    parser.add_option("--no-cache", action="store_const", const=None, dest="cache_dir",
+                      help="Do not cache svn output.")
 
     (options, args) = parser.parse_args()
 
+    if options.bisect and options.graph:
+        parser.error("cannot bisect and diff the graph at the same time.")
+
+    if options.bisect:
+        if len(args) < 4:
+            parser.error("need job, first_build, last_build and upstream_or_module_path")
+        try:
+            args[1] = int(args[1])
+            args[2] = int(args[2])
+        except ValueError:
+            parser.error("first_build and last_build must be integers")
+        if args[1] >= args[2]:
+            parser.error("first_build must be before last_build")
+        return (options, args)
+
+    if options.graph:
+        if len(args) < 2:
+            parser.error("need old_dependencies_file and new_dependencies_file")
+        return (options, args)
+
     if len(args) < 3:
         parser.error("need old_dependencies_file, new_dependencies_file and job_name_to_filter")
 
-    return (options, args[0], args[1], args[2])
+    return (options, args)
 
 
 def setup_logger():
@@ -145,10 +326,34 @@ def setup_logger():
                         filemode='w')
 
 def main():
+
+    JENKINS_SERVER = 'http://is.dbc.dk'
+
     logger.info("Starting version comparison")
     setup_logger()
-    (options, old_dependencies_file, new_dependencies_file, job_name) = cli()
-    compare_versions(old_dependencies_file, new_dependencies_file, job_name, options)
+    (options, args) = cli()
+
+    if options.graph:
+        diff = diff_dependency_files(args[0], args[1])
+        if options.format == 'json':
+            print(json.dumps(diff, indent=2))
+        else:
+            print(format_diff(diff))
+        return
+
+    cache = create_cache(options.cache_dir)
+
+    if options.bisect:
+        (job_name, first_build, last_build, name) = args[:4]
+        result = bisect_builds(JENKINS_SERVER, job_name, first_build, last_build, name, jenkins_client=JenkinsClient(cache=cache))
+        if result is None:
+            print(( "'%s' did not change in job '%s' between build %s and build %s" % ( name, job_name, first_build, last_build ) ))
+        else:
+            print(( "First build of job '%s' where '%s' changed: %s (%s -> %s)" % ( job_name, name, result[0], result[1], result[2] ) ))
+        return
+
+    (old_dependencies_file, new_dependencies_file, job_name) = args[:3]
+    compare_versions(old_dependencies_file, new_dependencies_file, job_name, options, cache=cache, mirror=GitMirror(options.mirror_dir))
 
 
 if __name__ == '__main__':
@@ -1,39 +1,102 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 # -*- mode: python -*-
+import io
 import logging
 import os
 import re
-import requests
 import shutil
-import subprocess
+import tarfile
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
 from lxml import etree
 
 from .common import NullHandler
 from .common import die
+from .common import md5_sum
+from .common import parse_md5
+from .common import verify_md5
+from .artifact_downloader import ArtifactDownloader
+from .artifact_downloader import DOWNLOAD_WORKERS
+from .artifact_downloader import ResponseReader
+from .artifact_selector import ArtifactSelector
+from .artifact_store import DEFAULT_STORE_DIR
+from .artifact_store import create_store
 from .dependency_manager import download_artifacts
-from . import jenkins_authentication
+from .dependency_manager import list_artifacts
+from .jenkins_client import JenkinsClient
+from .jenkins_client import get_client
+from .parallel_gzip import DEFAULT_LEVEL
+from .parallel_gzip import ParallelGzipWriter
+from .response_cache import DEFAULT_CACHE_DIR
+from .response_cache import TTL
+from .response_cache import create_cache
 
 
 logger = logging.getLogger("dbc." + __name__)
 logger.addHandler(NullHandler())
 
+SPOOL_SIZE = 64 * 1024 * 1024
+VIEW_TREE = "jobs[name,url,description]"
 
-def yield_view_jobs(jenkins_server, jenkins_user, view):
+
+def yield_view_jobs(jenkins_server, jenkins_user, view, jenkins_client=None):
+    """ Yields the jobs of view as (name, url, description) tuples.
+        Description is None if jenkins does not expose it in the view listing.
+
+        :param jenkins_client: JenkinsClient used for all requests. If not
+                               specified, the process wide client is used.
+    """
     logger.info("identifying jobs")
+    if jenkins_client is None:
+        jenkins_client = get_client()
     if not jenkins_server.endswith('/'):
         jenkins_server += '/'
-    url = "%suser/%s/my-views/view/%s/api/python" % (jenkins_server, jenkins_user, view)
-    content = _get_and_evaluate_url(url)
+    url = "%suser/%s/my-views/view/%s/api/json" % (jenkins_server, jenkins_user, view)
+    content = jenkins_client.get_json(url, {'tree': VIEW_TREE})
 
     for job in content['jobs']:
-        yield (job['name'], job['url'])
+        description = None
+        if 'description' in job:
+            description = job['description'] or ''
+        yield (job['name'], job['url'], description)
+
+
+def get_view_artifacts(jenkins_server, jenkins_user, view, artifact_keyword, jenkins_client=None, max_workers=DOWNLOAD_WORKERS):
+    """ Finds the artifacts described by the jobs in view.
+
+        Descriptions are read from the view listing. The configuration of
+        jobs whose description is not in the listing is fetched concurrently.
+
+        :param jenkins_client: JenkinsClient used for all requests. If not
+                               specified, the process wide client is used.
+        :return: list of (symlink name, file pattern) pairs, in view order
+    """
+    if jenkins_client is None:
+        jenkins_client = get_client()
+    jobs = list(yield_view_jobs(jenkins_server, jenkins_user, view, jenkins_client))
+    missing = [(name, url) for name, url, description in jobs if description is None]
+
+    descriptions = {}
+    if missing:
+        logger.debug("fetching configuration of %s jobs without description" % len(missing))
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            configured = executor.map(lambda x: _get_config_description(x[0], x[1], jenkins_client), missing)
+            descriptions = dict(zip([name for name, url in missing], configured))
+
+    artifacts = []
+    for name, url, description in jobs:
+        if description is None:
+            description = descriptions[name]
+        artifacts += _parse_description_artifacts(description, artifact_keyword)
+    return artifacts
 
 
-def _get_description_artifacts(name, url, artifact_keyword):
+def _get_config_description(name, url, jenkins_client):
     logger.debug("identifying artifacts for %s" % name)
-    authentication = jenkins_authentication.jenkins_credentials()
-    xml_string = requests.get(url+"config.xml", auth=authentication).content
+    xml_string = jenkins_client.get_content(url+"config.xml")
 
     xml = etree.fromstring(xml_string)
 
@@ -51,21 +114,28 @@ def _get_description_artifacts(name, url, artifact_keyword):
     if not description_xpath:
         die("Unknown configuration type: %s" % xml.tag)
 
-    description = xml.xpath(description_xpath)[0].text
-    artifacts = re.findall("%s:(.*?):" % artifact_keyword, description, re.DOTALL)
+    return xml.xpath(description_xpath)[0].text
+
+
+def _parse_description_artifacts(description, artifact_keyword):
+    artifacts = re.findall("%s:(.*?):" % artifact_keyword, description or '', re.DOTALL)
     return [x.split('=') for x in artifacts]
 
 
 def get_md5_sum(filepath):
-    result = subprocess.Popen(["md5sum", filepath], stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    return md5_sum(filepath)
 
-    out, err = result.communicate()
-    return out.split()[0].strip()
 
+def check_md5_sums(folder, md5_sums=None, max_workers=None):
+    """ Checks artifacts in folder against their md5 files.
 
-def check_md5_sums(folder):
-
+        :param md5_sums: dictionary of md5 sums by path, computed while the
+                         artifacts were placed. Remaining artifacts are
+                         hashed in a process pool.
+        :param max_workers: Number of processes hashing artifacts
+    """
     logger.info("Checking md5 sums")
+    known = dict((os.path.abspath(path), md5) for path, md5 in (md5_sums or {}).items())
     files = []
     for filename in os.listdir(folder):
         if not filename.endswith('.md5'):
@@ -73,71 +143,257 @@ def check_md5_sums(folder):
             if not os.path.exists(os.path.join(folder, filename + '.md5')):
                 die("could not find md5 file for artifact %s" % filename)
 
-            files.append([os.path.abspath(os.path.join(folder, x)) for x in [filename, filename + '.md5']])
+            files.append(os.path.abspath(os.path.join(folder, filename)))
 
-    for file_path, md5_path in files:
-        file_sum = get_md5_sum(file_path)
-        md5_sum = None
-        with open(md5_path) as fh:
-            md5_sum = fh.read().strip()
+    unknown = [x for x in files if x not in known]
+    if unknown:
+        logger.debug("Computing md5 sums of %s artifacts" % len(unknown))
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            known.update(zip(unknown, executor.map(md5_sum, unknown)))
 
-        if not file_sum == md5_sum:
-            die("md5 sum for file %s didn't match: %s != %s" % (file_path, file_sum, md5_sum) )
+    for file_path in files:
+        verify_md5(file_path, known[file_path])
 
-def create_symlinks(download_folder, symlink_list):
-    files = os.listdir(download_folder)
-    cur = os.getcwd()
-    os.chdir(download_folder)
-    for symlink_name, file_pattern in symlink_list:
 
-        matched_pair = []
-        for name in [x for x in files if not x.endswith('.md5')]:
-            if re.match(file_pattern, name) and name != symlink_name:
-                matched_pair.append((name, symlink_name))
+def find_symlinks(names, symlink_list):
+    """ Finds the artifacts the symlinks in symlink_list point to, in a
+        single pass over names
 
-        if len(matched_pair) > 1:
-            die("Found multiple matching files for pattern %s, matches %s" % file_pattern, [x[0] for x in matched_pair])
+        :param names: artifact filenames
+        :param symlink_list: list of (symlink name, file pattern) pairs
+        :return: list of (artifact name, symlink name) pairs
+    """
+    selector = ArtifactSelector([file_pattern for symlink_name, file_pattern in symlink_list])
+    matches = [[] for x in symlink_list]
+    for name in [x for x in names if not x.endswith('.md5')]:
+        for index in selector.match_all(name):
+            if name != symlink_list[index][0]:
+                matches[index].append(name)
 
+    symlinks = []
+    for (symlink_name, file_pattern), matched in zip(symlink_list, matches):
+        if len(matched) > 1:
+            die("Found multiple matching files for pattern %s, matches %s" % (file_pattern, matched))
+        symlinks += [(name, symlink_name) for name in matched]
+    return symlinks
+
+
+def create_symlinks(download_folder, symlink_list):
+    for name, symlink_name in find_symlinks(os.listdir(download_folder), symlink_list):
         logger.debug("Creating symlink %s" % symlink_name)
-        if matched_pair:
-            retcode = subprocess.call(["ln", "-s", matched_pair[0][0], matched_pair[0][1]])
-            if retcode != 0:
-                die("could not create symlink for file %s" % matched_pair[0][0])
+        try:
+            os.symlink(name, os.path.join(download_folder, symlink_name))
+        except OSError as e:
+            die("could not create symlink for file %s: %s" % (name, e))
+
 
-    os.chdir(cur)
+def create_md5file(path, md5=None):
+    """ Writes md5 file for path in the format of md5sum
 
+        :param md5: md5 sum of path, computed if not specified
+    """
+    if md5 is None:
+        md5 = md5_sum(path)
+    with open("%s.md5" % path, 'w') as fh:
+        fh.write("%s  %s\n" % (md5, path))
 
-def create_md5file(path):
-    cmd = "md5sum %s > %s.md5" % (path, path)
-    result = subprocess.Popen(cmd, shell=True, stderr=subprocess.PIPE, stdout=subprocess.PIPE)
-    (stdout, stderr) = result.communicate()
-    if result.returncode != 0:
-        die("could not create md5sum for file %s, output: %s" % (path, stdout + "\n" + stderr))
 
+def create_package(download_folder, package_name, dependency_file, level=DEFAULT_LEVEL, threads=None):
+    """ Creates package_name.tgz of download_folder, renamed to package_name,
+        with the dependency file added, and its md5 file.
 
-def create_package(download_folder, package_name, dependency_file):
+        :param level: gzip compression level
+        :param threads: number of compressing threads. Defaults to the
+                        number of cpus.
+    """
     logger.info("Creating tar archive")
-    shutil.copy(dependency_file, download_folder)
     os.rename(download_folder, package_name)
-    retcode = subprocess.call(["tar", "cvzf", "%s.tgz" % package_name, package_name], stdout=subprocess.PIPE)
-    if retcode != 0:
-        die("could not create tar archive of folder %s" % package_name)
-    create_md5file("%s.tgz" % package_name)
-    # retcode = subprocess.call(["md5sum", "%s.tgz" % package_name], stdout=subprocess.PIPE)
-    # if retcode != 0:
-    #     die("could not create md5sum for file %s" % "%s.tgz" % package_name)
-    logger.info("package %s created" % package_name)
-
-
-def _get_and_evaluate_url(url):
-    """ retrieve and evaluate url with eval"""
-    logger.debug("Querying with url '%s'" % url)
-    content = requests.get(url).text
 
+    def write_members(tar):
+        tar.add(package_name, filter=_log_member)
+        _add_dependency_file(tar, package_name, dependency_file)
+
+    _write_package(package_name, write_members, level, threads)
+
+
+def stream_package(artifacts, package_name, dependency_file, symlink_list, jenkins_client=None, remove_md5s=False, store=None, level=DEFAULT_LEVEL, threads=None, max_workers=DOWNLOAD_WORKERS):
+    """ Creates package_name.tgz by streaming the artifacts directly from
+        jenkins into the archive, without writing them to disk.
+
+        md5 files are downloaded first, and each artifact is checked
+        against its md5 file as it is streamed. Symlinks are written as
+        symlink members.
+
+        :param artifacts: list of (key, url) tuples as given by list_artifacts
+        :param symlink_list: list of (symlink name, file pattern) pairs
+        :param jenkins_client: JenkinsClient used for all requests. If not
+                               specified, the process wide client is used.
+        :param remove_md5s: if set, md5 files are not added to the archive
+        :param store: ArtifactStore to add already downloaded artifacts from.
+                      Streamed artifacts are added to the store.
+        :param max_workers: Number of md5 files downloaded concurrently
+    """
+    logger.info("Streaming artifacts into tar archive")
+    if jenkins_client is None:
+        jenkins_client = get_client()
+    downloader = ArtifactDownloader(jenkins_client, max_workers=max_workers)
+    names = dict((key[2], (key, url)) for key, url in artifacts)
+
+    md5_names = []
+    for name in names:
+        if not name.endswith('.md5'):
+            if name + '.md5' not in names:
+                die("could not find md5 file for artifact %s" % name)
+            md5_names.append(name + '.md5')
+
+    def read_url(url):
+        response = downloader.open(url)
+        try:
+            return response.content
+        finally:
+            response.close()
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        md5_files = dict(zip(md5_names, executor.map(read_url, [names[x][1] for x in md5_names])))
+
+    def write_members(tar):
+        directory_info = tarfile.TarInfo(package_name)
+        directory_info.type = tarfile.DIRTYPE
+        directory_info.mode = 0o755
+        directory_info.mtime = time.time()
+        tar.addfile(_log_member(directory_info))
+
+        for name in sorted(x for x in names if not x.endswith('.md5')):
+            key, url = names[name]
+            expected = parse_md5(md5_files[name + '.md5'].decode('utf-8', 'replace'))
+            _stream_artifact(tar, package_name, name, url, key, expected, downloader, store)
+            if not remove_md5s:
+                _add_content(tar, "%s/%s.md5" % (package_name, name), md5_files[name + '.md5'])
+
+        for name, symlink_name in find_symlinks(names, symlink_list):
+            symlink_info = tarfile.TarInfo("%s/%s" % (package_name, symlink_name))
+            symlink_info.type = tarfile.SYMTYPE
+            symlink_info.linkname = name
+            symlink_info.mode = 0o777
+            symlink_info.mtime = time.time()
+            tar.addfile(_log_member(symlink_info))
+
+        _add_dependency_file(tar, package_name, dependency_file)
+
+    _write_package(package_name, write_members, level, threads)
+
+
+def _stream_artifact(tar, package_name, name, url, key, expected, downloader, store):
+    """ Adds artifact to tar from the store, or streamed from url.
+
+        A streamed artifact is checked against its expected md5 sum. If a
+        store is given, the streamed content is also written to a file in
+        the store folder, and added to the store once the md5 sum is
+        verified.
+
+        :param expected: md5 sum from the md5 file of the artifact
+    """
+    info = tarfile.TarInfo("%s/%s" % (package_name, name))
+    info.mode = 0o644
+    info.mtime = time.time()
+
+    stored = None
+    if store is not None:
+        stored = store.get(key)
+        if stored is None and expected:
+            stored = store.find(expected)
+            if stored is not None:
+                store.add(key, stored, expected)
+    if stored is not None:
+        info.size = os.path.getsize(stored)
+        with open(stored, 'rb') as fh:
+            tar.addfile(_log_member(info), fh)
+        return
+
+    copy = None
+    if store is not None:
+        copy = tempfile.NamedTemporaryFile(dir=store.directory, prefix='.', suffix='.tmp', delete=False)
     try:
-        return eval(content)
-    except:
-        die("Couldn't evaluate content from url '%s' (response '%s')" % (url, content))
+        response = downloader.open(url)
+        try:
+            reader = ResponseReader(response)
+            source = reader if copy is None else _CopyingReader(reader, copy)
+            length = response.headers.get('Content-Length')
+            if length is None or response.headers.get('Content-Encoding'):
+                # size is unknown until the content is read, so it is spooled first
+                with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as spool:
+                    shutil.copyfileobj(source, spool)
+                    info.size = spool.tell()
+                    spool.seek(0)
+                    tar.addfile(_log_member(info), spool)
+            else:
+                info.size = int(length)
+                tar.addfile(_log_member(info), source)
+                if source.read(1):
+                    die("artifact %s is larger than its announced size %s" % (name, length))
+        finally:
+            response.close()
+
+        md5 = reader.md5.hexdigest()
+        if md5 != expected:
+            die("md5 sum for file %s didn't match: %s != %s" % (name, md5, expected))
+        if copy is not None:
+            copy.close()
+            store.add(key, copy.name, md5)
+    finally:
+        if copy is not None:
+            copy.close()
+            os.remove(copy.name)
+
+
+class _CopyingReader(object):
+    """ Read only file object writing everything read from reader to fileobj """
+    def __init__(self, reader, fileobj):
+        self.reader = reader
+        self.fileobj = fileobj
+
+    def read(self, size=-1):
+        data = self.reader.read(size)
+        self.fileobj.write(data)
+        return data
+
+
+def _add_dependency_file(tar, package_name, dependency_file):
+    with open(dependency_file, 'rb') as fh:
+        content = fh.read()
+    _add_content(tar, "%s/%s" % (package_name, os.path.basename(dependency_file)), content, os.path.getmtime(dependency_file))
+
+
+def _add_content(tar, name, content, mtime=None):
+    info = tarfile.TarInfo(name)
+    info.size = len(content)
+    info.mtime = time.time() if mtime is None else mtime
+    info.mode = 0o644
+    tar.addfile(_log_member(info), io.BytesIO(content))
+
+
+def _log_member(tarinfo):
+    logger.debug(tarinfo.name)
+    return tarinfo
+
+
+def _write_package(package_name, write_members, level, threads):
+    """ Writes package_name.tgz with the members written by write_members,
+        and its md5 file. A partially written archive is removed.
+    """
+    archive_name = "%s.tgz" % package_name
+    try:
+        with open(archive_name, 'wb') as fh:
+            with ParallelGzipWriter(fh, level=level, threads=threads) as writer:
+                with tarfile.open(fileobj=writer, mode='w|', format=tarfile.GNU_FORMAT) as tar:
+                    write_members(tar)
+    except BaseException:
+        if os.path.exists(archive_name):
+            os.remove(archive_name)
+        raise
+
+    create_md5file(archive_name, writer.md5.hexdigest())
+    logger.info("package %s created" % package_name)
 
 
 def cli():
@@ -157,6 +413,33 @@ def cli():
     parser.add_option("-m", "--remove-md5s", action="store_true", dest="remove_md5s", default=False,
                       help="if set, removes md5s in file")
 
+    parser.add_option("-s", "--stream", action="store_true", dest="stream", default=False,
+                      help="Stream artifacts directly into the package instead of downloading them to the download folder first.")
+
+    parser.add_option("-w", "--workers", type="int", action="store", dest="workers", default=DOWNLOAD_WORKERS,
+                      help="Number of artifacts downloaded concurrently. default is %s" % DOWNLOAD_WORKERS)
+
+    parser.add_option("--compression-level", type="int", action="store", dest="compression_level", default=DEFAULT_LEVEL,
+                      help="gzip compression level of the package, from 1 to 9. default is %s" % DEFAULT_LEVEL)
+
+    parser.add_option("--threads", type="int", action="store", dest="threads", default=None,
+                      help="Number of threads compressing the package. default is the number of cpus")
+
+    parser.add_option("--cache-dir", type="string", action="store", dest="cache_dir", default=DEFAULT_CACHE_DIR,
+                      help="Folder used to cache jenkins responses between runs. default is '%s'" % DEFAULT_CACHE_DIR)
+
+    parser.add_option("--no-cache", action="store_const", const=None, dest="cache_dir",
+                      help="Do not cache jenkins responses.")
+
+    parser.add_option("--cache-ttl", type="int", action="store", dest="cache_ttl", default=TTL,
+                      help="Number of seconds cached job information is used without asking jenkins. default is %s, ie. job information is always requested" % TTL)
+
+    parser.add_option("--store-dir", type="string", action="store", dest="store_dir", default=DEFAULT_STORE_DIR,
+                      help="Folder used to store downloaded artifacts between runs. default is '%s'" % DEFAULT_STORE_DIR)
+
+    parser.add_option("--no-store", action="store_const", const=None, dest="store_dir",
+                      help="Do not store downloaded artifacts.")
+
     parser.add_option("-v", "--verbose", action="store_true", dest="verbose",
                       help="Verbose output.")
 
@@ -165,6 +448,9 @@ def cli():
     if len(args) < 3:
         parser.error("need view, artifact-keyword and package-name")
 
+    if not 1 <= options.compression_level <= 9:
+        parser.error("--compression-level must be between 1 and 9")
+
     return (options, args[0], args[1], args[2])
 
 
@@ -190,19 +476,26 @@ def main():
     (options, view, artifact_keyword, package_name) = cli()
     setup_logger(options.verbose)
 
-    artifacts = []
-    for name, url in yield_view_jobs(JENKINS_SERVER, JENKINS_USER, view):
-        artifacts += _get_description_artifacts(name, url, artifact_keyword)
+    jenkins_client = JenkinsClient(cache=create_cache(options.cache_dir, options.cache_ttl))
+
+    artifacts = get_view_artifacts(JENKINS_SERVER, JENKINS_USER, view, artifact_keyword, jenkins_client, max_workers=options.workers)
 
-    pattern = "|".join([x[1] for x in artifacts])
+    patterns = [x[1] for x in artifacts]
     if options.pattern:
-        pattern += "|" + options.pattern
+        patterns.append(options.pattern)
+    pattern = ArtifactSelector(patterns)
+
+    if options.stream:
+        target_artifacts = list_artifacts(pattern, DEPENDENCY_FILENAME, JENKINS_SERVER, REPOSITORY_PROJECT, jenkins_client=jenkins_client)
+        stream_package(target_artifacts, package_name, DEPENDENCY_FILENAME, artifacts, jenkins_client, remove_md5s=options.remove_md5s,
+                       store=create_store(options.store_dir), level=options.compression_level, threads=options.threads, max_workers=options.workers)
+        return
 
     if not os.path.exists(options.download_folder):
         os.mkdir(options.download_folder)
 
-    download_artifacts(options.download_folder, pattern, DEPENDENCY_FILENAME, JENKINS_SERVER, REPOSITORY_PROJECT)
-    check_md5_sums(options.download_folder)
+    md5_sums = download_artifacts(options.download_folder, pattern, DEPENDENCY_FILENAME, JENKINS_SERVER, REPOSITORY_PROJECT, jenkins_client=jenkins_client, max_workers=options.workers, store=create_store(options.store_dir))
+    check_md5_sums(options.download_folder, md5_sums)
 
     create_symlinks(options.download_folder, artifacts)
 
@@ -212,7 +505,7 @@ def main():
             if path.endswith('.md5'):
                 os.remove(path)
 
-    create_package(options.download_folder, package_name, DEPENDENCY_FILENAME)
+    create_package(options.download_folder, package_name, DEPENDENCY_FILENAME, level=options.compression_level, threads=options.threads)
 
 if __name__ == '__main__':
     main()
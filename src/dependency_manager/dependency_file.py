@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -*- mode: python -*-
+"""
+:mod:`dependency_manager.dependency_file` -- offline dependency file parser
+===========================================================================
+
+===============
+Dependency File
+===============
+
+Contains functions used to parse dependency files, as written by the
+DependencyList class, without contacting jenkins.
+
+A dependency file is parsed into a DependencyFile holding the master
+project and a DependencyRecord for each entry. Records are plain tuples,
+jenkins objects can be created from them when remote data is needed.
+
+Files are memory mapped and tokenized in a single pass with precompiled
+patterns. iter_records yields the records one at a time together with
+their byte offset, and find_record stops at the first entry with the
+requested name without materializing the entries before it, eg.::
+
+    with mapped_file('dependencies.txt') as data:
+        record = find_record(data, 'some-job')
+"""
+import collections
+import contextlib
+import logging
+import mmap
+import re
+
+from .common import die
+from .common import NullHandler
+
+# define logger
+logger = logging.getLogger("dbc." + __name__)
+logger.addHandler(NullHandler())
+
+DependencyRecord = collections.namedtuple('DependencyRecord', ['name', 'added_by', 'build_number', 'scm', 'is_repository', 'offset'])
+DependencyFile = collections.namedtuple('DependencyFile', ['name', 'build_number', 'scm', 'records'])
+
+# An entry is a line starting with the project name, followed by indented field lines
+_ENTRY_PATTERN = re.compile(rb'^([^\s#][^\r\n]*)[\r\n]*((?:[ \t][^\r\n]*[\r\n]*)*)', re.M)
+_FIELD_PATTERN = re.compile(rb'^[ \t]+(Added by: |Build: |SVN/GIT: |SVN: )?([^\r\n]*)', re.M)
+_HEAD_PATTERN = re.compile(rb'^###( Project: | Build: | SVN: |      )([^\r\n]*)', re.M)
+_SCM_PATTERN = re.compile(r'^(.*?)\s*\(rev: (.*)\)\s*$')
+
+
+@contextlib.contextmanager
+def mapped_file(filename):
+    """ Memory maps dependency file for reading
+
+        :return: context manager giving the mapped content. An empty
+                 file gives an empty bytes object.
+    """
+    with open(filename, 'rb') as fh:
+        try:
+            data = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files cannot be mapped
+            yield b''
+            return
+        try:
+            yield data
+        finally:
+            data.close()
+
+
+def read_dependency_file(filename, repository_project=None):
+    """ Reads and parses dependency file
+
+        :param filename: path of the dependency file
+        :param repository_project: The name of the jenkins project used as
+               repository for 3rd party artifacts
+        :return: DependencyFile
+    """
+    with mapped_file(filename) as data:
+        return parse_dependency_file(data, repository_project)
+
+
+def parse_dependency_file(dependency_string, repository_project=None):
+    """ Parses dependency string as outputtet by the DependencyList class.
+
+        :param dependency_string: The dependency string, or bytes, to parse
+        :param repository_project: The name of the jenkins project used as
+               repository for 3rd party artifacts. Entries with this scm
+               path are marked as repository artifacts.
+        :return: DependencyFile with name, build number and scm lines of
+                 the master project and a list of DependencyRecord entries
+    """
+    data = _to_bytes(dependency_string)
+    name, build_number, scm = parse_head(data)
+    return DependencyFile(name, build_number, scm, list(iter_records(data, repository_project)))
+
+
+def parse_head(data):
+    """ Parses the master project lines at the top of dependency file content
+
+        :return: tuple of master project name, build number and scm lines
+    """
+    data = _to_bytes(data)
+    first_entry = _ENTRY_PATTERN.search(data)
+    end = first_entry.start() if first_entry else len(data)
+
+    name = None
+    build_number = None
+    scm = []
+    for match in _HEAD_PATTERN.finditer(data, 0, end):
+        key, value = match.groups()
+        if key == b' Project: ':
+            name = _decode(value).strip()
+        elif key == b' Build: ':
+            build_number = int(value)
+        elif key == b' SVN: ' or scm:
+            scm.append(_parse_scm_line(_decode(value)))
+
+    if name is None or build_number is None:
+        die("Could not find master project and build in dependency file")
+
+    return name, build_number, scm
+
+
+def iter_records(data, repository_project=None):
+    """ Yields the entries of dependency file content one at a time
+
+        :param data: dependency file content as bytes or memory map
+        :param repository_project: The name of the jenkins project used as
+               repository for 3rd party artifacts
+        :return: generator of DependencyRecord, each with the byte offset
+                 of the entry in data
+    """
+    for match in _ENTRY_PATTERN.finditer(_to_bytes(data)):
+        yield _create_record(match, repository_project)
+
+
+def find_record(data, name, repository_project=None):
+    """ Finds the entry for project name in dependency file content.
+        Scanning stops at the first matching entry, and only that entry
+        is parsed.
+
+        :return: DependencyRecord, or None if name is not among the entries
+    """
+    encoded_name = name.encode('utf-8')
+    for match in _ENTRY_PATTERN.finditer(_to_bytes(data)):
+        if match.group(1).strip() == encoded_name:
+            return _create_record(match, repository_project)
+    return None
+
+
+def _create_record(match, repository_project):
+    """ Creates DependencyRecord from an entry match """
+    name = _decode(match.group(1)).strip()
+    added_by = None
+    build_number = None
+    scm = []
+
+    for field in _FIELD_PATTERN.finditer(match.group(2)):
+        key, value = field.groups()
+        if key == b'Added by: ':
+            added_by = _decode(value).strip()
+        elif key == b'Build: ':
+            build_number = int(value)
+        elif key is not None or scm:
+            scm.append(_parse_scm_line(_decode(value)))
+
+    if build_number is None:
+        die("Could not find build number of '%s' in dependency file" % name)
+
+    is_repository = repository_project is not None and bool(scm) and scm[0][0] == repository_project
+    return DependencyRecord(name, added_by, build_number, scm, is_repository, match.start())
+
+
+def _parse_scm_line(line):
+    """ Parses scm line of format '<path>     (rev: <revision>)'
+
+        :return: tuple of path and revision. Revision is None if not present.
+    """
+    match = _SCM_PATTERN.match(line)
+    if match is None:
+        return line.strip(), None
+    return match.group(1).strip(), match.group(2).strip()
+
+
+def _to_bytes(data):
+    if isinstance(data, str):
+        return data.encode('utf-8')
+    return data
+
+
+def _decode(value):
+    return value.decode('utf-8', 'replace')
@@ -19,11 +19,16 @@ during creation a DependencyException is raised. The class also
 contains a add_depedency method that allows to build/add
 dependencies 'by hand'.
 """
+import io
 import logging
-import re
+import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+from .dependency_file import parse_dependency_file
+from .jenkins_client import get_client
 from .jenkins_project import JenkinsProject
+from .project_registry import ProjectRegistry
 from .repository_project import JenkinsRepositoryProject
 from .common import die
 from .common import NullHandler
@@ -54,7 +59,7 @@ def pad(string, size, pad_char=" ", direction='left'):
 class DependencyList(object):
     """ Dependencylist for jenkins projects
     """
-    def __init__(self, jenkins_server, jenkins_project, dependency_filename, repository_project, jenkins_credentials=None, recursive=True):
+    def __init__(self, jenkins_server, jenkins_project, dependency_filename, repository_project, jenkins_credentials=None, recursive=True, jenkins_client=None, registry=None, max_workers=1):
         """ Initializes dependency list
 
             :param jenkins_server: url of the jenkins server hosting projects
@@ -66,49 +71,98 @@ class DependencyList(object):
                               jenkins_projects are examined for dependency files
                               and these are incorperated into the dependency list.
                               Default is True.
+            :param jenkins_client: JenkinsClient shared by all projects in
+                                   the list. If not specified, the process
+                                   wide client for jenkins_credentials is used.
+            :param registry: ProjectRegistry used to intern projects and
+                             parsed upstream dependency files. If not
+                             specified, a registry of its own is used, so
+                             projects resolved to the last successful build
+                             are not kept beyond this list.
+            :param max_workers: Number of projects resolved concurrently.
+                                Default is 1, which resolves them in sequence.
         """
         self.jenkins_server = jenkins_server
         self.master_project = jenkins_project
         self.jenkins_credentials = jenkins_credentials
+        self.jenkins_client = jenkins_client
+        if self.jenkins_client is None:
+            self.jenkins_client = get_client(jenkins_credentials)
+        self.registry = registry
+        if self.registry is None:
+            self.registry = ProjectRegistry()
         self.dependency_filename = dependency_filename
         self.repository_project = repository_project
-        #TODO: Support GIT
-        self.scm_info = self.master_project.get_scm_info()
-
         self.dependencies = []
+        self._index = {}
+        self._scm_info = {}
         self.recursive = recursive
+        self.max_workers = max_workers
 
         if self.recursive:
             self._add_upstream_dependencies()
 
-    def add_dependency(self, jenkins_project, added_by=None):
+    @property
+    def scm_info(self):
+        """ Version management information for the master project """
+        return self.master_project.get_scm_info()
+
+    def add_dependency(self, jenkins_project, added_by=None, scm_info=None):
         """ adds project to dependency list.
 
             :param jenkins_project: The project to add to dependency list
             :param added_by: The project adding this dependency.
                              If None the master project for this list is used
+            :param scm_info: Version management information of the project,
+                             as parsed from an upstream dependency file. If
+                             None it is retrieved from the project when the
+                             list is written.
         """
-        if self.dependencies and jenkins_project in [x[0] for x in self.dependencies]:
+        if jenkins_project.name in self._index:
             self._check_for_dependency_mismatch(jenkins_project)
 
         else:
             self.dependencies.append((jenkins_project, added_by))
+            self._index[jenkins_project.name] = jenkins_project
+
+        if scm_info is not None:
+            self._scm_info.setdefault(jenkins_project.name, scm_info)
 
     def tostring(self):
         """ Returns string representation of dependency list
 
             :return: string representation of dependency list
         """
-        string = self._create_head_string() + "\n"
-        for dependency in self.dependencies:
-            string += self._create_dependency_string(*dependency) + "\n"
-        return string
+        fh = io.StringIO()
+        self.write(fh)
+        return fh.getvalue()
 
     def tofile(self, filename):
-        """ Writes dependency  list to file
+        """ Writes dependency  list to file.
+
+            The list is written to a temporary file next to filename,
+            which replaces filename when the list is complete.
         """
-        with open(filename, 'w') as fh:
-            fh.write(self.tostring())
+        tmp_filename = "%s.%s.tmp" % (filename, os.getpid())
+        try:
+            with open(tmp_filename, 'w') as fh:
+                self.write(fh)
+            os.replace(tmp_filename, filename)
+        except:
+            if os.path.exists(tmp_filename):
+                os.remove(tmp_filename)
+            raise
+
+    def write(self, fh):
+        """ Writes dependency list to file handle, one entry at a time
+        """
+        # Projects fetch their information lazily, fetch it up front for the
+        # entries whose version information was not in an upstream dependency file
+        self._map(lambda x: x.get_scm_info(), [self.master_project] + [x[0] for x in self.dependencies if x[0].name not in self._scm_info])
+
+        fh.write(self._create_head_string() + "\n")
+        for dependency in self.dependencies:
+            fh.write(self._create_dependency_string(*dependency) + "\n")
 
     def get_dependency(self, name):
         """ Retrieves project with name from internal list of dependencies
@@ -128,139 +182,187 @@ class DependencyList(object):
     def _add_upstream_dependencies(self):
         """ Adds upstream projects and their dependencies to local dependency list
         """
-        upstream_projects = []
+        upstreams = []
 
         if 'upstreamProjects' in self.master_project.info:
-            for upstream_name in self.master_project.get_upstreams():
+            upstreams = self._map(self._resolve_upstream, self.master_project.get_upstreams())
+
+        for upstream_project, dependencies in upstreams:
+            self.add_dependency(upstream_project, None)
 
-                upstream_project = JenkinsProject(self.jenkins_server, upstream_name, jenkins_credentials=self.jenkins_credentials )
-                upstream_projects.append(upstream_project)
-                self.add_dependency(upstream_project, None)
+        for upstream_project, dependencies in upstreams:
+            for project in dependencies:
+                self.add_dependency(*project)
 
-        for upstream_dependency_content in [x.get_dependency_file_content(self.dependency_filename) for x in upstream_projects]:
+    def _resolve_upstream(self, upstream_name):
+        """ Creates upstream project and retrieves its dependencies
+
+            :return: tuple of upstream project and list of its dependencies
+        """
+        upstream_project = _get_project(self.registry, self.jenkins_server, upstream_name, None, self.jenkins_client)
+        return upstream_project, self._get_upstream_dependencies(upstream_project)
+
+    def _map(self, function, items):
+        """ Applies function to items, using up to max_workers threads.
+            Results are returned in the order of items.
+        """
+        items = list(items)
+        if self.max_workers <= 1 or len(items) <= 1:
+            return [function(x) for x in items]
+
+        logger.debug("Resolving %s projects with %s workers" % (len(items), self.max_workers))
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(items))) as executor:
+            return list(executor.map(function, items))
+
+    def _get_upstream_dependencies(self, upstream_project):
+        """ Retrieves the parsed content of the dependency file of upstream_project.
+            Each upstream build is only fetched and parsed once per process.
+
+            :return: list of (project, added_by) tuples, with the upstream
+                     dependency files master project first.
+        """
+        def parse():
+            content = upstream_project.get_dependency_file_content(self.dependency_filename)
+            return _parse_upstream_dependencies(self.jenkins_server, content, self.repository_project, self.jenkins_client, self.registry)
 
-            if upstream_dependency_content:
-                main_project, projects = parse_dependency_string(self.jenkins_server, upstream_dependency_content, self.repository_project, jenkins_credentials=self.jenkins_credentials)
-                for project in [main_project] + projects:
-                    self.add_dependency(*project)
+        key = _dependency_file_key(self.jenkins_server, upstream_project, self.dependency_filename)
+        return self.registry.get_dependency_file(key, parse)
 
     def _get_dependency(self, name):
-        """ Retrieves project with name from internal list of dependencies
+        """ Retrieves project with name from the name index of dependencies, or None
         """
-        project = None
-        for dependency in [x[0] for x in self.dependencies]:
-            if dependency.name == name:
-                project = dependency
-                break
-        return project
+        return self._index.get(name)
 
     def _create_dependency_string(self, project, added_by):
         """ Creates dependency string for project entry"""
         if not added_by:
             added_by = self.master_project.name
-        #TODO: Support GIT
-        scm_info = project.get_scm_info()
 
-        dependency_string = "%s\n" % project.name
-        dependency_string += "   Added by: %s\n" % added_by
-        dependency_string += "   Build: %s\n" % project.build_number
+        lines = [project.name,
+                 "   Added by: %s" % added_by,
+                 "   Build: %s" % project.build_number]
 
-        svn_strings = []
-        if scm_info:
-            info_len = max([len(x[0]) for x in scm_info])
-            svn_strings = ["%s     (rev: %s)" % (pad(x[0], info_len, direction='right'), x[1]) for x in scm_info]
-            dependency_string += "   SVN/GIT: %s" % svn_strings[0]
-            svn_strings = svn_strings[1:]
+        scm_info = self._scm_info.get(project.name)
+        if scm_info is None:
+            scm_info = project.get_scm_info()
 
-        for svn_project in svn_strings:
-            dependency_string += "\n        %s" % svn_project
+        svn_strings = _format_scm_info(scm_info)
+        if svn_strings:
+            lines.append("   SVN/GIT: %s" % svn_strings[0])
+            lines.extend(["        %s" % x for x in svn_strings[1:]])
 
-        return dependency_string.strip()
+        return "\n".join(lines)
 
     def _create_head_string(self):
         """ creates dependency string for master project """
         creation_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-        info_len = 0
-        svn_strings = []
-        if self.scm_info:
-            info_len = max([len(x[0]) for x in self.scm_info])
-            svn_strings = ["%s     (rev: %s)" % (pad(x[0], info_len, direction='right'), x[1]) for x in self.scm_info]
-
-        head = "\n".join(["### File created: %s" % creation_date,
-                          "### Project: %s" % self.master_project.name,
-                          "### Build: %s" % self.master_project.build_number])
+        lines = ["### File created: %s" % creation_date,
+                 "### Project: %s" % self.master_project.name,
+                 "### Build: %s" % self.master_project.build_number]
 
-        if self.scm_info:
-            head += "\n### SVN: %s" % svn_strings[0]
-            svn_strings = svn_strings[1:]
+        svn_strings = _format_scm_info(self.scm_info)
+        if svn_strings:
+            lines.append("### SVN: %s" % svn_strings[0])
+            lines.extend(["###      %s" % x for x in svn_strings[1:]])
 
-        for svn_project in svn_strings:
-            head += "\n###      %s" % svn_project
-
-        head += "\n"
-        return head
+        return "\n".join(lines) + "\n"
 
     def __str__(self):
         return self.tostring()
 
 
-def parse_dependency_string(jenkins_url, dependency_string, repository_project, jenkins_credentials=None):
+def _format_scm_info(scm_info):
+    """ Formats scm info as lines of path and revision, with the paths
+        padded to a common width.
+    """
+    if not scm_info:
+        return []
+    info_len = max([len(x[0]) for x in scm_info])
+    return ["%s     (rev: %s)" % (pad(x[0], info_len, direction='right'), x[1]) for x in scm_info]
+
+
+def parse_dependency_string(jenkins_url, dependency_string, repository_project, jenkins_credentials=None, jenkins_client=None, registry=None):
     """ Parses depedency string as outputtet by the DependencyList class.
 
         :param jenkins_url: The jenkins server containing the projects
         :param dependency_string: The dependency string to parse
         :param repository_project: The name of the jenkins project
                used as repository for 3rd party artifacts
+        :param jenkins_client: JenkinsClient shared by the created projects.
+               If not specified, the process wide client for
+               jenkins_credentials is used.
+        :param registry: ProjectRegistry the created projects are interned in.
+               If not specified, the projects are not shared with other calls.
         :return: Tuple where first entry is the master project,
                  and the second is a list of dependent projects.
     """
+    if jenkins_client is None:
+        jenkins_client = get_client(jenkins_credentials)
+    if registry is None:
+        registry = ProjectRegistry()
+
+    dependency_file = parse_dependency_file(dependency_string, repository_project)
+    main_project = (_get_project(registry, jenkins_url, dependency_file.name, dependency_file.build_number, jenkins_client), None)
+
+    projects = [_add_jenkins_project(x, jenkins_url, repository_project, jenkins_client, registry) for x in dependency_file.records]
+
+    return main_project, projects
 
-    projects = []
-    project = []
 
-    main_project = _create_main_project(dependency_string, jenkins_url, jenkins_credentials=jenkins_credentials)
+def _parse_upstream_dependencies(jenkins_url, content, repository_project, jenkins_client, registry):
+    """ Parses content of upstream dependency file
+
+        :return: list of (project, added_by, scm_info) tuples, with the
+                 master project first. scm_info is the version management
+                 information of the entry in the dependency file. Empty if
+                 there is no content.
+    """
+    if not content:
+        return []
+    dependency_file = parse_dependency_file(content, repository_project)
+    main_project = (_get_project(registry, jenkins_url, dependency_file.name, dependency_file.build_number, jenkins_client), None, dependency_file.scm)
+    projects = [_add_jenkins_project(x, jenkins_url, repository_project, jenkins_client, registry) + (x.scm,) for x in dependency_file.records]
+    return [main_project] + projects
 
-    for line in [x for x in dependency_string.split('\n') if x != ""]:
-        if not line.startswith('#'):
 
-            if not line.startswith(' '):
+def _add_jenkins_project(record, jenkins_url, repository_project, jenkins_client, registry):
+    """ Creates project for dependency record
 
-                if project:
-                    projects.append(_add_jenkins_project(project, jenkins_url, repository_project, jenkins_credentials=jenkins_credentials))
-                project = []
-                project.append(line.strip())
+        :return: tuple of project and the name of the project adding it
+    """
+    if not record.is_repository:
+        return (_get_project(registry, jenkins_url, record.name, record.build_number, jenkins_client), record.added_by)
+    else:
+        return (_get_repository_project(registry, jenkins_url, record.name, repository_project, record.build_number, jenkins_client), record.added_by)
 
-            else:
-                project.append(line.strip())
 
-    if project:
-        projects.append(_add_jenkins_project(project, jenkins_url, repository_project, jenkins_credentials=jenkins_credentials))
+def _project_key(jenkins_url, name, build_number):
+    """ Key of jenkins project in the project registry """
+    return (jenkins_url.rstrip('/'), name, build_number)
 
-    return main_project, projects
 
+def _repository_project_key(jenkins_url, name, repository_project, build_number):
+    """ Key of repository artifact in the project registry """
+    return (jenkins_url.rstrip('/'), repository_project, name, build_number)
 
-def _create_main_project(dependency_string, jenkins_url, jenkins_credentials=None):
-    main_project_regex = "^### Project: (.+)$"
-    build_regex = "^### Build: (.+)$"
 
-    main_project_name = re.search(main_project_regex, dependency_string, re.M).group(1)
-    main_build = int(re.search(build_regex, dependency_string, re.M).group(1))
+def _dependency_file_key(jenkins_url, project, dependency_filename):
+    """ Key of the parsed dependency file of a project build in the project registry """
+    return (jenkins_url.rstrip('/'), project.name, project.build_number, dependency_filename)
 
-    return (JenkinsProject(jenkins_url, main_project_name, jenkins_credentials=jenkins_credentials, build_number=main_build), None)
 
+def _get_project(registry, jenkins_url, name, build_number, jenkins_client):
+    """ Retrieves JenkinsProject from registry, creating it if not present """
+    def create():
+        return JenkinsProject(jenkins_url, name, jenkins_client=jenkins_client, build_number=build_number)
 
-def _add_jenkins_project(project, jenkins_url, repository_project, jenkins_credentials=None):
+    return registry.get_project(_project_key(jenkins_url, name, build_number), create)
 
-    name = project[0]
-    added_by = project[1].replace("Added by: ", "")
-    build_number = int(project[2].replace("Build: ", ""))
 
-    svn = None
-    if len(project) > 3:
-        svn = project[3].replace('(SVN|SVN/GIT): ', '').split()[1]
+def _get_repository_project(registry, jenkins_url, name, repository_project, build_number, jenkins_client):
+    """ Retrieves JenkinsRepositoryProject from registry, creating it if not present """
+    def create():
+        return JenkinsRepositoryProject(jenkins_url, name, repository_project, build_number=build_number, jenkins_client=jenkins_client)
 
-    if svn != repository_project:
-        return (JenkinsProject(jenkins_url, name, jenkins_credentials=jenkins_credentials, build_number=build_number), added_by)
-    else:
-        return(JenkinsRepositoryProject(jenkins_url, name, repository_project, build_number=build_number), added_by)
+    return registry.get_project(_repository_project_key(jenkins_url, name, repository_project, build_number), create)
@@ -22,14 +22,24 @@ build is aborted.
 """
 import logging
 import os
-import re
-import urllib.request, urllib.parse, urllib.error
 
+from . import async_dependency_list
+from .artifact_downloader import DOWNLOAD_WORKERS
+from .async_jenkins_client import MAX_IN_FLIGHT
+from .artifact_downloader import download_files
+from .artifact_selector import create_selector
+from .artifact_store import DEFAULT_STORE_DIR
+from .artifact_store import create_store
+from .artifact_store import download_with_store
 from .dependency_list import DependencyList
 from .dependency_list import parse_dependency_string
+from .jenkins_client import JenkinsClient
+from .jenkins_client import get_client
 from .jenkins_project import JenkinsProject
 from .repository_project import JenkinsRepositoryProject
-from .common import DependencyException
+from .response_cache import DEFAULT_CACHE_DIR
+from .response_cache import TTL
+from .response_cache import create_cache
 from .common import NullHandler
 
 # define logger
@@ -37,100 +47,135 @@ logger = logging.getLogger("dbc." + __name__)
 logger.addHandler(NullHandler())
 
 
-def download_artifacts(target_folder, pattern, dependency_filename, jenkins_server, repository_project, jenkins_credentials=None):
-    """ Download artifacts from projects specified in the
+def list_artifacts(pattern, dependency_filename, jenkins_server, repository_project, jenkins_credentials=None, jenkins_client=None):
+    """ Lists artifacts of the projects specified in the
         local dependency filename
 
-        :param target_folder: Folder to place downloaded artifacts in
-        :param pattern: Regular expression to filter artifacts to download
+        :param pattern: Regular expression, list of regular expressions or
+                        ArtifactSelector to filter artifacts
         :param dependency_filename: name of dependency file
         :param jenkins_server: The url of the jenkins server
         :param repository_project: Name of repository project
+        :param jenkins_client: JenkinsClient used for all requests
+        :return: list of (key, url) tuples, where key is a tuple of
+                 project name, build number and artifact filename
     """
-    logger.info('Downloading artifacts')
-    logger.debug('Using pattern %s' % pattern)
+    selector = create_selector(pattern)
+    logger.debug('Using patterns %s' % selector.patterns)
     target_artifacts = []
-    
+    if jenkins_client is None:
+        jenkins_client = get_client(jenkins_credentials)
+
     with open(dependency_filename) as fh:
         content = fh.read()
-        main_project, dependencies = parse_dependency_string(jenkins_server, content, repository_project, jenkins_credentials=jenkins_credentials)
+        main_project, dependencies = parse_dependency_string(jenkins_server, content, repository_project, jenkins_credentials=jenkins_credentials, jenkins_client=jenkins_client)
 
         for project, added_by in [main_project] + dependencies:
 
             for key, value in project.get_artifacts().items():
 
-                if not key == dependency_filename and re.match(pattern, key):
-                    target_artifacts.append((key, value))
+                if not key == dependency_filename and selector.match(key) is not None:
+                    target_artifacts.append(((project.name, project.build_number, key), value))
+
+    return target_artifacts
+
+
+def download_artifacts(target_folder, pattern, dependency_filename, jenkins_server, repository_project, jenkins_credentials=None, jenkins_client=None, max_workers=DOWNLOAD_WORKERS, store=None):
+    """ Download artifacts from projects specified in the
+        local dependency filename
+
+        :param target_folder: Folder to place downloaded artifacts in
+        :param pattern: Regular expression, list of regular expressions or
+                        ArtifactSelector to filter artifacts to download
+        :param dependency_filename: name of dependency file
+        :param jenkins_server: The url of the jenkins server
+        :param repository_project: Name of repository project
+        :param jenkins_client: JenkinsClient used for all requests
+        :param max_workers: Number of artifacts downloaded concurrently
+        :param store: ArtifactStore to place already downloaded artifacts
+                      from. If not specified, all artifacts are downloaded.
+        :return: dictionary of md5 sums by path of the placed artifacts
+    """
+    logger.info('Downloading artifacts')
+    if jenkins_client is None:
+        jenkins_client = get_client(jenkins_credentials)
+
+    target_artifacts = list_artifacts(pattern, dependency_filename, jenkins_server, repository_project, jenkins_credentials=jenkins_credentials, jenkins_client=jenkins_client)
 
     if target_artifacts and not os.path.exists(target_folder):
         os.mkdir(target_folder)
 
-    for name, url in target_artifacts:
-        logger.debug("downloading '%s' from '%s'" % (name, url))
-        urllib.request.urlretrieve(url, os.path.join(target_folder, name))
+    def download(downloads):
+        return download_files(downloads, jenkins_client=jenkins_client, max_workers=max_workers)
 
+    downloads = [(store_key, url, os.path.join(target_folder, store_key[2])) for store_key, url in target_artifacts]
+    if store is None:
+        return download([(url, path) for store_key, url, path in downloads])
+    return download_with_store(store, downloads, download)
 
-def add_project_or_artifact(project_or_artifact, project_type, dependency_filename, jenkins_server, repository_project, jenkins_credentials=None):
+
+def add_project_or_artifact(project_or_artifact, project_type, dependency_filename, jenkins_server, repository_project, jenkins_credentials=None, jenkins_client=None):
     """ Add projectrepository artifact to local dependency file.
 
         :param project: Adds non upstream project to dependency file.
         :param dependency_filename: name of dependency file
         :param jenkins_server: The url of the jenkins server
         :param repository_project: Name of repository project
+        :param jenkins_client: JenkinsClient used for all requests
     """
     logger.info("adding %s '%s' to %s" % (project_type, project_or_artifact, dependency_filename))
     dependency_list = None
+    if jenkins_client is None:
+        jenkins_client = get_client(jenkins_credentials)
 
     with open(dependency_filename) as fh:
         content = fh.read()
 
-        main_project, dependencies = parse_dependency_string(jenkins_server, content, repository_project, jenkins_credentials=jenkins_credentials)
+        main_project, dependencies = parse_dependency_string(jenkins_server, content, repository_project, jenkins_client=jenkins_client)
 
-        dependency_list = DependencyList(jenkins_server, main_project[0], dependency_filename, repository_project, jenkins_credentials=jenkins_credentials, recursive=False)
+        dependency_list = DependencyList(jenkins_server, main_project[0], dependency_filename, repository_project, recursive=False, jenkins_client=jenkins_client)
         for dependency in dependencies:
             dependency_list.add_dependency(*dependency)
 
-        project = _create_project(project_or_artifact, project_type, jenkins_server, repository_project, jenkins_credentials=jenkins_credentials)
+        project = _create_project(project_or_artifact, project_type, jenkins_server, repository_project, jenkins_client)
         dependency_list.add_dependency(project, added_by=main_project[0].name)
 
         upstream_dependency_content = project.get_dependency_file_content(dependency_filename)
         if upstream_dependency_content:
-            main_project, projects = parse_dependency_string(jenkins_server, upstream_dependency_content, repository_project, jenkins_credentials=jenkins_credentials)
+            main_project, projects = parse_dependency_string(jenkins_server, upstream_dependency_content, repository_project, jenkins_client=jenkins_client)
             for project in [main_project] + projects:
                 dependency_list.add_dependency(*project)
     dependency_list.tofile(dependency_filename)
 
 
-def _create_project(project_or_artifact, project_type, jenkins_server, repository_project,jenkins_credentials=None):
+def _create_project(project_or_artifact, project_type, jenkins_server, repository_project, jenkins_client):
 
     if project_type == 'project':
         logger.debug("Creating project")
-        return JenkinsProject(jenkins_server, project_or_artifact, jenkins_credentials=jenkins_credentials)
+        return JenkinsProject(jenkins_server, project_or_artifact, jenkins_client=jenkins_client)
 
     logger.debug("Creating repository project")
-    return JenkinsRepositoryProject(jenkins_server, project_or_artifact, repository_project)
+    return JenkinsRepositoryProject(jenkins_server, project_or_artifact, repository_project, jenkins_client=jenkins_client)
 
 
-def build_dependency_file(job_name, build_number, dependency_filename, jenkins_server, repository_project, jenkins_credentials=None):
+def build_dependency_file(job_name, build_number, dependency_filename, jenkins_server, repository_project, jenkins_credentials=None, jenkins_client=None, max_workers=None):
     """ Builds dependency file.
 
+        The dependency graph is resolved with asyncio by
+        async_dependency_list.build_dependency_file, on a new event loop.
+
         :param job_name: name of master project to build dependency file for
         :param build_number: Build number of master project
         :param dependency_filename: name of dependency file
         :param jenkins_server: The url of the jenkins server
+        :param jenkins_client: JenkinsClient used for all requests
+        :param max_workers: Maximum number of concurrent requests. If not
+                            specified, MAX_IN_FLIGHT is used.
     """
-    logger.info("Building dependency file for project %s-%s" % (job_name, build_number))
-    project = JenkinsProject(jenkins_server, job_name, build_number, jenkins_credentials)
-    try:
-
-        dependency_list = DependencyList(jenkins_server, project, dependency_filename, repository_project, jenkins_credentials=jenkins_credentials)
-        dependency_list.tofile(dependency_filename)
-        logger.info("Dependency file '%s' created" % dependency_filename)
-        return dependency_list
-    except DependencyException as e:
-        logger.warning("Aborting build %s-%s, dependency mismatch detected" % (job_name, build_number))
-        project.abort_build()
-        raise e
+    if jenkins_client is None:
+        jenkins_client = get_client(jenkins_credentials)
+    return async_dependency_list.build_dependency_file(job_name, build_number, dependency_filename, jenkins_server, repository_project,
+                                                      jenkins_client=jenkins_client, max_in_flight=max_workers or MAX_IN_FLIGHT)
 
 
 def cli():
@@ -156,6 +201,23 @@ def cli():
     parser.add_option("-c", "--credentials", type="string", action="store", dest="jenkins_credentials", default=None,
                       help="Jenkins credentials. Ex.: 'someuser:somepass'")
 
+    parser.add_option("-w", "--workers", type="int", action="store", dest="workers", default=None,
+                      help="Number of concurrent requests when resolving dependencies, default is %s, or of artifacts downloaded concurrently, default is %s" % (MAX_IN_FLIGHT, DOWNLOAD_WORKERS))
+
+    parser.add_option("--cache-dir", type="string", action="store", dest="cache_dir", default=DEFAULT_CACHE_DIR,
+                      help="Folder used to cache jenkins responses between runs. default is '%s'" % DEFAULT_CACHE_DIR)
+
+    parser.add_option("--no-cache", action="store_const", const=None, dest="cache_dir",
+                      help="Do not cache jenkins responses.")
+
+    parser.add_option("--cache-ttl", type="int", action="store", dest="cache_ttl", default=TTL,
+                      help="Number of seconds cached job information is used without asking jenkins. default is %s, ie. job information is always requested" % TTL)
+
+    parser.add_option("--store-dir", type="string", action="store", dest="store_dir", default=DEFAULT_STORE_DIR,
+                      help="Folder used to store downloaded artifacts between runs. default is '%s'" % DEFAULT_STORE_DIR)
+
+    parser.add_option("--no-store", action="store_const", const=None, dest="store_dir",
+                      help="Do not store downloaded artifacts.")
 
     parser.add_option("-v", "--verbose", action="store_true", dest="verbose",
                       help="Verbose output.")
@@ -204,25 +266,27 @@ def main():
     (options, args) = cli()
     setup_logger(options.verbose)
 
+    jenkins_client = JenkinsClient(options.jenkins_credentials, cache=create_cache(options.cache_dir, options.cache_ttl))
+
     if options.download_folder:
 
         pattern = ".*"
         if options.pattern:
             pattern = options.pattern
 
-        download_artifacts(options.download_folder, pattern, DEPENDENCY_FILENAME, JENKINS_SERVER, REPOSITORY_PROJECT, jenkins_credentials=options.jenkins_credentials)
+        download_artifacts(options.download_folder, pattern, DEPENDENCY_FILENAME, JENKINS_SERVER, REPOSITORY_PROJECT, jenkins_client=jenkins_client, max_workers=options.workers or DOWNLOAD_WORKERS, store=create_store(options.store_dir))
 
     elif options.repository:
-        add_project_or_artifact(options.repository, 'repository artifact', DEPENDENCY_FILENAME, JENKINS_SERVER, REPOSITORY_PROJECT, jenkins_credentials=options.jenkins_credentials)
+        add_project_or_artifact(options.repository, 'repository artifact', DEPENDENCY_FILENAME, JENKINS_SERVER, REPOSITORY_PROJECT, jenkins_client=jenkins_client)
 
     elif options.add_project:
-        add_project_or_artifact(options.add_project, 'project', DEPENDENCY_FILENAME, JENKINS_SERVER, REPOSITORY_PROJECT, jenkins_credentials=options.jenkins_credentials)
+        add_project_or_artifact(options.add_project, 'project', DEPENDENCY_FILENAME, JENKINS_SERVER, REPOSITORY_PROJECT, jenkins_client=jenkins_client)
 
     else:
         job_name = args[0]
         build_number = args[1]
 
-        build_dependency_file(job_name, build_number, DEPENDENCY_FILENAME, JENKINS_SERVER, REPOSITORY_PROJECT, jenkins_credentials=options.jenkins_credentials)
+        build_dependency_file(job_name, build_number, DEPENDENCY_FILENAME, JENKINS_SERVER, REPOSITORY_PROJECT, jenkins_client=jenkins_client, max_workers=options.workers)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -*- mode: python -*-
+"""
+:mod:`dependency_manager.git_mirror` -- local mirrors of git repositories
+=========================================================================
+
+==========
+Git Mirror
+==========
+
+Contains class used to answer git history questions from local mirrors.
+
+Each remote repository is cloned once as a bare mirror, and is only
+fetched again when a requested commit is missing from the mirror. As
+commits never change, repeated comparisons are answered from the local
+object store without contacting the remote.
+
+Git revisions in dependency files are either a commit id, or a branch
+and a commit id separated by ' - '. parse_git_revision extracts the
+commit id from both.
+"""
+import hashlib
+import logging
+import os
+import re
+import shutil
+import subprocess
+import threading
+
+from .common import die
+from .common import NullHandler
+
+# define logger
+logger = logging.getLogger("dbc." + __name__)
+logger.addHandler(NullHandler())
+
+DEFAULT_MIRROR_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'dependency-manager-git')
+
+_COMMIT_PATTERN = re.compile(r'(?:^|\s)([0-9a-fA-F]{7,40})\s*$')
+
+
+class GitMirror(object):
+    """ Persistent bare mirrors of remote git repositories
+    """
+    def __init__(self, directory=DEFAULT_MIRROR_DIR):
+        """ Initializes git mirror
+
+            :param directory: folder holding the mirrors. Created if it
+                              does not exist.
+        """
+        self.directory = directory
+        self._locks = {}
+        self._lock = threading.Lock()
+
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+
+    def mirror_path(self, url):
+        """ Path of the mirror of url """
+        return os.path.join(self.directory, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.git')
+
+    def update(self, url, commits=()):
+        """ Makes sure the mirror of url holds commits. The remote is cloned
+            if not mirrored, and fetched if any of the commits is missing.
+
+            :return: path of the mirror
+        """
+        path = self.mirror_path(url)
+        with self._url_lock(url):
+            if not os.path.exists(path):
+                logger.info("Cloning mirror of %s" % url)
+                tmp_path = "%s.%s.tmp" % (path, os.getpid())
+                if os.path.exists(tmp_path):
+                    shutil.rmtree(tmp_path)
+                run_git(['clone', '--mirror', '--quiet', url, tmp_path])
+                os.replace(tmp_path, path)
+            elif not all(self.has_commit(path, x) for x in commits):
+                logger.info("Fetching %s" % url)
+                run_git(['fetch', '--prune', '--quiet', 'origin'], cwd=path)
+
+        missing = [x for x in commits if not self.has_commit(path, x)]
+        if missing:
+            die("Could not find commits %s in %s" % (missing, url))
+        return path
+
+    def has_commit(self, path, commit):
+        """ Determines whether the mirror at path holds commit """
+        result = subprocess.Popen(['git', 'cat-file', '-e', '%s^{commit}' % commit], cwd=path,
+                                  stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        result.communicate()
+        return result.returncode == 0
+
+    def log(self, url, old_commit, new_commit, diff=False):
+        """ Retrieves log, or diff, of the changes from old_commit to new_commit
+
+            :return: output of git log or git diff
+        """
+        path = self.update(url, [old_commit, new_commit])
+        if diff:
+            return run_git(['diff', old_commit, new_commit], cwd=path)
+        return run_git(['log', '%s..%s' % (old_commit, new_commit)], cwd=path)
+
+    def _url_lock(self, url):
+        with self._lock:
+            return self._locks.setdefault(url, threading.Lock())
+
+
+def parse_git_revision(revision):
+    """ Extracts commit id from git revision of dependency file
+
+        :return: commit id, or None if revision is not a git revision
+    """
+    if revision is None or revision.strip().isdigit():
+        return None
+    match = _COMMIT_PATTERN.search(revision)
+    if match is None:
+        return None
+    return match.group(1).lower()
+
+
+def run_git(args, cwd=None):
+    """ Runs git command and dies on failure
+
+        :return: output of command
+    """
+    command = ['git'] + args
+    logger.debug("Execute %s" % command)
+    result = subprocess.Popen(command, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    (stdout, stderr) = result.communicate()
+    if result.returncode != 0:
+        die("Error encountered during git command. cmd = '%s'\nstdout = '%s'\nstderr = '%s'\nreturncode = '%s'" % (" ".join(command), stdout, stderr, result.returncode))
+    return stdout
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -*- mode: python -*-
+"""
+:mod:`dependency_manager.jenkins_client` -- shared http client for jenkins
+==========================================================================
+
+==============
+Jenkins Client
+==============
+
+Contains class used to access the jenkins server.
+
+The client owns a pooled keep-alive session and resolves the jenkins
+credentials once. A single client is meant to be shared by every
+project, dependency list and command line tool in a process.
+
+If the client is given a ResponseCache, successful responses are kept
+on disk. Callers mark responses for a finished build as immutable,
+everything else is revalidated once its time to live has passed.
+"""
+import json
+import logging
+import threading
+import urllib.parse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .common import die
+from .common import NullHandler
+from . import jenkins_authentication
+
+# define logger
+logger = logging.getLogger("dbc." + __name__)
+logger.addHandler(NullHandler())
+
+POOL_SIZE = 20
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+class JenkinsClient(object):
+    """ Pooled http client for a jenkins server
+    """
+    def __init__(self, jenkins_credentials=None, pool_size=POOL_SIZE, cache=None):
+        """ Initializes jenkins client
+
+            :param jenkins_credentials: string of format 'user:pass'. If None
+                                        credentials are looked up as described
+                                        in jenkins_authentication.
+            :param pool_size: Maximum number of kept-alive connections per host.
+            :param cache: ResponseCache to keep responses in. If None
+                          responses are not cached.
+        """
+        self.cache = cache
+        self.authentication = jenkins_authentication.jenkins_credentials(jenkins_credentials)
+
+        self.session = requests.Session()
+        self.session.auth = self.authentication
+        self.session.headers['Accept-Encoding'] = 'gzip'
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def get(self, url, params=None, stream=False, headers=None):
+        """ Performs get request against url. The response cache is not used.
+
+            :return: the response object
+        """
+        logger.debug("Querying with url '%s'" % url)
+        return self.session.get(url, params=params, stream=stream, headers=headers)
+
+    def get_content(self, url, params=None, immutable=False):
+        """ Retrieves content of url as bytes
+
+            :param immutable: True if the content never changes, ie. it
+                              belongs to a specific finished build. May also
+                              be a function deciding this from the content.
+        """
+        if self.cache is None:
+            return self.get(url, params=params).content
+
+        key, entry, headers = self.prepare_request(url, params)
+        if entry and self.cache.is_fresh(entry):
+            logger.debug("Using cached response for '%s'" % key)
+            return entry.content
+
+        response = self.get(url, params=params, headers=headers)
+        return self.process_response(key, entry, immutable, response.status_code, response.content, response.headers)
+
+    def prepare_request(self, url, params):
+        """ Looks up url in the response cache. Together with
+            process_response this lets other clients, eg. AsyncJenkinsClient,
+            make the request themselves while sharing the response cache.
+            Must only be called if the client has a cache.
+
+            :return: tuple of cache key, cached entry (or None) and the
+                     headers needed to revalidate the entry
+        """
+        key = url
+        if params:
+            key += '?' + urllib.parse.urlencode(sorted(params.items()))
+
+        entry = self.cache.get(key)
+        headers = {}
+        if entry:
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+        return key, entry, headers
+
+    def process_response(self, key, entry, immutable, status_code, content, headers):
+        """ Stores response of a request prepared with prepare_request in
+            the response cache
+
+            :param key: cache key as returned by prepare_request
+            :param entry: cached entry as returned by prepare_request
+            :param immutable: True if the content never changes, or a
+                              function deciding this from the content
+            :param status_code: http status code of the response
+            :param content: content of the response as bytes
+            :param headers: headers of the response
+
+            :return: the content of the response, or of the cached entry
+                     if the server reported it as not modified
+        """
+        if entry and status_code == requests.codes.not_modified:
+            logger.debug("Cached response for '%s' revalidated" % key)
+            if callable(immutable):
+                immutable = immutable(entry.content)
+            self.cache.put(key, entry.content, immutable, entry.etag, entry.last_modified)
+            return entry.content
+
+        if status_code == requests.codes.ok:
+            if callable(immutable):
+                immutable = immutable(content)
+            self.cache.put(key, content, immutable, headers.get('ETag'), headers.get('Last-Modified'))
+        return content
+
+    def get_text(self, url, params=None, immutable=False):
+        """ Retrieves content of url as text """
+        return self.get_content(url, params=params, immutable=immutable).decode('utf-8', 'replace')
+
+    def get_json(self, url, params=None, immutable=False):
+        """ Retrieves and parses json content of url """
+        content = self.get_content(url, params=params, immutable=immutable)
+        try:
+            return json.loads(content.decode('utf-8'))
+        except ValueError:
+            die("Couldn't parse json content from url '%s' (response '%s')" % (url, content))
+
+    def close(self):
+        """ Closes all pooled connections """
+        self.session.close()
+
+
+def get_client(jenkins_credentials=None):
+    """ Retrieves the process wide client for the supplied credentials.
+
+        Callers that are not handed a client explicitly use this, so
+        connections and credentials are still shared across the process.
+    """
+    with _clients_lock:
+        if jenkins_credentials not in _clients:
+            _clients[jenkins_credentials] = JenkinsClient(jenkins_credentials)
+        return _clients[jenkins_credentials]
@@ -15,33 +15,79 @@ The class contains method to et artifact urls, upstream projects,
 last successful build number and other common project functions.
 """
 import requests
-from requests.auth import HTTPBasicAuth
 
+import json
 import logging
-import os
-import netrc
 from lxml import etree
 
 from .common import die
 from .common import NullHandler
 from datetime import datetime
-from . import jenkins_authentication
+from .jenkins_client import get_client
 
 # define logger
 logger = logging.getLogger("dbc." + __name__)
 logger.addHandler(NullHandler())
 
+BUILD_RANGE = 100
+BUILD_TREE = ("number,building,timestamp,artifacts[fileName,relativePath],"
+              "changeSet[kind,revisions[module,revision]],changeSets[kind,items[commitId]],"
+              "actions[_class,causes[upstreamProject],lastBuiltRevision[SHA1,branch[name]]]")
+PROJECT_TREE = ("lastSuccessfulBuild[number],lastStableBuild[number],upstreamProjects[name],"
+                "builds[%s]{0,%d}" % (BUILD_TREE, BUILD_RANGE))
+
+
+def project_info_query(jenkins_url, project_name, tree=PROJECT_TREE):
+    """ Creates json api query for project information, limited to the
+        fields used by JenkinsProject and the latest BUILD_RANGE builds.
+
+        :return: tuple of url and query parameters
+    """
+    return requests.compat.urljoin(jenkins_url, "job/%s/api/json" % project_name), {'tree': tree}
+
+
+def build_info_query(jenkins_url, project_name, build_number, tree=BUILD_TREE):
+    """ Creates json api query for a single build of a project
+
+        :return: tuple of url and query parameters
+    """
+    return requests.compat.urljoin(jenkins_url, "job/%s/%s/api/json" % (project_name, build_number)), {'tree': tree}
+
+
+def is_finished_build(content):
+    """ Determines whether build json content belongs to a finished build,
+        which never changes and can be cached as immutable.
+    """
+    try:
+        return not json.loads(content.decode('utf-8')).get('building')
+    except ValueError:
+        return False
+
+
+def project_config_url(jenkins_url, project_name):
+    """ Creates url for project configuration """
+    return requests.compat.urljoin(jenkins_url, "job/%s/config.xml" % project_name)
+
 
 class JenkinsProject(object):
     """ Wrapper class for jenkins project
     """
-    def __init__(self, jenkins_url, project_name, build_number=None, jenkins_credentials=None):
+    def __init__(self, jenkins_url, project_name, build_number=None, jenkins_credentials=None, jenkins_client=None, info=None, config=None, build=None):
         """ Initializes Jenkins project
 
             :param jenkins_url: url of the jenkins server hosting project
             :param project_name: Name of the jenkins project
             :param build_number: build number of the project. If not specified,
                                  build number of last successful build is used.
+            :param jenkins_client: JenkinsClient used for all requests. If not
+                                   specified, the process wide client for
+                                   jenkins_credentials is used.
+            :param info: Already retrieved project information. If not
+                         specified, it is retrieved from jenkins on first use.
+            :param config: Already retrieved project configuration xml. If
+                           not specified, it is retrieved from jenkins on first use.
+            :param build: Already retrieved build information. If not
+                          specified, it is retrieved from jenkins on first use.
         """
         self.url = jenkins_url
         if not self.url.endswith('/'):
@@ -49,17 +95,50 @@ class JenkinsProject(object):
 
         self.name = project_name
         self.jenkins_credentials = jenkins_credentials
-
-        self.build_number = build_number
-
-        self.info = self._get_project_info()
-
-        if not self.build_number:
-            self.build_number = self.get_last_stable_build()
-
-        logger.debug("name %s, build-number %s" % (self.name, self.build_number))
-
-        self.config = etree.fromstring(self._get_project_config())
+        self.client = jenkins_client
+        if self.client is None:
+            self.client = get_client(jenkins_credentials)
+
+        self._build_number = build_number
+        self._info = info
+        self._config = config
+        self._config_tree = None
+        self._build = build
+        self._scm_info = None
+        self._scm_info_loaded = False
+
+    @property
+    def info(self):
+        """ Project information, retrieved on first access """
+        if self._info is None:
+            self._info = self._get_project_info()
+        return self._info
+
+    @property
+    def config(self):
+        """ Parsed project configuration xml, retrieved on first access """
+        if self._config_tree is None:
+            if self._config is None:
+                self._config = self._get_project_config()
+            self._config_tree = etree.fromstring(self._config)
+        return self._config_tree
+
+    @property
+    def build_number(self):
+        """ Build number of the project. If not specified, build number of
+            last stable build is looked up on first access.
+        """
+        if not self._build_number:
+            self._build_number = self.get_last_stable_build()
+            logger.debug("name %s, build-number %s" % (self.name, self._build_number))
+        return self._build_number
+
+    @property
+    def build(self):
+        """ Build information for the project build, retrieved on first access """
+        if self._build is None:
+            self._build = self._get_build()
+        return self._build
 
     def get_last_successful_build(self):
         """ Retrieves the last successful build number for this project
@@ -91,7 +170,7 @@ class JenkinsProject(object):
         """
 
         if self.build_number:
-            info = self._get_build()
+            info = self.build
             if info:
                 timestamp = info['timestamp']
                 logger.debug("Timestamp: %s"%timestamp)
@@ -114,7 +193,7 @@ class JenkinsProject(object):
 
             :return: list of tuples with two elements: artifactname, and download url
         """
-        build = self._get_build()
+        build = self.build
         return self._parse_artifacts(build['artifacts'])
 
     def get_upstreams(self):
@@ -126,7 +205,7 @@ class JenkinsProject(object):
         logger.debug("get_upstreams for %s: %s"%(self.name, upstreams))
 
         if len(upstreams) <= 0:
-            build = self._get_build()
+            build = self.build
             logger.debug("get_upstreams for: %s"%build)
             for action in build['actions']:
                 if 'causes' in action:
@@ -161,7 +240,7 @@ class JenkinsProject(object):
                 # logger.debug(etree.tostring(self.config))
                 return None
 
-            build = self._get_build()
+            build = self.build
 
             svn_info = []
 
@@ -197,7 +276,7 @@ class JenkinsProject(object):
                 # logger.debug(etree.tostring(self.config))
                 return None
 
-            build = self._get_build()
+            build = self.build
 
             git_info = []
 
@@ -223,20 +302,24 @@ class JenkinsProject(object):
             return git_info
 
     def get_scm_info(self):
-        """ Retrieves version management information for project
+        """ Retrieves version management information for project.
+            The information is only looked up once.
 
             :return: list of tuples with two elements: svn path, and svn revision
         """
-        scm_info = self.get_svn_info()
+        if not self._scm_info_loaded:
+            scm_info = self.get_svn_info()
 
-        if scm_info is None:
-            scm_info = self.get_git_info()
+            if scm_info is None:
+                scm_info = self.get_git_info()
 
-        #if scm_info is None:
-        #    die("Unknown configuration type for %s:%s: %s" % (self.name, self.build_number ,self.config.tag))
+            #if scm_info is None:
+            #    die("Unknown configuration type for %s:%s: %s" % (self.name, self.build_number ,self.config.tag))
 
-        return scm_info;
+            self._scm_info = scm_info
+            self._scm_info_loaded = True
 
+        return self._scm_info
 
     def get_dependency_file_content(self, dependency_file_name):
         """ Retrieves the content of dependency file for project, if present.
@@ -247,7 +330,7 @@ class JenkinsProject(object):
         if dependency_file_name in artifacts:
             url = artifacts[dependency_file_name]
             logger.debug("Querying with url '%s'" % url)
-            content = requests.get(url).text
+            content = self.client.get_text(url, immutable=True)
             return content
 
         logger.warning('No %s found among artifacts for project %s-%s' % (dependency_file_name, self.name, self.build_number))
@@ -258,8 +341,7 @@ class JenkinsProject(object):
         """
         logger.debug("Aborting build of %s-%s" % (self.name, self.build_number))
         abort_url = requests.compat.urljoin(self.url, "job/%s/%s/stop" % (self.name, self.build_number))
-        authentication = jenkins_authentication.jenkins_credentials(self.jenkins_credentials)
-        response = requests.get(abort_url, auth=authentication)
+        response = self.client.get(abort_url)
 
         if response.status_code != requests.codes.ok:
             die("Something went wrong during abort. abort-url: '%s', answer from server: '%s'" % (abort_url, response.text))
@@ -273,28 +355,15 @@ class JenkinsProject(object):
     def _get_project_config(self):
         """ retrieves project configuration """
         logger.debug("Getting config for project %s" % self.name)
-        query_url = requests.compat.urljoin(self.url, "job/%s/config.xml" % self.name)
+        query_url = project_config_url(self.url, self.name)
         logger.debug("Getting url %s" % query_url)
-        authentication = jenkins_authentication.jenkins_credentials(self.jenkins_credentials)
-        response = requests.get(query_url, auth=authentication)
-        return response.content
+        return self.client.get_content(query_url)
 
-    def _get_project_info(self, depth=1):
+    def _get_project_info(self):
         """ retrieves project information """
         logger.debug("Getting info for project %s" % self.name)
-        params = {'depth': depth}
-        query_url = requests.compat.urljoin(self.url, "job/%s/api/python" % (self.name))
-        return self._get_and_evaluate_url(query_url, params=params)
-
-    def _get_and_evaluate_url(self, url, params=None):
-        """ retrieve and evaluate url with eval"""
-        logger.debug("Querying with url '%s'" % url)
-        authentication = jenkins_authentication.jenkins_credentials(self.jenkins_credentials)
-        response = requests.get(url, params=params, auth=authentication)
-        try:
-            return eval(response.content)
-        except:
-            die("Couldn't evaluate content from url '%s' (response '%s')" % (url, response.text))
+        query_url, params = project_info_query(self.url, self.name)
+        return self.client.get_json(query_url, params=params)
 
     def _parse_artifacts(self, artifacts):
         """ parses artifact dictionary and returns list of tuples with name and url for each artifact"""
@@ -305,12 +374,26 @@ class JenkinsProject(object):
         return artifact_urls
 
     def _get_build(self):
-        """ retrieves build information from project"""
-        build = [x for x in self.info['builds'] if x['number'] == self.build_number]
-        logger.debug("Build %s: %s" % (self.name, build))
+        """ retrieves build information from project.
 
-        if len(build) == 0:
-            die("Build number %s is not a valid build-number for project %s. Valid build numbers are %s" %
-                (self.build_number, self.name, sorted([x['number'] for x in self.info['builds']])))
-
-        return build[0]
+            The build is taken from the project information if it is
+            already loaded and holds the build, otherwise the build is
+            fetched by its number.
+        """
+        build_number = self.build_number
+        if self._info is not None:
+            build = [x for x in self._info.get('builds', []) if x['number'] == build_number]
+            logger.debug("Build %s: %s" % (self.name, build))
+            if build:
+                return build[0]
+
+        return self._get_build_info()
+
+    def _get_build_info(self):
+        """ retrieves information for the project build by its number """
+        logger.debug("Getting build %s for project %s" % (self.build_number, self.name))
+        query_url, params = build_info_query(self.url, self.name, self.build_number)
+        try:
+            return self.client.get_json(query_url, params=params, immutable=is_finished_build)
+        except RuntimeError:
+            die("Build number %s is not a valid build-number for project %s" % (self.build_number, self.name))
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -*- mode: python -*-
+"""
+:mod:`dependency_manager.parallel_gzip` -- block parallel gzip writer
+=====================================================================
+
+====================
+Parallel Gzip Writer
+====================
+
+Contains class used to gzip compress a stream with several threads.
+
+Written data is split in blocks which are deflated concurrently, in the
+same way as pigz does: each block is compressed as raw deflate data with
+the end of the previous block as dictionary, and ended with a sync flush
+so the compressed blocks can be concatenated into a single deflate
+stream. The output is a standard single member gzip file.
+
+zlib releases the GIL while compressing, so threads compress blocks in
+parallel. The md5 sum of the compressed output is computed as it is
+written, eg.::
+
+    with open('package.tgz', 'wb') as fh:
+        with ParallelGzipWriter(fh, level=6, threads=4) as writer:
+            with tarfile.open(fileobj=writer, mode='w|') as tar:
+                tar.add('package')
+    md5 = writer.md5.hexdigest()
+"""
+import collections
+import hashlib
+import logging
+import os
+import struct
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from .common import NullHandler
+
+# define logger
+logger = logging.getLogger("dbc." + __name__)
+logger.addHandler(NullHandler())
+
+DEFAULT_LEVEL = 6
+BLOCK_SIZE = 128 * 1024
+DICTIONARY_SIZE = 32 * 1024
+
+
+class ParallelGzipWriter(object):
+    """ Write only file object compressing written data with several threads
+    """
+    def __init__(self, fileobj, level=DEFAULT_LEVEL, threads=None, block_size=BLOCK_SIZE, mtime=None):
+        """ Initializes writer and writes gzip header to fileobj
+
+            :param fileobj: binary file object receiving the compressed data
+            :param level: compression level from 1 to 9
+            :param threads: number of compressing threads. Defaults to the
+                            number of cpus.
+            :param block_size: number of bytes compressed in each block
+            :param mtime: modification time written in the gzip header.
+                          Defaults to current time.
+        """
+        self.fileobj = fileobj
+        self.level = level
+        self.block_size = block_size
+        self.threads = threads or os.cpu_count() or 1
+        self.md5 = hashlib.md5()
+        self.closed = False
+
+        self._crc = 0
+        self._size = 0
+        self._buffer = bytearray()
+        self._dictionary = b''
+        self._pending = collections.deque()
+        self._executor = ThreadPoolExecutor(max_workers=self.threads)
+
+        self._write_out(gzip_header(level, mtime))
+
+    def write(self, data):
+        """ Writes data to the compressed stream
+
+            :return: number of bytes written
+        """
+        if self.closed:
+            raise ValueError("write to closed gzip writer")
+
+        self._crc = zlib.crc32(data, self._crc)
+        self._size += len(data)
+        self._buffer += data
+        while len(self._buffer) >= self.block_size:
+            block = bytes(self._buffer[:self.block_size])
+            del self._buffer[:self.block_size]
+            self._submit(block, False)
+        return len(data)
+
+    def close(self):
+        """ Compresses remaining data and writes the gzip trailer. The
+            underlying file object is not closed.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._submit(bytes(self._buffer), True)
+            self._buffer = bytearray()
+            while self._pending:
+                self._write_out(self._pending.popleft().result())
+            self._write_out(struct.pack('<II', self._crc & 0xffffffff, self._size & 0xffffffff))
+        finally:
+            self._executor.shutdown()
+
+    def _submit(self, block, last):
+        """ Queues block for compression, writing finished blocks in order
+            while too many blocks are queued.
+        """
+        self._pending.append(self._executor.submit(compress_block, block, self._dictionary, self.level, last))
+        self._dictionary = block[-DICTIONARY_SIZE:]
+        while len(self._pending) > 2 * self.threads:
+            self._write_out(self._pending.popleft().result())
+
+    def _write_out(self, data):
+        self.md5.update(data)
+        self.fileobj.write(data)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.closed = True
+            self._executor.shutdown()
+
+
+def compress_block(block, dictionary, level, last):
+    """ Compresses block as raw deflate data continuing from dictionary
+
+        :param last: if True the deflate stream is ended, otherwise the
+                     block is ended with a sync flush
+    """
+    if dictionary:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, zlib.DEF_MEM_LEVEL, zlib.Z_DEFAULT_STRATEGY, dictionary)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(block) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+def gzip_header(level, mtime=None):
+    """ Creates gzip member header without file name """
+    if mtime is None:
+        mtime = time.time()
+    extra_flags = 0
+    if level == 9:
+        extra_flags = 2
+    elif level == 1:
+        extra_flags = 4
+    return struct.pack('<BBBBIBB', 0x1f, 0x8b, 8, 0, int(mtime) & 0xffffffff, extra_flags, 3)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -*- mode: python -*-
+"""
+:mod:`dependency_manager.project_registry` -- process wide registry of projects
+===============================================================================
+
+================
+Project Registry
+================
+
+Contains class used to intern projects and parsed dependency files.
+
+The same core projects appear in the dependency files of many upstream
+projects. The registry makes sure each project build is created, and
+therefore fetched from jenkins, only once per registry, and that the
+dependency file of each upstream build is only parsed once.
+
+Projects without a build number resolve to the last successful build
+when they are created. Dependency lists and resolvers therefore use a
+registry of their own by default, so such projects are not kept beyond
+a single resolution. The process wide registry is only used by callers
+passing it explicitly.
+
+The registry is safe to use from several threads. Concurrent requests
+for the same key wait for the first one instead of creating a
+duplicate.
+"""
+import logging
+import threading
+
+from .common import NullHandler
+
+# define logger
+logger = logging.getLogger("dbc." + __name__)
+logger.addHandler(NullHandler())
+
+
+class ProjectRegistry(object):
+    """ Registry interning projects and parsed dependency files
+    """
+    def __init__(self):
+        self._projects = {}
+        self._dependency_files = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def get_project(self, key, factory):
+        """ Retrieves project registered for key
+
+            :param key: tuple of (server, name, build_number)
+            :param factory: callable creating the project if it is not registered
+            :return: the registered project
+        """
+        return self._intern(self._projects, key, factory)
+
+    def get_dependency_file(self, key, factory):
+        """ Retrieves parsed dependency file registered for key
+
+            :param key: tuple identifying the build the dependency file belongs to
+            :param factory: callable fetching and parsing the dependency file
+                            if it is not registered
+            :return: the registered parse result
+        """
+        return self._intern(self._dependency_files, key, factory)
+
+    def find_project(self, key):
+        """ Retrieves project registered for key, or None if not registered """
+        with self._lock:
+            return self._projects.get(key)
+
+    def find_dependency_file(self, key):
+        """ Retrieves parsed dependency file registered for key, or None if not registered """
+        with self._lock:
+            return self._dependency_files.get(key)
+
+    def clear(self):
+        """ Forgets all registered projects and dependency files """
+        with self._lock:
+            self._projects.clear()
+            self._dependency_files.clear()
+            self._key_locks.clear()
+
+    def _intern(self, table, key, factory):
+        with self._lock:
+            if key in table:
+                return table[key]
+            key_lock = self._key_locks.setdefault((id(table), key), threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                if key in table:
+                    return table[key]
+
+            logger.debug("Registering %s" % (key,))
+            value = factory()
+
+            with self._lock:
+                table[key] = value
+            return value
+
+
+registry = ProjectRegistry()
+
+
+def get_registry():
+    """ Retrieves the process wide registry """
+    return registry
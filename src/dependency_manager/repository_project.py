@@ -14,24 +14,132 @@ Contains class used to wrap a repository project.
 The class contains method to handle 3rd party repository artifacts,
 and contains methods so it is compatible with the Jenkins_project
 class.
+
+All repository artifacts in the process share a RepositoryIndex per
+repository project. The index is built from the responses of single
+builds, which are cached as immutable once the build is finished and
+are therefore reused from the response cache on later runs. The
+artifacts of each repository build are parsed once. The repository
+information is only fetched, at most once, to find the last successful
+build.
 """
 import os
-import urllib.request, urllib.parse, urllib.error
+import threading
 import urllib.parse
 import logging
 
 from .common import die
 from .common import NullHandler
+from .jenkins_client import get_client
+from .jenkins_project import build_info_query
+from .jenkins_project import is_finished_build
 
 # define logger
 logger = logging.getLogger("dbc." + __name__)
 logger.addHandler(NullHandler())
 
 
+REPOSITORY_BUILD_TREE = "number,building,artifacts[fileName,relativePath]"
+REPOSITORY_TREE = "lastSuccessfulBuild[number]"
+
+
+def repository_info_query(jenkins_url, repository_project, tree=REPOSITORY_TREE):
+    """ Creates json api query for repository information, limited to
+        the number of the last successful build.
+
+        :return: tuple of url and query parameters
+    """
+    return urllib.parse.urljoin(jenkins_url, "job/%s/api/json" % repository_project), {'tree': tree}
+
+
+class RepositoryIndex(object):
+    """ Artifacts of the builds of a repository project, shared by all
+        repository artifacts of the project
+    """
+    def __init__(self, jenkins_url, repository_project, jenkins_client):
+        """ Initializes repository index
+
+            :param jenkins_url: url of the jenkins server, ending with '/'
+            :param repository_project: Name of the repository project
+            :param jenkins_client: JenkinsClient used for all requests
+        """
+        self.url = jenkins_url
+        self.repository = repository_project
+        self.client = jenkins_client
+        self._info = None
+        self._builds = {}
+        self._lock = threading.Lock()
+
+    @property
+    def info(self):
+        """ Repository information, retrieved on first access """
+        with self._lock:
+            if self._info is None:
+                logger.debug("Getting info for repository %s" % self.repository)
+                query_url, params = repository_info_query(self.url, self.repository)
+                self._info = self.client.get_json(query_url, params=params)
+            return self._info
+
+    def get_build(self, build_number):
+        """ Retrieves repository build by its number. The response is cached
+            as immutable if the build is finished.
+        """
+        logger.debug("Getting build %s for repository %s" % (build_number, self.repository))
+        query_url, params = build_info_query(self.url, self.repository, build_number, tree=REPOSITORY_BUILD_TREE)
+        return self.client.get_json(query_url, params=params, immutable=is_finished_build)
+
+    def get_artifacts(self, build_number, load_build=None):
+        """ Retrieves artifacts of repository build
+
+            :param build_number: repository build number
+            :param load_build: function retrieving the build information.
+                               Only called if the build is not indexed. If
+                               not specified, get_build is used.
+            :return: dictionary of artifact name to dictionary of artifact
+                     type ('artifact' or 'md5') to (filename, url) tuple
+        """
+        with self._lock:
+            artifacts = self._builds.get(build_number)
+        if artifacts is None:
+            build = load_build() if load_build is not None else self.get_build(build_number)
+            artifacts = parse_repository_artifacts(self.url, self.repository, build_number, build['artifacts'])
+            with self._lock:
+                artifacts = self._builds.setdefault(build_number, artifacts)
+        return artifacts
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_repository_index(jenkins_url, repository_project, jenkins_client):
+    """ Retrieves the process wide index of repository_project, creating it if not present """
+    key = (jenkins_url, repository_project, jenkins_client)
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = RepositoryIndex(jenkins_url, repository_project, jenkins_client)
+        return _indexes[key]
+
+
+def parse_repository_artifacts(jenkins_url, repository_project, build_number, artifacts):
+    """ Parses the artifacts of a repository build
+
+        :return: dictionary of artifact name to dictionary of artifact
+                 type ('artifact' or 'md5') to (filename, url) tuple
+    """
+    base_url = urllib.parse.urljoin(jenkins_url, "job/%s/%s/artifact/" % (repository_project, build_number))
+    artifact_dict = {}
+    for artifact in artifacts:
+        name = os.path.basename(os.path.dirname(artifact['relativePath']))
+        artifact_type = 'md5' if artifact['fileName'].endswith('.md5') else 'artifact'
+        artifact_dict.setdefault(name, {})[artifact_type] = (artifact['fileName'], base_url + artifact['relativePath'])
+    return artifact_dict
+
+
 class JenkinsRepositoryProject(object):
     """ Wrapper class for repository project
     """
-    def __init__(self, jenkins_url, artifact, repository_project, build_number=None):
+    def __init__(self, jenkins_url, artifact, repository_project, build_number=None, jenkins_client=None, info=None, index=None):
         """ Initializes repository project
 
             :param jenkins_url: url of the jenkins server hosting project
@@ -39,16 +147,29 @@ class JenkinsRepositoryProject(object):
             :param repository_project
             :param build_number: build number of the project. If not specified,
                                  build number of last successful build is used.
+            :param jenkins_client: JenkinsClient used for all requests. If not
+                                   specified, the process wide client is used.
+            :param info: Already retrieved repository information. If not
+                         specified, it is retrieved from the repository index
+                         when the build number is not specified.
+            :param index: RepositoryIndex of the repository project. If not
+                          specified, the process wide index is used.
         """
         self.name = artifact
+        self.client = jenkins_client
+        if self.client is None:
+            self.client = get_client()
 
         self.repository = repository_project
         self.url = jenkins_url
         if not self.url.endswith('/'):
             self.url += '/'
 
-        self.info = self._get_project_info()
+        self.index = index
+        if self.index is None:
+            self.index = get_repository_index(self.url, self.repository, self.client)
 
+        self.info = info
         self.build_number = build_number
         if not build_number:
             self.build_number = self.get_last_successful_build()
@@ -65,6 +186,8 @@ class JenkinsRepositoryProject(object):
         """ Retrieves the last successful build for this project
             :return: The last successful build number
         """
+        if self.info is None:
+            self.info = self._get_project_info()
         return int(self.info['lastSuccessfulBuild']['number'])
 
     def get_artifacts(self):
@@ -87,61 +210,30 @@ class JenkinsRepositoryProject(object):
         return None
 
     def _get_repository_artifacts(self):
-        """ Retrieves artifact list for repository
+        """ Retrieves artifact list for repository build from the repository index
         """
-        build = self._get_build()
-        return self._parse_artifacts(build['artifacts'])
+        return self.index.get_artifacts(self.build_number, self._get_build)
 
-    def _get_project_info(self, depth=1):
+    def _get_project_info(self):
         """ retrieves information for repository"""
-        logger.debug("Getting info for repository_artifact %s" % self.name)
-        params = {'depth': depth}
-        query_url = urllib.parse.urljoin(self.url, "job/%s/api/python?%s" %
-                                     (self.repository, urllib.parse.urlencode(params)))
-        return self._get_and_evaluate_url(query_url)
-
-    def _get_and_evaluate_url(self, url):
-        """ retrieve and evaluate url with eval"""
-        logger.debug("Querying with url '%s'" % url)
-        content = urllib.request.urlopen(url).read()
-        try:
-            return eval(content)
-        except:
-            die("Couldn't evaluate content from url '%s' (response '%s')" % (url, content))
-
-    def _parse_artifacts(self, artifacts):
-        """ Parses repository artifacts
-        """
-        base_url = urllib.parse.urljoin(self.url, "job/%s/%s/artifact/" % (self.repository, self.build_number))
-        artifact_urls = dict()
-        for artifact in artifacts:
-            name = os.path.basename(os.path.dirname(artifact['relativePath']))
-            if not name in artifact_urls:
-                artifact_urls[name] = []
-            artifact_urls[name].append((artifact['fileName'], base_url + artifact['relativePath']))
-
-        artifact_dict = {}
-        for artifact, content in artifact_urls.items():
-
-            artifact_dict[artifact] = {}
-            for filename, url in content:
-                if filename.endswith('.md5'):
-                    artifact_dict[artifact]['md5'] = (filename, url)
-                else:
-                    artifact_dict[artifact]['artifact'] = (filename, url)
-
-        return artifact_dict
+        return self.index.info
 
     def _get_build(self):
-        """ retrieves build information from project"""
-        build = [x for x in self.info['builds'] if x['number'] == self.build_number]
+        """ retrieves build information from repository.
 
-        if len(build) == 0:
-            die("Build number %s is not a valid build-number for project %s. Valid build numbers are %s" %
-                (self.build_number, self.repository, sorted([x['number'] for x in self.info['builds']])))
+            The build is fetched by its number, as a finished build never
+            changes. The repository information is only used to find the
+            last successful build.
+        """
+        return self._get_build_info()
+
+    def _get_build_info(self):
+        """ retrieves information for the repository build by its number """
+        try:
+            return self.index.get_build(self.build_number)
+        except RuntimeError:
+            die("Build number %s is not a valid build-number for project %s" % (self.build_number, self.repository))
 
-        return build[0]
-    
     def __eq__(self, other):
         """ Equals operator for JenkinsRepositoryProject class"""
         if self.name == other.name:
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -*- mode: python -*-
+"""
+:mod:`dependency_manager.response_cache` -- on-disk cache for jenkins responses
+===============================================================================
+
+==============
+Response Cache
+==============
+
+Contains class used to keep jenkins responses on disk between runs.
+
+Entries for data belonging to a finished build never change and are
+stored as immutable, which keeps them forever. Job level data (last
+stable build, upstream projects, configuration) changes whenever a job
+is built. By default its time to live is 0, so it is requested again,
+or revalidated if the server sent an ETag or Last-Modified header, on
+every use. A mutable entry the server cannot revalidate is therefore not
+stored at all. A time to live for job level data is opt-in, eg. through
+the --cache-ttl option of the commandline tools.
+The total size of the cache is capped, and the least recently used
+entries are evicted when the cap is exceeded.
+"""
+import collections
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from .common import NullHandler
+
+# define logger
+logger = logging.getLogger("dbc." + __name__)
+logger.addHandler(NullHandler())
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'dependency-manager')
+MAX_SIZE = 512 * 1024 * 1024
+TTL = 0
+
+CacheEntry = collections.namedtuple('CacheEntry', ['content', 'immutable', 'stored', 'etag', 'last_modified'])
+
+
+class ResponseCache(object):
+    """ Size capped on-disk cache with least recently used eviction
+    """
+    def __init__(self, directory, max_size=MAX_SIZE, ttl=TTL):
+        """ Initializes response cache
+
+            :param directory: folder holding the cached entries. Created if
+                              it does not exist.
+            :param max_size: maximum total size in bytes of cached content
+            :param ttl: number of seconds mutable entries are considered fresh
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+
+        self._sizes = {}
+        for filename in os.listdir(self.directory):
+            if filename.endswith('.body'):
+                self._sizes[filename[:-len('.body')]] = os.path.getsize(os.path.join(self.directory, filename))
+        self._size = sum(self._sizes.values())
+
+    def get(self, key):
+        """ Retrieves cached entry for key
+
+            :return: CacheEntry or None if key is not cached
+        """
+        body_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path) as fh:
+                meta = json.load(fh)
+            with open(body_path, 'rb') as fh:
+                content = fh.read()
+            os.utime(body_path, None)
+        except (IOError, OSError, ValueError):
+            return None
+
+        return CacheEntry(content, meta['immutable'], meta['stored'], meta.get('etag'), meta.get('last_modified'))
+
+    def put(self, key, content, immutable=False, etag=None, last_modified=None):
+        """ Stores content for key. Mutable content without etag or
+            last_modified is not stored if the time to live is 0, as it
+            could never be used.
+
+            :param immutable: if True the entry never expires
+            :param etag: ETag header of the response, used for revalidation
+            :param last_modified: Last-Modified header of the response, used for revalidation
+        """
+        if not immutable and self.ttl <= 0 and etag is None and last_modified is None:
+            return
+
+        name = self._name(key)
+        body_path, meta_path = self._paths(key)
+        meta = {'key': key,
+                'immutable': immutable,
+                'stored': time.time(),
+                'etag': etag,
+                'last_modified': last_modified}
+
+        self._write(body_path, content)
+        self._write(meta_path, json.dumps(meta).encode('utf-8'))
+
+        with self._lock:
+            self._size += len(content) - self._sizes.get(name, 0)
+            self._sizes[name] = len(content)
+            if self._size > self.max_size:
+                self._evict()
+
+    def is_fresh(self, entry):
+        """ Determines whether entry can be used without asking the server """
+        return entry.immutable or time.time() - entry.stored < self.ttl
+
+    def _evict(self):
+        """ Removes least recently used entries until cache is below its size cap """
+        def last_used(name):
+            try:
+                return os.path.getmtime(os.path.join(self.directory, name + '.body'))
+            except OSError:
+                return 0
+
+        for name in sorted(self._sizes, key=last_used):
+            if self._size <= self.max_size:
+                break
+            logger.debug("Evicting cache entry %s" % name)
+            for suffix in ('.body', '.meta'):
+                try:
+                    os.remove(os.path.join(self.directory, name + suffix))
+                except OSError:
+                    pass
+            self._size -= self._sizes.pop(name)
+
+    def _write(self, path, content):
+        """ Writes content atomically to path """
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(content)
+        os.replace(tmp_path, path)
+
+    def _name(self, key):
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def _paths(self, key):
+        path = os.path.join(self.directory, self._name(key))
+        return path + '.body', path + '.meta'
+
+
+def create_cache(cache_dir, ttl=TTL):
+    """ Creates response cache in cache_dir, or None if cache_dir is empty
+
+        :param ttl: number of seconds job level data is used without asking the server
+    """
+    if not cache_dir:
+        return None
+    return ResponseCache(cache_dir, ttl=ttl)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -*- mode: python -*-
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+import requests
+from mock import Mock
+
+from dependency_manager.artifact_downloader import ArtifactDownloader
+from dependency_manager.artifact_downloader import ResponseReader
+
+
+def create_response(status_code, chunks):
+    response = Mock()
+    response.status_code = status_code
+    response.iter_content = Mock(return_value=iter(chunks))
+    return response
+
+
+class TestArtifactDownloader(unittest.TestCase):
+
+    def setUp(self):
+        self.test_folder = tempfile.mkdtemp()
+        self.client = Mock()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_folder)
+
+    def test_that_artifacts_are_streamed_to_their_paths(self):
+        """ Test that every artifact is written to its path and the sizes are returned in order """
+        responses = {'url-1': create_response(200, [b'abc', b'def']),
+                     'url-2': create_response(200, [b'ghij'])}
+        self.client.get = Mock(side_effect=lambda url, stream: responses[url])
+        downloads = [('url-%s' % x, os.path.join(self.test_folder, 'artifact-%s' % x)) for x in (1, 2)]
+
+        sizes = ArtifactDownloader(self.client, max_workers=2).download_all(downloads)
+
+        self.assertEqual([6, 4], sizes)
+        with open(os.path.join(self.test_folder, 'artifact-1'), 'rb') as fh:
+            self.assertEqual(b'abcdef', fh.read())
+        self.assertEqual(['artifact-1', 'artifact-2'], sorted(os.listdir(self.test_folder)))
+
+    def test_that_transient_failures_are_retried(self):
+        """ Test that connection errors and server errors are retried """
+        self.client.get = Mock(side_effect=[requests.exceptions.ConnectionError("reset"),
+                                            create_response(503, []),
+                                            create_response(200, [b'content'])])
+        path = os.path.join(self.test_folder, 'artifact')
+
+        self.assertEqual(7, ArtifactDownloader(self.client, retry_delay=0).download('url', path))
+        self.assertEqual(3, self.client.get.call_count)
+
+    def test_that_download_fails_when_retries_are_exhausted(self):
+        """ Test that an error is raised when all retries fail, and no partial file is left """
+        self.client.get = Mock(side_effect=lambda url, stream: create_response(500, []))
+
+        self.assertRaises(RuntimeError, ArtifactDownloader(self.client, retries=2, retry_delay=0).download,
+                          'url', os.path.join(self.test_folder, 'artifact'))
+        self.assertEqual(3, self.client.get.call_count)
+        self.assertEqual([], os.listdir(self.test_folder))
+
+    def test_that_missing_artifact_is_not_retried(self):
+        """ Test that a not found answer raises without retrying """
+        self.client.get = Mock(return_value=create_response(404, []))
+
+        self.assertRaises(RuntimeError, ArtifactDownloader(self.client, retry_delay=0).download,
+                          'url', os.path.join(self.test_folder, 'artifact'))
+        self.assertEqual(1, self.client.get.call_count)
+
+    def test_that_artifacts_are_verified_against_downloaded_md5_files(self):
+        """ Test that md5 sums are computed while downloading and checked against the md5 files """
+        md5 = hashlib.md5(b'abcdef').hexdigest()
+        responses = {'url-1': create_response(200, [b'abc', b'def']),
+                     'url-1.md5': create_response(200, [md5.encode('utf-8')])}
+        self.client.get = Mock(side_effect=lambda url, stream: responses[url])
+        path = os.path.join(self.test_folder, 'artifact')
+        downloader = ArtifactDownloader(self.client, max_workers=2)
+
+        downloader.download_all([('url-1', path), ('url-1.md5', path + '.md5')])
+
+        self.assertEqual(md5, downloader.md5_sums[path])
+
+    def test_that_md5_mismatch_fails_download(self):
+        """ Test that an artifact not matching its md5 file raises """
+        self.client.get = Mock(return_value=create_response(200, [b'corrupted']))
+        path = os.path.join(self.test_folder, 'artifact')
+        with open(path + '.md5', 'w') as fh:
+            fh.write(hashlib.md5(b'content').hexdigest())
+
+        self.assertRaises(RuntimeError, ArtifactDownloader(self.client, retry_delay=0).download, 'url', path)
+
+    def test_that_response_reader_reads_across_chunks(self):
+        """ Test that reads of any size are served across chunks and the md5 sum covers all read content """
+        reader = ResponseReader(create_response(200, [b'abc', b'defg', b'h']))
+
+        self.assertEqual(b'ab', reader.read(2))
+        self.assertEqual(b'cdefg', reader.read(5))
+        self.assertEqual(b'h', reader.read())
+        self.assertEqual(b'', reader.read(3))
+        self.assertEqual(hashlib.md5(b'abcdefgh').hexdigest(), reader.md5.hexdigest())
@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -*- mode: python -*-
+import re
+import unittest
+
+from dependency_manager.artifact_selector import ArtifactSelector
+from dependency_manager.artifact_selector import literal_pattern
+
+
+class TestArtifactSelector(unittest.TestCase):
+
+    def test_that_literal_patterns_are_recognized(self):
+        """ Test that only patterns without regular expression syntax are literals """
+        self.assertEqual(('foo.jar', True), literal_pattern('foo\\.jar$'))
+        self.assertEqual(('foo-', False), literal_pattern('foo-'))
+        self.assertIsNone(literal_pattern('foo.jar'))
+        self.assertIsNone(literal_pattern('foo\\d'))
+        self.assertIsNone(literal_pattern('a$b'))
+
+    def test_that_first_matching_pattern_is_reported(self):
+        """ Test that the index of the first matching pattern is reported, whether it is literal or not """
+        selector = ArtifactSelector(['foo-.*\\.jar', 'foo-1\\.jar$', 'bar', 'ba.*'])
+
+        self.assertEqual(0, selector.match('foo-1.jar'))
+        self.assertEqual(2, selector.match('bar.war'))
+        self.assertEqual(3, selector.match('baz'))
+        self.assertIsNone(selector.match('qux'))
+        self.assertEqual([0, 1], selector.match_all('foo-1.jar'))
+
+    def test_that_selection_has_re_match_semantics(self):
+        """ Test that selected names are those matched by re.match with any of the patterns """
+        patterns = ['a\\.jar$', 'a', 'b.*\\.war', 'c\\-', '.*\\.txt', '']
+        names = ['a.jar', 'a.jar.md5', 'ab', 'b-1.war', 'xb.war', 'c-1', 'c', 'x.txt', 'y']
+
+        for pattern in patterns:
+            selected = [name for name, index in ArtifactSelector([pattern]).select(names)]
+            self.assertEqual([x for x in names if re.match(pattern, x)], selected)
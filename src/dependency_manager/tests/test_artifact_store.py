@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -*- mode: python -*-
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+from mock import Mock
+
+from dependency_manager.artifact_store import ArtifactStore
+from dependency_manager.artifact_store import download_with_store
+
+
+class TestArtifactStore(unittest.TestCase):
+
+    def setUp(self):
+        self.test_folder = tempfile.mkdtemp()
+        self.store_folder = os.path.join(self.test_folder, 'store')
+        self.target_folder = os.path.join(self.test_folder, 'target')
+        os.mkdir(self.target_folder)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_folder)
+
+    def write(self, name, content):
+        path = os.path.join(self.target_folder, name)
+        with open(path, 'wb') as fh:
+            fh.write(content)
+        return path
+
+    def read(self, name):
+        with open(os.path.join(self.target_folder, name), 'rb') as fh:
+            return fh.read()
+
+    def test_that_stored_artifact_is_found_by_key_and_md5(self):
+        """ Test that an added artifact is placed again from its key and from its md5 sum """
+        store = ArtifactStore(self.store_folder)
+        md5 = store.add(('job', 1, 'a.jar'), self.write('a.jar', b'content'))
+
+        self.assertEqual(hashlib.md5(b'content').hexdigest(), md5)
+        self.assertTrue(store.fetch(('job', 1, 'a.jar'), os.path.join(self.target_folder, 'b.jar')))
+        self.assertTrue(store.fetch_md5(md5, os.path.join(self.target_folder, 'c.jar')))
+        self.assertFalse(store.fetch(('job', 2, 'a.jar'), os.path.join(self.target_folder, 'd.jar')))
+        self.assertEqual(b'content', self.read('b.jar'))
+        self.assertEqual(b'content', self.read('c.jar'))
+
+    def test_that_placed_artifacts_do_not_share_content_with_store(self):
+        """ Test that placed artifacts are writable copies, so changing them leaves the stored artifact intact """
+        store = ArtifactStore(self.store_folder)
+        path = self.write('a.jar', b'content')
+        md5 = store.add(('job', 1, 'a.jar'), path)
+        target = os.path.join(self.target_folder, 'b.jar')
+        store.fetch(('job', 1, 'a.jar'), target)
+
+        for placed in (path, target):
+            self.assertNotEqual(os.stat(store.find(md5)).st_ino, os.stat(placed).st_ino)
+            self.assertTrue(os.access(placed, os.W_OK))
+            with open(placed, 'ab') as fh:
+                fh.write(b' changed')
+
+        with open(store.find(md5), 'rb') as fh:
+            self.assertEqual(b'content', fh.read())
+
+    def test_that_store_is_reused_between_instances(self):
+        """ Test that artifacts added by one store instance are found by a later instance """
+        ArtifactStore(self.store_folder).add(('job', 1, 'a.jar'), self.write('a.jar', b'content'))
+
+        self.assertIsNotNone(ArtifactStore(self.store_folder).get(('job', 1, 'a.jar')))
+
+    def test_that_least_recently_used_artifacts_are_evicted(self):
+        """ Test that exceeding the size cap evicts the least recently used artifacts """
+        store = ArtifactStore(self.store_folder, max_size=10)
+        first = store.add(('job', 1, 'a'), self.write('a', b'aaaa'))
+        second = store.add(('job', 1, 'b'), self.write('b', b'bbbb'))
+        os.utime(store.find(first), (0, 0))
+        os.utime(store.find(second), (1, 1))
+        store.find(first)
+
+        store.add(('job', 1, 'c'), self.write('c', b'cccc'))
+
+        self.assertIsNotNone(store.get(('job', 1, 'a')))
+        self.assertIsNone(store.get(('job', 1, 'b')))
+        self.assertIsNotNone(store.get(('job', 1, 'c')))
+        self.assertEqual(2, len(os.listdir(store.keys_directory)))
+
+    def test_that_unchanged_artifacts_are_not_downloaded_again(self):
+        """ Test that a second run with the same artifacts downloads nothing, and
+            that a new build only downloads md5 files when the content is unchanged """
+        contents = {'url/a.jar': b'jar content',
+                    'url/a.jar.md5': hashlib.md5(b'jar content').hexdigest().encode('utf-8'),
+                    'url/b.txt': b'text'}
+
+        def download(downloads):
+            for url, path in downloads:
+                with open(path, 'wb') as fh:
+                    fh.write(contents[url])
+
+        store = ArtifactStore(self.store_folder)
+        downloader = Mock(side_effect=download)
+
+        def downloads(build):
+            return [(('job', build, name), 'url/' + name, os.path.join(self.target_folder, name)) for name in ('a.jar', 'a.jar.md5', 'b.txt')]
+
+        download_with_store(store, downloads(1), downloader)
+        downloaded = [path for call in downloader.call_args_list for url, path in call[0][0]]
+        self.assertEqual(3, len(downloaded))
+
+        shutil.rmtree(self.target_folder)
+        os.mkdir(self.target_folder)
+        downloader.reset_mock()
+        download_with_store(store, downloads(1), downloader)
+        self.assertEqual([], [path for call in downloader.call_args_list for url, path in call[0][0]])
+        self.assertEqual(b'jar content', self.read('a.jar'))
+
+        shutil.rmtree(self.target_folder)
+        os.mkdir(self.target_folder)
+        downloader.reset_mock()
+        download_with_store(store, downloads(2), downloader)
+        downloaded = [os.path.basename(path) for call in downloader.call_args_list for url, path in call[0][0]]
+        self.assertEqual(['a.jar.md5', 'b.txt'], downloaded)
+        self.assertEqual(b'jar content', self.read('a.jar'))
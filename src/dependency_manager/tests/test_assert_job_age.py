@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -*- mode: python -*-
+import unittest
+from mock import Mock
+
+from dependency_manager.assert_job_age import find_violations
+from dependency_manager.assert_job_age import get_job_ages
+
+
+class TestAssertJobAge(unittest.TestCase):
+
+    def setUp(self):
+        self.client = Mock()
+        self.client.get_json = Mock(return_value={'jobs': [{'name': 'fresh', 'lastStableBuild': {'number': 10, 'timestamp': 99000000}},
+                                                           {'name': 'old', 'lastStableBuild': {'number': 3, 'timestamp': 80000000}},
+                                                           {'name': 'never', 'lastStableBuild': None}]})
+
+    def test_that_ages_are_read_from_a_single_query(self):
+        """ Test that the ages of all jobs come from one tree limited query """
+        ages = get_job_ages('http://host', self.client, now=100000)
+
+        self.assertEqual({'fresh': 1000, 'old': 20000, 'never': None}, ages)
+        self.client.get_json.assert_called_once_with('http://host/api/json', params={'tree': 'jobs[name,lastStableBuild[number,timestamp]]'})
+
+    def test_that_view_jobs_are_queried(self):
+        """ Test that the query of a personal view goes to the view of the user """
+        get_job_ages('http://host/', self.client, view='nightly', view_user='someone', now=100000)
+
+        self.assertEqual('http://host/user/someone/my-views/view/nightly/api/json', self.client.get_json.call_args[0][0])
+
+    def test_that_all_violations_are_reported(self):
+        """ Test that too old, never stable and unknown jobs are all reported, using the threshold of each job """
+        ages = get_job_ages('http://host', self.client, now=100000)
+
+        violations = find_violations(ages, {'fresh': 2000, 'old': 10000, 'never': 10000, 'missing': 10000})
+
+        self.assertEqual(["missing: job not found",
+                          "never: no stable build",
+                          "old: Actual age: 20000 seconds is older than maximum age: 10000 seconds"], violations)
+        self.assertEqual([], find_violations(ages, {'fresh': 2000, 'old': 30000}))
+
+    def test_that_folder_jobs_are_retrieved_on_their_own(self):
+        """ Test that jobs missing from the listing, eg. jobs in folders, are retrieved with a request of their own """
+        listing = self.client.get_json.return_value
+        folder_job = {'lastStableBuild': {'number': 2, 'timestamp': 90000000}}
+
+        def get_json(url, params=None):
+            if url == 'http://host/job/folder/job/master/api/json':
+                return folder_job
+            if url == 'http://host/api/json':
+                return listing
+            raise RuntimeError("not found")
+        self.client.get_json = Mock(side_effect=get_json)
+
+        ages = get_job_ages('http://host', self.client, job_names=['fresh', 'folder/job/master', 'missing'], now=100000)
+
+        self.assertEqual({'fresh': 1000, 'old': 20000, 'never': None, 'folder/job/master': 10000}, ages)
+        self.assertEqual({'tree': 'lastStableBuild[number,timestamp]'}, self.client.get_json.call_args_list[1][1]['params'])
+        self.assertEqual(["missing: job not found"], find_violations(ages, {'folder/job/master': 20000, 'missing': 20000}))
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -*- mode: python -*-
+import asyncio
+import json
+import pkg_resources
+import shutil
+import tempfile
+import threading
+import unittest
+from mock import Mock
+from mock import patch
+
+from dependency_manager.async_dependency_list import AsyncDependencyResolver
+from dependency_manager.async_jenkins_client import AsyncJenkinsClient
+from dependency_manager.common import DependencyException
+from dependency_manager.jenkins_client import JenkinsClient
+from dependency_manager.project_registry import ProjectRegistry
+from dependency_manager.response_cache import ResponseCache
+from dependency_manager.project_registry import get_registry
+
+
+class FakeResponse(object):
+    """ aiohttp response serving content """
+    def __init__(self, session, content):
+        self.session = session
+        self.status = 200
+        self.headers = {}
+        self.content = content
+
+    async def read(self):
+        # Lets the other requests start before this one finishes
+        await asyncio.sleep(0)
+        return self.content
+
+    async def __aenter__(self):
+        self.session.in_flight += 1
+        self.session.max_in_flight = max(self.session.max_in_flight, self.session.in_flight)
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.session.in_flight -= 1
+
+
+class FakeSession(object):
+    """ aiohttp client session serving responses """
+    def __init__(self, responses):
+        self.responses = responses
+        self.urls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.closed = False
+
+    def get(self, url, params=None, headers=None):
+        self.urls.append(url)
+        return FakeResponse(self, self.responses[url])
+
+    async def close(self):
+        self.closed = True
+
+
+def read_data(name):
+    with open(pkg_resources.resource_filename('dependency_manager', 'tests/data/%s' % name), "rb") as fh:
+        return fh.read()
+
+
+def read_json_data(name):
+    """ Reads python literal test data and returns it as json """
+    return json.dumps(eval(read_data(name))).encode('utf-8')
+
+
+def read_json_build(name, number):
+    """ Reads first build of python literal project information and returns it as json with number """
+    build = eval(read_data(name))['builds'][0]
+    build['number'] = number
+    return json.dumps(build).encode('utf-8')
+
+
+class TestAsyncDependencyResolver(unittest.TestCase):
+
+    def setUp(self):
+        self.responses = {'jenkins_url/job/master-job/api/json': read_json_data('project_info.txt'),
+                          'jenkins_url/job/master-job/config.xml': read_data('project_config.xml'),
+                          'jenkins_url/job/dependency-manager-test-A/api/json': read_json_data('project_info.txt'),
+                          'jenkins_url/job/dependency-manager-test-A/config.xml': read_data('project_config.xml'),
+                          'jenkins_url/job/dependency-manager-test-A/20/artifact/dependencies.txt': read_data('dependencies.txt'),
+                          'jenkins_url/job/opensearchdependencies-head-metode/57/api/json': read_json_build('repository_project_info.txt', 57)}
+
+        self.jenkins_client = JenkinsClient("user:pass")
+        self.jenkins_client.session.get = Mock(side_effect=self._get)
+
+    def _get(self, url, params=None, stream=False, headers=None):
+        response = Mock()
+        response.status_code = 200
+        response.content = self.responses[url]
+        response.headers = {}
+        return response
+
+    def _build(self, aiohttp=None):
+        client = AsyncJenkinsClient(self.jenkins_client)
+        resolver = AsyncDependencyResolver("jenkins_url", "dependencies.txt", "opensearchdependencies-head-metode",
+                                           client=client, registry=ProjectRegistry())
+
+        async def build():
+            try:
+                return await resolver.build_dependency_list("master-job", 20)
+            finally:
+                await client.close()
+
+        with patch('dependency_manager.async_jenkins_client.aiohttp', aiohttp):
+            return asyncio.run(build())
+
+    def test_that_the_dependency_graph_is_resolved(self):
+        """ Test that upstream projects and their dependencies are resolved in the expected order """
+        dependency_list = self._build()
+
+        expected = [('dependency-manager-test-A', 20, None),
+                    ('dependency-manager-test', 38, None),
+                    ('dbc-python-head', 1432, 'dependency-manager-test'),
+                    ('apache-solr-4.5.0', 57, 'dependency-manager-test')]
+        self.assertEqual(expected, [(x[0].name, x[0].build_number, x[1]) for x in dependency_list.dependencies])
+
+    def test_that_each_url_is_only_requested_once(self):
+        """ Test that every project, and the repository build, is only fetched once, and
+            that the repository information is not fetched when the build number is known """
+        self._build()
+
+        urls = [x[0][0] for x in self.jenkins_client.session.get.call_args_list]
+        self.assertEqual(sorted(self.responses.keys()), sorted(urls))
+
+    def test_that_listed_jobs_are_written_from_the_dependency_file(self):
+        """ Test that jobs listed in upstream dependency files are written with the
+            version information of the dependency file, without fetching them """
+        dependency_list = self._build()
+        call_count = self.jenkins_client.session.get.call_count
+
+        content = dependency_list.tostring()
+
+        self.assertEqual(call_count, self.jenkins_client.session.get.call_count)
+        self.assertIn("dbc-python-head\n"
+                      "   Added by: dependency-manager-test\n"
+                      "   Build: 1432\n"
+                      "   SVN/GIT: https://svn.dbc.dk/repos/dbc-python/trunk     (rev: 63555)\n", content)
+
+    def test_that_dependency_mismatch_raises(self):
+        """ Test that a dependency mismatch is detected by the async builder """
+        self.responses['jenkins_url/job/dependency-manager-test-A/20/artifact/dependencies.txt'] = \
+            read_data('dependencies.txt').replace(b"### Project: dependency-manager-test\n", b"### Project: dependency-manager-test-A\n").replace(b"### Build: 38", b"### Build: 19")
+        self.responses['jenkins_url/job/dependency-manager-test-A/19/api/json'] = read_json_build('project_info.txt', 19)
+
+        self.assertRaises(DependencyException, self._build)
+
+    def test_that_requests_are_made_concurrently_with_aiohttp(self):
+        """ Test that requests are made with the aiohttp session, several at a time on the event loop """
+        session = FakeSession(self.responses)
+        aiohttp = Mock()
+        aiohttp.ClientSession = Mock(return_value=session)
+
+        dependency_list = self._build(aiohttp)
+
+        self.assertEqual(4, len(dependency_list.dependencies))
+        self.assertEqual(sorted(self.responses.keys()), sorted(session.urls))
+        self.assertEqual(0, self.jenkins_client.session.get.call_count)
+        self.assertGreater(session.max_in_flight, 1)
+        self.assertTrue(session.closed)
+        aiohttp.BasicAuth.assert_called_once_with('user', 'pass')
+
+    def test_that_each_resolver_has_its_own_registry(self):
+        """ Test that resolvers without a registry do not share projects, so the last successful build is looked up again """
+        first = AsyncDependencyResolver("jenkins_url", "dependencies.txt", "repository", client=Mock())
+        second = AsyncDependencyResolver("jenkins_url", "dependencies.txt", "repository", client=Mock())
+
+        self.assertIsNot(first.registry, second.registry)
+        self.assertIsNot(get_registry(), first.registry)
+
+    def test_that_response_cache_is_used_off_the_event_loop(self):
+        """ Test that the response cache is read and written from executor threads, not from the event loop thread """
+        test_folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, test_folder)
+        cache = ResponseCache(test_folder)
+        threads = set()
+
+        def record(function):
+            def recorded(*args, **kwargs):
+                threads.add(threading.current_thread())
+                return function(*args, **kwargs)
+            return recorded
+        cache.get = record(cache.get)
+        cache.put = record(cache.put)
+        self.jenkins_client.cache = cache
+
+        self._build()
+        first_requests = self.jenkins_client.session.get.call_count
+        self._build()
+
+        self.assertTrue(threads)
+        self.assertNotIn(threading.main_thread(), threads)
+        self.assertLess(self.jenkins_client.session.get.call_count, 2 * first_requests)
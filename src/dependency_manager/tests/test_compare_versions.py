@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -*- mode: python -*-
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from mock import Mock
+from mock import patch
+
+from dependency_manager.compare_versions import bisect_builds
+from dependency_manager.compare_versions import cli
+from dependency_manager.compare_versions import compare_revisions
+from dependency_manager.compare_versions import diff_dependency_files
+from dependency_manager.compare_versions import format_diff
+from dependency_manager.compare_versions import svn_log
+from dependency_manager.response_cache import ResponseCache
+
+
+def create_process(stdout, returncode=0):
+    process = Mock()
+    process.communicate = Mock(return_value=(stdout, ''))
+    process.returncode = returncode
+    return process
+
+
+def create_dependency_file(build_number, upstream_build, revision):
+    return "\n".join(["### Project: job",
+                      "### Build: %s" % build_number,
+                      "### SVN: trunk/job     (rev: %s)" % revision,
+                      "upstream",
+                      "   Added by: job",
+                      "   Build: %s" % upstream_build,
+                      "   SVN/GIT: trunk/upstream     (rev: 100)",
+                      ""])
+
+
+class TestCompareVersions(unittest.TestCase):
+
+    def setUp(self):
+        self.test_folder = tempfile.mkdtemp()
+        self.options = Mock()
+        self.options.diff = False
+
+    def tearDown(self):
+        shutil.rmtree(self.test_folder)
+
+    @patch('dependency_manager.compare_versions.subprocess.Popen')
+    def test_that_changed_modules_are_reported_in_order(self, popen):
+        """ Test that modules are matched by path and reported in the order of the new modules """
+        popen.side_effect = lambda command, **kwargs: create_process("log of %s" % command[-1])
+        old = [('path/b', '10'), ('path/a', '5'), ('path/c', '7')]
+        new = [('path/a', '6'), ('path/b', '10'), ('path/c', '9'), ('path/d', '1')]
+
+        output = io.StringIO()
+        with redirect_stdout(output):
+            compare_revisions(old, new, self.options, max_workers=3)
+
+        self.assertEqual(["Modules:",
+                          "==========", "path/a: revision 5 -> 6", "----------", "Changes:", "log of path/a",
+                          "path/b: revision 10 same revision",
+                          "==========", "path/c: revision 7 -> 9", "----------", "Changes:", "log of path/c"],
+                         output.getvalue().splitlines())
+        self.assertEqual(2, popen.call_count)
+
+    @patch('dependency_manager.compare_versions.subprocess.Popen')
+    def test_that_git_modules_are_looked_up_in_mirror(self, popen):
+        """ Test that modules with git revisions are logged from the git mirror, comparing commit ids """
+        mirror = Mock()
+        mirror.log = Mock(return_value="git log")
+        old = [('git@host:repo.git', 'master - ' + 'a' * 40), ('git@host:other.git', 'b' * 40)]
+        new = [('git@host:repo.git', 'c' * 40), ('git@host:other.git', 'master - ' + 'b' * 40)]
+
+        output = io.StringIO()
+        with redirect_stdout(output):
+            compare_revisions(old, new, self.options, mirror=mirror)
+
+        mirror.log.assert_called_once_with('git@host:repo.git', 'a' * 40, 'c' * 40, diff=False)
+        self.assertIn("git log", output.getvalue())
+        self.assertIn("git@host:other.git: revision master - %s same revision" % ('b' * 40), output.getvalue())
+        self.assertEqual(0, popen.call_count)
+
+    @patch('dependency_manager.compare_versions.subprocess.Popen')
+    def test_that_svn_is_called_with_argument_list(self, popen):
+        """ Test that svn is run without a shell, with the revision range following the old revision """
+        popen.return_value = create_process("log")
+        self.options.diff = True
+
+        svn_log('5', '9', 'path with space', self.options)
+
+        self.assertEqual(['svn', 'diff', '-r6:9', 'path with space'], popen.call_args[0][0])
+        self.assertNotIn('shell', popen.call_args[1])
+
+    @patch('dependency_manager.compare_versions.subprocess.Popen')
+    def test_that_svn_output_is_cached(self, popen):
+        """ Test that output for a revision range is taken from the cache on later calls """
+        popen.return_value = create_process("log")
+        cache = ResponseCache(self.test_folder)
+
+        self.assertEqual("log", svn_log('5', '9', 'path', self.options, cache))
+        self.assertEqual("log", svn_log('5', '9', 'path', self.options, ResponseCache(self.test_folder)))
+        self.assertEqual(1, popen.call_count)
+
+    @patch('dependency_manager.compare_versions.subprocess.Popen')
+    def test_that_failing_svn_raises(self, popen):
+        """ Test that a failing svn command raises and is not cached """
+        popen.return_value = create_process("", returncode=1)
+        cache = ResponseCache(self.test_folder)
+
+        self.assertRaises(RuntimeError, svn_log, '5', '9', 'path', self.options, cache)
+        self.assertIsNone(cache.get('svn log -r6:9 path'))
+
+
+class TestBisectBuilds(unittest.TestCase):
+
+    def setUp(self):
+        # upstream changes from build 3 to 4 in build 37, module changes in build 60, build 50 has no dependency file
+        self.files = {}
+        for build_number in range(1, 101):
+            if build_number != 50:
+                self.files[build_number] = create_dependency_file(build_number, 3 if build_number < 37 else 4, 1000 if build_number < 60 else 1001)
+        self.fetched = []
+
+        def create_project(jenkins_server, job_name, build_number, jenkins_client):
+            self.fetched.append(build_number)
+            project = Mock()
+            project.get_dependency_file_content = Mock(return_value=self.files.get(build_number))
+            return project
+        self.create_project = create_project
+
+    def test_that_first_changed_upstream_build_is_found(self):
+        """ Test that the first build with a changed upstream build is found from a logarithmic number of files """
+        with patch('dependency_manager.compare_versions.JenkinsProject', side_effect=self.create_project):
+            result = bisect_builds('server', 'job', 1, 100, 'upstream')
+
+        self.assertEqual(37, result[0])
+        self.assertEqual((3, (('trunk/upstream', '100'),)), result[1])
+        self.assertEqual(4, result[2][0])
+        self.assertLessEqual(len(self.fetched), 10)
+
+    def test_that_first_changed_module_revision_is_found_skipping_missing_builds(self):
+        """ Test that the first build with a changed module revision is found when a probed build has no dependency file """
+        self.files.pop(59)
+
+        with patch('dependency_manager.compare_versions.JenkinsProject', side_effect=self.create_project):
+            result = bisect_builds('server', 'job', 40, 70, 'trunk/job')
+
+        self.assertEqual((60, '1000', '1001'), result)
+
+    def test_that_unchanged_name_gives_none(self):
+        """ Test that None is returned when name is the same in the first and last build """
+        with patch('dependency_manager.compare_versions.JenkinsProject', side_effect=self.create_project):
+            self.assertIsNone(bisect_builds('server', 'job', 1, 36, 'upstream'))
+        self.assertEqual([1, 36], self.fetched)
+
+
+def create_entry(name, build_number, revision):
+    return ["%s" % name,
+            "   Added by: job",
+            "   Build: %s" % build_number,
+            "   SVN/GIT: trunk/%s     (rev: %s)" % (name, revision)]
+
+
+class TestDiffDependencyFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.test_folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_folder)
+
+    def write(self, name, build_number, entries):
+        path = os.path.join(self.test_folder, name)
+        lines = ["### Project: job", "### Build: %s" % build_number, "### SVN: trunk/job     (rev: %s)" % build_number]
+        for entry in entries:
+            lines += create_entry(*entry)
+        with open(path, 'w') as fh:
+            fh.write("\n".join(lines) + "\n")
+        return path
+
+    def test_that_whole_graph_is_diffed(self):
+        """ Test that added, removed and rebuilt projects are reported with build deltas and changed revisions """
+        old = self.write('old.txt', 10, [('a', 1, 100), ('b', 5, 200), ('c', 7, 300), ('e', 2, 500)])
+        new = self.write('new.txt', 12, [('b', 8, 210), ('c', 7, 300), ('d', 1, 400), ('e', 2, 501)])
+
+        diff = diff_dependency_files(old, new)
+
+        self.assertEqual({'name': 'job', 'old_build': 10, 'new_build': 12, 'build_delta': 2,
+                          'scm': [{'path': 'trunk/job', 'old_revision': '10', 'new_revision': '12'}]}, diff['master'])
+        self.assertEqual([{'name': 'd', 'build': 1}], diff['added'])
+        self.assertEqual([{'name': 'a', 'build': 1}], diff['removed'])
+        self.assertEqual(['b', 'e'], [x['name'] for x in diff['rebuilt']])
+        self.assertEqual(3, diff['rebuilt'][0]['build_delta'])
+        self.assertEqual([{'path': 'trunk/b', 'old_revision': '200', 'new_revision': '210'}], diff['rebuilt'][0]['scm'])
+        self.assertEqual(1, diff['unchanged'])
+        self.assertEqual(diff, json.loads(json.dumps(diff)))
+
+    def test_that_diff_is_formatted_as_text(self):
+        """ Test that the text format lists every change """
+        old = self.write('old.txt', 10, [('a', 1, 100), ('b', 5, 200)])
+        new = self.write('new.txt', 10, [('b', 8, 210), ('d', 1, 400)])
+
+        self.assertEqual(["Project job: build 10 -> 10",
+                          "Added projects (1):",
+                          "  + d build 1",
+                          "Removed projects (1):",
+                          "  - a build 1",
+                          "Rebuilt projects (1):",
+                          "  * b build 5 -> 8 (+3)",
+                          "      trunk/b: revision 200 -> 210",
+                          "Unchanged projects: 0"], format_diff(diff_dependency_files(old, new)).splitlines())
+
+    def test_that_graph_and_bisect_cannot_be_combined(self):
+        """ Test that the commandline rejects --graph together with --bisect """
+        with patch('sys.argv', ['compare-versions', '--graph', '--bisect', 'job', '1', '5', 'trunk/b']), \
+                patch('sys.stderr', io.StringIO()):
+            self.assertRaises(SystemExit, cli)
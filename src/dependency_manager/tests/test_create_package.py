@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -*- mode: python -*-
+import hashlib
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+from mock import Mock
+from mock import patch
+
+from dependency_manager.artifact_store import ArtifactStore
+from dependency_manager.create_package import check_md5_sums
+from dependency_manager.create_package import create_md5file
+from dependency_manager.create_package import create_package
+from dependency_manager.create_package import find_symlinks
+from dependency_manager.create_package import get_view_artifacts
+from dependency_manager.create_package import stream_package
+from dependency_manager.create_package import yield_view_jobs
+
+
+class TestMd5Sums(unittest.TestCase):
+
+    def setUp(self):
+        self.test_folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_folder)
+
+    def write(self, name, content):
+        path = os.path.join(self.test_folder, name)
+        with open(path, 'w') as fh:
+            fh.write(content)
+        return path
+
+    def test_that_artifacts_are_checked_against_md5_files(self):
+        """ Test that artifacts are hashed and checked when no md5 sums are known """
+        create_md5file(self.write('a.jar', 'a content'))
+        self.write('b.jar', 'b content')
+        self.write('b.jar.md5', hashlib.md5(b'b content').hexdigest())
+
+        check_md5_sums(self.test_folder)
+
+        self.write('b.jar', 'changed content')
+        self.assertRaises(RuntimeError, check_md5_sums, self.test_folder)
+
+    def test_that_known_md5_sums_are_used(self):
+        """ Test that md5 sums computed while downloading are used instead of hashing the files again """
+        path = self.write('a.jar', 'a content')
+        self.write('a.jar.md5', hashlib.md5(b'other content').hexdigest())
+
+        check_md5_sums(self.test_folder, {path: hashlib.md5(b'other content').hexdigest()})
+
+    def test_that_missing_md5_file_fails(self):
+        """ Test that an artifact without md5 file raises """
+        self.write('a.jar', 'a content')
+
+        self.assertRaises(RuntimeError, check_md5_sums, self.test_folder)
+
+    def test_that_md5_file_has_md5sum_format(self):
+        """ Test that created md5 files have the format of md5sum """
+        path = self.write('a.jar', 'a content')
+
+        create_md5file(path)
+
+        with open(path + '.md5') as fh:
+            self.assertEqual("%s  %s\n" % (hashlib.md5(b'a content').hexdigest(), path), fh.read())
+
+
+class TestCreatePackage(unittest.TestCase):
+
+    def setUp(self):
+        self.test_folder = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.test_folder)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.test_folder)
+
+    def test_that_package_contains_artifacts_and_dependency_file(self):
+        """ Test that package holds the renamed download folder with the dependency file added, and has a matching md5 file """
+        os.mkdir('resources')
+        with open(os.path.join('resources', 'a.jar'), 'w') as fh:
+            fh.write('a content')
+        os.symlink('a.jar', os.path.join('resources', 'a-link.jar'))
+        with open('dependencies.txt', 'w') as fh:
+            fh.write('### Project: job\n')
+
+        create_package('resources', 'package', 'dependencies.txt', level=1, threads=2)
+
+        with tarfile.open('package.tgz') as tar:
+            self.assertEqual(['package', 'package/a-link.jar', 'package/a.jar', 'package/dependencies.txt'], tar.getnames())
+            self.assertEqual(b'### Project: job\n', tar.extractfile('package/dependencies.txt').read())
+            self.assertTrue(tar.getmember('package/a-link.jar').issym())
+        self.assertFalse(os.path.exists(os.path.join('package', 'dependencies.txt')))
+        with open('package.tgz', 'rb') as fh:
+            md5 = hashlib.md5(fh.read()).hexdigest()
+        with open('package.tgz.md5') as fh:
+            self.assertEqual("%s  package.tgz\n" % md5, fh.read())
+
+
+def create_response(content, headers=None):
+    response = Mock()
+    response.status_code = 200
+    response.content = content
+    response.headers = headers if headers is not None else {'Content-Length': str(len(content))}
+    response.iter_content = Mock(side_effect=lambda size: iter([content[x:x + 3] for x in range(0, len(content), 3)]))
+    return response
+
+
+class TestStreamPackage(unittest.TestCase):
+
+    def setUp(self):
+        self.test_folder = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.test_folder)
+        with open('dependencies.txt', 'w') as fh:
+            fh.write('### Project: job\n')
+        self.artifacts = [(('job', 1, 'a-1.0.jar'), 'url/a-1.0.jar'),
+                          (('job', 1, 'a-1.0.jar.md5'), 'url/a-1.0.jar.md5'),
+                          (('job', 1, 'b.txt'), 'url/b.txt'),
+                          (('job', 1, 'b.txt.md5'), 'url/b.txt.md5')]
+        self.contents = {'url/a-1.0.jar': b'jar content',
+                         'url/a-1.0.jar.md5': hashlib.md5(b'jar content').hexdigest().encode('utf-8'),
+                         'url/b.txt': b'text',
+                         'url/b.txt.md5': hashlib.md5(b'text').hexdigest().encode('utf-8')}
+        self.headers = {}
+        self.client = Mock()
+        self.client.get = Mock(side_effect=lambda url, stream: create_response(self.contents[url], self.headers.get(url)))
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.test_folder)
+
+    def test_that_artifacts_are_streamed_into_package(self):
+        """ Test that artifacts, md5 files, symlinks and dependency file are written as members without touching disk """
+        self.headers['url/b.txt'] = {}
+
+        stream_package(self.artifacts, 'package', 'dependencies.txt', [('a.jar', 'a-.*.jar')], self.client, threads=2)
+
+        with tarfile.open('package.tgz') as tar:
+            self.assertEqual(['package', 'package/a-1.0.jar', 'package/a-1.0.jar.md5', 'package/b.txt', 'package/b.txt.md5',
+                              'package/a.jar', 'package/dependencies.txt'], tar.getnames())
+            self.assertEqual(b'jar content', tar.extractfile('package/a-1.0.jar').read())
+            self.assertEqual(b'text', tar.extractfile('package/b.txt').read())
+            self.assertEqual('a-1.0.jar', tar.getmember('package/a.jar').linkname)
+        self.assertEqual(['dependencies.txt', 'package.tgz', 'package.tgz.md5'], sorted(os.listdir('.')))
+
+    def test_that_md5_files_can_be_left_out(self):
+        """ Test that md5 files are not added to the package when remove_md5s is set """
+        stream_package(self.artifacts, 'package', 'dependencies.txt', [], self.client, remove_md5s=True)
+
+        with tarfile.open('package.tgz') as tar:
+            self.assertEqual(['package', 'package/a-1.0.jar', 'package/b.txt', 'package/dependencies.txt'], tar.getnames())
+
+    def test_that_md5_mismatch_removes_package(self):
+        """ Test that an artifact not matching its md5 file raises and leaves no package """
+        self.contents['url/b.txt'] = b'txet'
+
+        self.assertRaises(RuntimeError, stream_package, self.artifacts, 'package', 'dependencies.txt', [], self.client)
+        self.assertFalse(os.path.exists('package.tgz'))
+
+    def test_that_streamed_artifacts_are_added_to_store(self):
+        """ Test that streamed artifacts are added to the store, and taken from it by their md5 sum in a later build """
+        store = ArtifactStore(os.path.join(self.test_folder, 'store'))
+
+        stream_package(self.artifacts, 'package', 'dependencies.txt', [], self.client, store=store)
+
+        self.assertIsNotNone(store.get(('job', 1, 'a-1.0.jar')))
+        self.assertIsNotNone(store.get(('job', 1, 'b.txt')))
+        self.assertEqual([], [x for x in os.listdir(store.directory) if x.endswith('.tmp')])
+
+        self.client.get.reset_mock()
+        later = [((key[0], 2, key[2]), url) for key, url in self.artifacts]
+        stream_package(later, 'package', 'dependencies.txt', [], self.client, store=store)
+
+        self.assertEqual(['url/a-1.0.jar.md5', 'url/b.txt.md5'], sorted(x[0][0] for x in self.client.get.call_args_list))
+        self.assertIsNotNone(store.get(('job', 2, 'b.txt')))
+        with tarfile.open('package.tgz') as tar:
+            self.assertEqual(b'jar content', tar.extractfile('package/a-1.0.jar').read())
+
+    def test_that_mismatching_artifact_is_not_stored(self):
+        """ Test that an artifact not matching its md5 file is not added to the store """
+        store = ArtifactStore(os.path.join(self.test_folder, 'store'))
+        self.contents['url/b.txt'] = b'txet'
+
+        self.assertRaises(RuntimeError, stream_package, self.artifacts, 'package', 'dependencies.txt', [], self.client, store=store)
+        self.assertIsNone(store.get(('job', 1, 'b.txt')))
+        self.assertEqual([], [x for x in os.listdir(store.directory) if x.endswith('.tmp')])
+
+    def test_that_missing_md5_file_fails(self):
+        """ Test that an artifact without md5 file raises before anything is streamed """
+        self.assertRaises(RuntimeError, stream_package, self.artifacts[:3], 'package', 'dependencies.txt', [], self.client)
+        self.assertEqual(0, self.client.get.call_count)
+
+
+class TestViewArtifacts(unittest.TestCase):
+
+    def test_that_descriptions_are_read_from_view_listing(self):
+        """ Test that artifacts are found from the view listing in a single request when descriptions are included """
+        client = Mock()
+        client.get_json = Mock(return_value={'jobs': [{'name': 'a', 'url': 'http://host/job/a/', 'description': 'pkg:a.jar=a-.*.jar: text'},
+                                                      {'name': 'b', 'url': 'http://host/job/b/', 'description': None},
+                                                      {'name': 'c', 'url': 'http://host/job/c/', 'description': 'pkg:c.war=c-.*.war:'}]})
+
+        artifacts = get_view_artifacts('http://host', 'user', 'view', 'pkg', client)
+
+        self.assertEqual([['a.jar', 'a-.*.jar'], ['c.war', 'c-.*.war']], artifacts)
+        client.get_json.assert_called_once_with('http://host/user/user/my-views/view/view/api/json', {'tree': 'jobs[name,url,description]'})
+        self.assertEqual(0, client.get_content.call_count)
+
+    def test_that_configuration_is_fetched_for_jobs_without_description(self):
+        """ Test that config.xml is only fetched for jobs whose description is missing from the listing """
+        client = Mock()
+        client.get_json = Mock(return_value={'jobs': [{'name': 'a', 'url': 'http://host/job/a/'},
+                                                      {'name': 'b', 'url': 'http://host/job/b/', 'description': 'pkg:b.jar=b-.*.jar:'}]})
+        client.get_content = Mock(return_value=b'<project><description>pkg:a.jar=a-.*.jar:</description></project>')
+
+        artifacts = get_view_artifacts('http://host', 'user', 'view', 'pkg', client)
+
+        self.assertEqual([['a.jar', 'a-.*.jar'], ['b.jar', 'b-.*.jar']], artifacts)
+        client.get_content.assert_called_once_with('http://host/job/a/config.xml')
+
+    def test_that_process_wide_client_is_used_if_no_client_is_given(self):
+        """ Test that the view jobs are listed with the process wide client when no client is given """
+        client = Mock()
+        client.get_json = Mock(return_value={'jobs': [{'name': 'a', 'url': 'http://host/job/a/', 'description': 'text'}]})
+
+        with patch('dependency_manager.create_package.get_client', Mock(return_value=client)):
+            jobs = list(yield_view_jobs('http://host', 'user', 'view'))
+
+        self.assertEqual([('a', 'http://host/job/a/', 'text')], jobs)
+
+
+class TestSymlinks(unittest.TestCase):
+
+    def test_that_symlinks_point_to_matching_artifacts(self):
+        """ Test that each symlink points to the artifact matching its pattern, ignoring md5 files and the symlink itself """
+        names = ['a-1.0.jar', 'a-1.0.jar.md5', 'b.war', 'c.jar']
+
+        symlinks = find_symlinks(names, [('a.jar', 'a-.*\\.jar'), ('b.war', 'b\\.war'), ('any.jar', 'c\\.jar$')])
+
+        self.assertEqual([('a-1.0.jar', 'a.jar'), ('c.jar', 'any.jar')], symlinks)
+
+    def test_that_multiple_matches_fail(self):
+        """ Test that a symlink pattern matching several artifacts raises """
+        self.assertRaises(RuntimeError, find_symlinks, ['a-1.jar', 'a-2.jar'], [('a.jar', 'a-')])
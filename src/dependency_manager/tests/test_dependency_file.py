@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -*- mode: python -*-
+import pkg_resources
+import tempfile
+import unittest
+
+from dependency_manager.dependency_file import DependencyRecord
+from dependency_manager.dependency_file import find_record
+from dependency_manager.dependency_file import iter_records
+from dependency_manager.dependency_file import mapped_file
+from dependency_manager.dependency_file import parse_dependency_file
+from dependency_manager.dependency_file import read_dependency_file
+
+
+class TestDependencyFile(unittest.TestCase):
+
+    def setUp(self):
+        self.dependency_filename = pkg_resources.resource_filename('dependency_manager', 'tests/data/dependencies.txt')
+        self.dependency_string = None
+        with open(self.dependency_filename) as fh:
+            self.dependency_string = fh.read()
+
+    def test_master_project_is_parsed(self):
+        """ Test that name, build number and scm lines of the master project are parsed """
+        dependency_file = parse_dependency_file(self.dependency_string)
+
+        self.assertEqual('dependency-manager-test', dependency_file.name)
+        self.assertEqual(38, dependency_file.build_number)
+        self.assertEqual([('https://svn.dbc.dk/repos/new-dependency-manager/trunk', '67580')], dependency_file.scm)
+
+    def test_records_are_parsed(self):
+        """ Test that the entries are parsed into the expected records """
+        dependency_file = read_dependency_file(self.dependency_filename, 'opensearchdependencies-head-metode')
+
+        expected_records = [DependencyRecord('dbc-python-head', 'dependency-manager-test', 1432,
+                                             [('https://svn.dbc.dk/repos/dbc-python/trunk', '63555')], False,
+                                             self.dependency_string.index('dbc-python-head')),
+                            DependencyRecord('apache-solr-4.5.0', 'dependency-manager-test', 57,
+                                             [('opensearchdependencies-head-metode', 'NA')], True,
+                                             self.dependency_string.index('apache-solr-4.5.0'))]
+
+        self.assertEqual(expected_records, dependency_file.records)
+
+    def test_multiple_scm_lines_and_git_revisions_are_parsed(self):
+        """ Test that continuation scm lines and git revisions are parsed """
+        dependency_string = "\n".join(["### Project: master",
+                                       "### Build: 2",
+                                       "### SVN: https://svn/a     (rev: 10)",
+                                       "###      https://svn/b     (rev: 11)",
+                                       "",
+                                       "project",
+                                       "   Added by: master",
+                                       "   Build: 5",
+                                       "   SVN/GIT: https://git/a.git     (rev: origin/master - 0123abcd)",
+                                       "        https://svn/c     (rev: 12)"])
+
+        dependency_file = parse_dependency_file(dependency_string)
+
+        self.assertEqual([('https://svn/a', '10'), ('https://svn/b', '11')], dependency_file.scm)
+        self.assertEqual([('https://git/a.git', 'origin/master - 0123abcd'), ('https://svn/c', '12')],
+                         dependency_file.records[0].scm)
+
+    def test_missing_master_project_raises(self):
+        """ Test that a dependency string without master project raises error """
+        self.assertRaises(RuntimeError, parse_dependency_file, "project\n   Added by: master\n   Build: 5\n")
+
+    def test_find_record_returns_the_named_entry(self):
+        """ Test that find_record finds the named entry in a mapped file """
+        with mapped_file(self.dependency_filename) as data:
+            record = find_record(data, 'apache-solr-4.5.0')
+            self.assertEqual(None, find_record(data, 'unknown'))
+
+        self.assertEqual(('apache-solr-4.5.0', 57), (record.name, record.build_number))
+        self.assertEqual(self.dependency_string.index('apache-solr-4.5.0'), record.offset)
+
+    def test_find_record_stops_at_first_match(self):
+        """ Test that entries after the match are neither parsed nor validated """
+        dependency_string = "### Project: master\n### Build: 2\n\nfirst\n   Build: 1\nbroken\n   Added by: master\n"
+
+        self.assertEqual(1, find_record(dependency_string, 'first').build_number)
+        records = iter_records(dependency_string)
+        self.assertEqual('first', next(records).name)
+        self.assertRaises(RuntimeError, next, records)
+
+    def test_empty_file_can_be_mapped(self):
+        """ Test that an empty file maps to empty content """
+        with tempfile.NamedTemporaryFile() as fh:
+            with mapped_file(fh.name) as data:
+                self.assertEqual([], list(iter_records(data)))
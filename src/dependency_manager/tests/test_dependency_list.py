@@ -1,13 +1,22 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 # -*- mode: python -*-
+import os
 import pkg_resources
+import shutil
+import tempfile
 import unittest
 
+from mock import Mock
 from mock import patch
 from mock import call
 
+from dependency_manager.common import DependencyException
+from dependency_manager.dependency_file import parse_dependency_file
+from dependency_manager.dependency_list import DependencyList
 from dependency_manager.dependency_list import parse_dependency_string
+from dependency_manager.project_registry import ProjectRegistry
+from dependency_manager.project_registry import get_registry
 
 
 class TestDependencyList(unittest.TestCase):
@@ -17,30 +26,32 @@ class TestDependencyList(unittest.TestCase):
         self.dependency_string = None
         with open(depedency_filename) as fh:
             self.dependency_string = fh.read()
+        self.client = Mock()
+        get_registry().clear()
 
     @patch('dependency_manager.dependency_list.JenkinsProject')
     @patch('dependency_manager.dependency_list.JenkinsRepositoryProject')
     def test_that_the_main_project_is_created_as_expected(self, repo_mock, project_mock):
         """ Test that the dependency files main project is created as expected
         """
-        parse_dependency_string("jenkins_url", self.dependency_string, 'opensearchdependencies-head-metode', jenkins_credentials="user:pass")
-        self.assertTrue(call('jenkins_url', 'dependency-manager-test', build_number=38, jenkins_credentials="user:pass") in project_mock.call_args_list)
+        parse_dependency_string("jenkins_url", self.dependency_string, 'opensearchdependencies-head-metode', jenkins_client=self.client)
+        self.assertTrue(call('jenkins_url', 'dependency-manager-test', build_number=38, jenkins_client=self.client) in project_mock.call_args_list)
 
     @patch('dependency_manager.dependency_list.JenkinsProject')
     @patch('dependency_manager.dependency_list.JenkinsRepositoryProject')
     def test_that_a_project_is_created_as_expected(self, repo_mock, project_mock):
         """ Test that a project in the dependency is created as expected
         """
-        parse_dependency_string("jenkins_url", self.dependency_string, 'opensearchdependencies-head-metode', jenkins_credentials="user:pass")
-        self.assertTrue(call('jenkins_url', 'dbc-python-head', build_number=1432, jenkins_credentials="user:pass") in project_mock.call_args_list)
+        parse_dependency_string("jenkins_url", self.dependency_string, 'opensearchdependencies-head-metode', jenkins_client=self.client)
+        self.assertTrue(call('jenkins_url', 'dbc-python-head', build_number=1432, jenkins_client=self.client) in project_mock.call_args_list)
 
     @patch('dependency_manager.dependency_list.JenkinsProject')
     @patch('dependency_manager.dependency_list.JenkinsRepositoryProject')
     def test_that_a_repository_project_is_created_as_expected(self, repo_mock, project_mock):
         """ Test that a repository project in the dependency is created as expected
         """
-        parse_dependency_string("jenkins_url", self.dependency_string, 'opensearchdependencies-head-metode')
-        self.assertTrue(call('jenkins_url', 'apache-solr-4.5.0', 'opensearchdependencies-head-metode', build_number=57) in repo_mock.call_args_list)
+        parse_dependency_string("jenkins_url", self.dependency_string, 'opensearchdependencies-head-metode', jenkins_client=self.client)
+        self.assertTrue(call('jenkins_url', 'apache-solr-4.5.0', 'opensearchdependencies-head-metode', build_number=57, jenkins_client=self.client) in repo_mock.call_args_list)
 
     @patch('dependency_manager.dependency_list.JenkinsProject')
     @patch('dependency_manager.dependency_list.JenkinsRepositoryProject')
@@ -56,3 +67,199 @@ class TestDependencyList(unittest.TestCase):
         """ Test whether the expected number of dependendent projects are returned """
         main, projects = parse_dependency_string("jenkins_url", self.dependency_string, 'opensearchdependencies-head-metode')
         self.assertEqual(2, len(projects))
+
+    @patch('dependency_manager.dependency_list.JenkinsProject')
+    @patch('dependency_manager.dependency_list.JenkinsRepositoryProject')
+    def test_that_projects_are_only_created_once_per_registry(self, repo_mock, project_mock):
+        """ Test that parsing the same projects twice reuses the registered projects """
+        registry = ProjectRegistry()
+        first_main, first_projects = parse_dependency_string("jenkins_url", self.dependency_string, 'opensearchdependencies-head-metode', jenkins_client=self.client, registry=registry)
+        second_main, second_projects = parse_dependency_string("jenkins_url/", self.dependency_string, 'opensearchdependencies-head-metode', jenkins_client=self.client, registry=registry)
+
+        self.assertEqual(2, project_mock.call_count)
+        self.assertEqual(1, repo_mock.call_count)
+        self.assertTrue(first_main[0] is second_main[0])
+        self.assertEqual([x[0] for x in first_projects], [x[0] for x in second_projects])
+
+
+class FakeProject(object):
+
+    def __init__(self, name, build_number, dependency_file, scm_info=None):
+        self.name = name
+        self.build_number = build_number
+        self.dependency_file = dependency_file
+        self.scm_info = scm_info
+
+    def get_dependency_file_content(self, dependency_file_name):
+        return self.dependency_file
+
+    def get_scm_info(self):
+        return self.scm_info
+
+    def __eq__(self, other):
+        return self.name == other.name
+
+
+class TestDependencyListUpstreams(unittest.TestCase):
+
+    def setUp(self):
+        self.dependency_files = {'upstream-a': self._dependency_file('upstream-a', 1, [('core', 5)]),
+                                 'upstream-b': self._dependency_file('upstream-b', 2, [('core', 5), ('util', 7)]),
+                                 'upstream-c': None}
+        self.master = Mock()
+        self.master.name = 'master'
+        self.master.info = {'upstreamProjects': []}
+        self.master.get_upstreams = Mock(return_value=['upstream-a', 'upstream-b', 'upstream-c'])
+
+    def _dependency_file(self, name, build_number, dependencies):
+        lines = ["### Project: %s" % name, "### Build: %s" % build_number, ""]
+        for dependency, dependency_build in dependencies:
+            lines += [dependency, "   Added by: %s" % name, "   Build: %s" % dependency_build]
+        return "\n".join(lines) + "\n"
+
+    def _create_project(self, jenkins_url, name, jenkins_client=None, build_number=None):
+        if build_number is None:
+            build_number = {'upstream-a': 1, 'upstream-b': 2, 'upstream-c': 3}[name]
+        return FakeProject(name, build_number, self.dependency_files.get(name))
+
+    def _build(self, max_workers):
+        with patch('dependency_manager.dependency_list.JenkinsProject', side_effect=self._create_project):
+            dependency_list = DependencyList("jenkins_url", self.master, "dependencies.txt", "repository",
+                                             jenkins_client=Mock(), registry=ProjectRegistry(), max_workers=max_workers)
+        return [(x[0].name, x[0].build_number, x[1]) for x in dependency_list.dependencies]
+
+    def test_that_upstreams_are_added_in_order(self):
+        """ Test that upstream projects and their dependencies are added in a deterministic order """
+        expected = [('upstream-a', 1, None), ('upstream-b', 2, None), ('upstream-c', 3, None),
+                    ('core', 5, 'upstream-a'), ('util', 7, 'upstream-b')]
+
+        self.assertEqual(expected, self._build(1))
+
+    def test_that_concurrent_resolution_gives_same_result_as_sequential(self):
+        """ Test that resolving upstreams with several workers gives the sequential result """
+        self.assertEqual(self._build(1), self._build(4))
+
+    def test_that_mismatch_raises_when_resolved_concurrently(self):
+        """ Test that a dependency mismatch is detected when resolving upstreams concurrently """
+        self.dependency_files['upstream-b'] = self._dependency_file('upstream-b', 2, [('core', 6)])
+
+        self.assertRaises(DependencyException, self._build, 4)
+
+    def test_that_last_successful_builds_are_not_kept_between_lists(self):
+        """ Test that lists without a registry do not share projects, so the last successful build is looked up again """
+        with patch('dependency_manager.dependency_list.JenkinsProject', side_effect=self._create_project) as project_mock:
+            first = DependencyList("jenkins_url", self.master, "dependencies.txt", "repository", jenkins_client=Mock())
+            second = DependencyList("jenkins_url", self.master, "dependencies.txt", "repository", jenkins_client=Mock())
+
+        self.assertIsNot(first.registry, second.registry)
+        self.assertIsNot(get_registry(), first.registry)
+        latest = [x[0][1] for x in project_mock.call_args_list if x[1]['build_number'] is None]
+        self.assertEqual(2, latest.count('upstream-a'))
+
+    def test_that_added_projects_are_looked_up_by_name(self):
+        """ Test that get_dependency finds added projects and repeated adds keep the first entry """
+        dependency_list = DependencyList("jenkins_url", self.master, "dependencies.txt", "repository",
+                                         jenkins_client=Mock(), registry=ProjectRegistry(), recursive=False)
+        for number in range(2000):
+            dependency_list.add_dependency(FakeProject('project-%s' % number, number, None), 'master')
+        dependency_list.add_dependency(FakeProject('project-10', 10, None), 'other')
+
+        self.assertEqual(2000, len(dependency_list.dependencies))
+        self.assertEqual(10, dependency_list.get_dependency('project-10').build_number)
+        self.assertEqual('master', dependency_list.dependencies[10][1])
+        self.assertEqual(None, dependency_list.get_dependency('unknown'))
+        self.assertRaises(DependencyException, dependency_list.add_dependency, FakeProject('project-10', 11, None))
+
+
+class TestDependencyListFile(unittest.TestCase):
+
+    def setUp(self):
+        self.test_folder = tempfile.mkdtemp()
+        master = FakeProject('master', 3, None, [('https://svn/master', 10), ('https://svn/master-lib', 11)])
+        self.dependency_list = DependencyList("jenkins_url", master, "dependencies.txt", "repository",
+                                              jenkins_client=Mock(), registry=ProjectRegistry(), recursive=False)
+        self.dependency_list.add_dependency(FakeProject('core', 5, None, [('https://git/core.git', 'origin/master - 0123abcd')]))
+        self.dependency_list.add_dependency(FakeProject('util', 7, None), 'core')
+
+    def tearDown(self):
+        shutil.rmtree(self.test_folder)
+
+    def test_that_tostring_gives_the_expected_entries(self):
+        """ Test that the written entries look as expected """
+        lines = self.dependency_list.tostring().split("\n")
+
+        self.assertEqual(["### Project: master",
+                          "### Build: 3",
+                          "### SVN: https://svn/master         (rev: 10)",
+                          "###      https://svn/master-lib     (rev: 11)",
+                          "",
+                          "core",
+                          "   Added by: master",
+                          "   Build: 5",
+                          "   SVN/GIT: https://git/core.git     (rev: origin/master - 0123abcd)",
+                          "util",
+                          "   Added by: core",
+                          "   Build: 7",
+                          ""], lines[1:])
+
+    def test_that_given_scm_info_is_written_without_asking_the_project(self):
+        """ Test that entries added with version information from a dependency file do not fetch it from the project """
+        project = FakeProject('lib', 9, None)
+        project.get_scm_info = Mock(side_effect=AssertionError("scm info fetched"))
+        self.dependency_list.add_dependency(project, 'core', [('https://svn/lib', 12)])
+
+        lines = self.dependency_list.tostring().split("\n")
+
+        self.assertEqual(["lib",
+                          "   Added by: core",
+                          "   Build: 9",
+                          "   SVN/GIT: https://svn/lib     (rev: 12)",
+                          ""], lines[-5:])
+
+    def test_that_tofile_replaces_existing_file(self):
+        """ Test that tofile replaces an existing file and leaves no temporary file """
+        filename = os.path.join(self.test_folder, "dependencies.txt")
+        with open(filename, 'w') as fh:
+            fh.write("old content")
+
+        self.dependency_list.tofile(filename)
+
+        self.assertEqual(["dependencies.txt"], os.listdir(self.test_folder))
+        with open(filename) as fh:
+            dependency_file = parse_dependency_file(fh.read())
+        self.assertEqual(('master', 3), (dependency_file.name, dependency_file.build_number))
+        self.assertEqual(['core', 'util'], [x.name for x in dependency_file.records])
+
+    def test_that_failing_write_keeps_existing_file(self):
+        """ Test that an error while writing keeps the existing file and removes the temporary file """
+        filename = os.path.join(self.test_folder, "dependencies.txt")
+        with open(filename, 'w') as fh:
+            fh.write("old content")
+        self.dependency_list.add_dependency(FakeProject('broken', 1, None, [None]))
+
+        self.assertRaises(TypeError, self.dependency_list.tofile, filename)
+
+        self.assertEqual(["dependencies.txt"], os.listdir(self.test_folder))
+        with open(filename) as fh:
+            self.assertEqual("old content", fh.read())
+
+
+class TestProjectRegistry(unittest.TestCase):
+
+    def test_factory_is_only_called_once_per_key(self):
+        """ Test that the registry only creates a project once per key """
+        registry = ProjectRegistry()
+        factory = Mock(return_value="project")
+
+        self.assertEqual("project", registry.get_project(("server", "name", 1), factory))
+        self.assertEqual("project", registry.get_project(("server", "name", 1), factory))
+        registry.get_project(("server", "name", 2), factory)
+
+        self.assertEqual(2, factory.call_count)
+
+    def test_failed_creation_is_not_registered(self):
+        """ Test that a factory raising an error does not register the key """
+        registry = ProjectRegistry()
+
+        self.assertRaises(RuntimeError, registry.get_dependency_file, "key", Mock(side_effect=RuntimeError))
+        self.assertEqual([], registry.get_dependency_file("key", Mock(return_value=[])))
@@ -3,15 +3,16 @@
 # -*- mode: python -*-
 import pkg_resources
 import unittest
+from mock import AsyncMock
 from mock import Mock
-from mock import call
+from mock import patch
 import os
 import shutil
 import tempfile
-import urllib.request, urllib.parse, urllib.error
 
 from dependency_manager.dependency_manager import download_artifacts
 from dependency_manager.dependency_manager import build_dependency_file
+from dependency_manager.dependency_manager import main
 from dependency_manager.common import DependencyException
 import dependency_manager.dependency_list
 
@@ -41,7 +42,7 @@ class TestDependencyManager(unittest.TestCase):
         self.assertFalse(os.path.exists(download_folder))
 
         dependency_manager.dependency_manager.parse_dependency_string = Mock(return_value=((main_mock, None), [(project1_mock, None)]))
-        urllib.request.urlretrieve = Mock()
+        dependency_manager.dependency_manager.download_files = Mock()
         download_artifacts(download_folder, ".*", self.depedency_filename, "jenkins_server", "repo_name")
 
         self.assertTrue(os.path.exists(download_folder))
@@ -56,13 +57,13 @@ class TestDependencyManager(unittest.TestCase):
         download_folder = os.path.join(self.test_folder, "download_folder")
 
         dependency_manager.dependency_manager.parse_dependency_string = Mock(return_value=((main_mock, None), [(project1_mock, None)]))
-        urllib.request.urlretrieve = Mock()
+        dependency_manager.dependency_manager.download_files = Mock()
         download_artifacts(download_folder, ".*", self.depedency_filename, "jenkins_server", "repo_name")
 
-        expected_calls = [call('artifact-url-1', os.path.join(download_folder, 'artifact-name-1')),
-                          call('artifact-url-2', os.path.join(download_folder, 'artifact-name-2'))]
+        expected_calls = [('artifact-url-1', os.path.join(download_folder, 'artifact-name-1')),
+                          ('artifact-url-2', os.path.join(download_folder, 'artifact-name-2'))]
 
-        self.assertEqual(expected_calls, urllib.request.urlretrieve.call_args_list)
+        self.assertEqual(expected_calls, dependency_manager.dependency_manager.download_files.call_args[0][0])
 
     def test_download_artifacts_retrieves_artifacts_matching_pattern(self):
         """ Test that the artifacts matching the pattern are retrieved """
@@ -74,12 +75,12 @@ class TestDependencyManager(unittest.TestCase):
         download_folder = os.path.join(self.test_folder, "download_folder")
 
         dependency_manager.dependency_manager.parse_dependency_string = Mock(return_value=((main_mock, None), [(project1_mock, None)]))
-        urllib.request.urlretrieve = Mock()
+        dependency_manager.dependency_manager.download_files = Mock()
         download_artifacts(download_folder, ".*?1.*", self.depedency_filename, "jenkins_server", "repo_name")
 
-        expected_calls = [call('artifact-url-1', os.path.join(download_folder, 'artifact-name-1'))]
+        expected_calls = [('artifact-url-1', os.path.join(download_folder, 'artifact-name-1'))]
 
-        self.assertEqual(expected_calls, urllib.request.urlretrieve.call_args_list)
+        self.assertEqual(expected_calls, dependency_manager.dependency_manager.download_files.call_args[0][0])
 
     def test_dependency_file_is_not_downloaded(self):
         """ Test that dependency file artifact is not downloaded """
@@ -91,22 +92,33 @@ class TestDependencyManager(unittest.TestCase):
         download_folder = os.path.join(self.test_folder, "download_folder")
 
         dependency_manager.dependency_manager.parse_dependency_string = Mock(return_value=((main_mock, None), [(project1_mock, None)]))
-        urllib.request.urlretrieve = Mock()
+        dependency_manager.dependency_manager.download_files = Mock()
 
         download_artifacts(download_folder, ".*", self.depedency_filename, "jenkins_server", "repo_name")
 
-        expected_calls = [call('artifact-url-1', os.path.join(download_folder, 'artifact-name-1')),
-                          call('artifact-url-2', os.path.join(download_folder, 'artifact-name-2'))]
+        expected_calls = [('artifact-url-1', os.path.join(download_folder, 'artifact-name-1')),
+                          ('artifact-url-2', os.path.join(download_folder, 'artifact-name-2'))]
 
-        self.assertEqual(expected_calls, urllib.request.urlretrieve.call_args_list)
+        self.assertEqual(expected_calls, dependency_manager.dependency_manager.download_files.call_args[0][0])
 
     def test_build_is_aborted_if_dependency_mismatch_is_detected(self):
         """ Test that build is aborted if dependency mismatch is detected """
-
-        dependency_manager.dependency_manager.JenkinsProject = Mock()
-        dependency_manager.dependency_manager.JenkinsProject.abort_build = Mock()
-        dependency_manager.dependency_manager.DependencyList = Mock(side_effect=dependency_manager.dependency_manager.DependencyException)
-
-        self.assertRaises(DependencyException, build_dependency_file, "job_name", 12, self.depedency_filename, "jenkins_url", "repo_name")
-        # with self.assertRaises(DependencyException):
-        #     build_dependency_file("job_name", 12, self.depedency_filename, "jenkins_url", "repo_name")
+        project_mock = Mock()
+        with patch('dependency_manager.async_dependency_list.AsyncDependencyResolver.build_dependency_list', AsyncMock(side_effect=DependencyException)), \
+                patch('dependency_manager.async_dependency_list.AsyncDependencyResolver.get_project', AsyncMock(return_value=project_mock)):
+            self.assertRaises(DependencyException, build_dependency_file, "job_name", 12, self.depedency_filename, "jenkins_url", "repo_name", jenkins_client=Mock())
+
+        project_mock.abort_build.assert_called_once_with()
+
+    def test_main_builds_dependency_file(self):
+        """ Test that main builds the dependency file of the master project and build given on the commandline """
+        argv = ['dependency-manager', 'job_name', '5', '--no-cache', '--no-store']
+        dependency_list_mock = Mock()
+        with patch('sys.argv', argv), \
+                patch('dependency_manager.dependency_manager.setup_logger'), \
+                patch('dependency_manager.dependency_manager.JenkinsClient'), \
+                patch('dependency_manager.async_dependency_list.AsyncDependencyResolver.build_dependency_list', AsyncMock(return_value=dependency_list_mock)) as build_mock:
+            main()
+
+        self.assertEqual(('job_name', 5), build_mock.call_args[0])
+        dependency_list_mock.tofile.assert_called_once_with('dependencies.txt')
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -*- mode: python -*-
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from mock import patch
+
+from dependency_manager import git_mirror
+from dependency_manager.git_mirror import GitMirror
+from dependency_manager.git_mirror import parse_git_revision
+
+
+def git(path, *args):
+    command = ['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com', '-c', 'init.defaultBranch=master'] + list(args)
+    return subprocess.check_output(command, cwd=path, universal_newlines=True).strip()
+
+
+class TestGitMirror(unittest.TestCase):
+
+    def setUp(self):
+        self.test_folder = tempfile.mkdtemp()
+        self.remote = os.path.join(self.test_folder, 'remote')
+        os.mkdir(self.remote)
+        git(self.remote, 'init', '--quiet')
+        self.commits = [self.commit('first'), self.commit('second')]
+        self.url = 'file://' + self.remote
+        self.mirror = GitMirror(os.path.join(self.test_folder, 'mirrors'))
+
+    def tearDown(self):
+        shutil.rmtree(self.test_folder)
+
+    def commit(self, message):
+        with open(os.path.join(self.remote, 'file.txt'), 'a') as fh:
+            fh.write(message + '\n')
+        git(self.remote, 'add', 'file.txt')
+        git(self.remote, 'commit', '--quiet', '-m', message)
+        return git(self.remote, 'rev-parse', 'HEAD')
+
+    def test_that_git_revisions_are_parsed(self):
+        """ Test that commit ids are extracted from both git revision formats, and svn revisions are not git revisions """
+        sha = 'a' * 40
+        self.assertEqual(sha, parse_git_revision(sha))
+        self.assertEqual(sha, parse_git_revision('refs/remotes/origin/master - %s' % sha.upper()))
+        self.assertIsNone(parse_git_revision('1234567'))
+        self.assertIsNone(parse_git_revision('NA'))
+        self.assertIsNone(parse_git_revision(None))
+
+    def test_that_log_is_answered_from_mirror(self):
+        """ Test that the log of a commit range is read from the mirror, and later logs do not contact the remote """
+        log = self.mirror.log(self.url, self.commits[0], self.commits[1])
+        self.assertIn('second', log)
+        self.assertNotIn('first', log)
+
+        shutil.move(self.remote, self.remote + '.moved')
+        with patch('dependency_manager.git_mirror.run_git', wraps=git_mirror.run_git) as run_git:
+            self.assertIn('second', self.mirror.log(self.url, self.commits[0], self.commits[1], diff=False))
+            self.assertIn('+second', self.mirror.log(self.url, self.commits[0], self.commits[1], diff=True))
+            self.assertEqual([], [x for x in run_git.call_args_list if x[0][0][0] in ('clone', 'fetch')])
+
+    def test_that_missing_commits_are_fetched(self):
+        """ Test that the mirror is fetched when a requested commit is newer than the mirror """
+        self.mirror.log(self.url, self.commits[0], self.commits[1])
+        third = self.commit('third')
+
+        log = self.mirror.log(self.url, self.commits[1], third)
+
+        self.assertIn('third', log)
+        self.assertNotIn('second', log)
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -*- mode: python -*-
+import unittest
+from mock import Mock
+from requests.auth import HTTPBasicAuth
+
+from dependency_manager.jenkins_client import JenkinsClient
+from dependency_manager.jenkins_client import get_client
+
+
+class TestJenkinsClient(unittest.TestCase):
+
+    def test_credentials_are_resolved_once_for_the_session(self):
+        """ Test that the supplied credentials are used for the whole session """
+        client = JenkinsClient("user:pass")
+
+        self.assertEqual(HTTPBasicAuth("user", "pass"), client.session.auth)
+
+    def test_get_client_returns_the_same_client_for_same_credentials(self):
+        """ Test that get_client shares one client per credentials """
+        self.assertTrue(get_client("user:pass") is get_client("user:pass"))
+        self.assertFalse(get_client("user:pass") is get_client("other:pass"))
+
+    def test_get_json_parses_response_content(self):
+        """ Test that get_json parses the response content as json """
+        client = JenkinsClient("user:pass")
+        response = Mock()
+        response.content = b'{"number": 1, "building": false, "result": null}'
+        client.session.get = Mock(return_value=response)
+
+        self.assertEqual({'number': 1, 'building': False, 'result': None}, client.get_json("url", params={'tree': 'number'}))
+        client.session.get.assert_called_once_with("url", params={'tree': 'number'}, stream=False, headers=None)
+
+    def test_get_json_raises_if_content_is_not_json(self):
+        """ Test that get_json raises if content is not json """
+        client = JenkinsClient("user:pass")
+        response = Mock()
+        response.content = b"<html>"
+        client.session.get = Mock(return_value=response)
+
+        self.assertRaises(RuntimeError, client.get_json, "url")
+
+    def test_responses_are_requested_gzipped(self):
+        """ Test that the session asks for gzip compressed responses """
+        client = JenkinsClient("user:pass")
+
+        self.assertEqual('gzip', client.session.headers['Accept-Encoding'])
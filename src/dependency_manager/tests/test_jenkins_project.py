@@ -5,11 +5,11 @@ from datetime import datetime
 import pkg_resources
 import unittest
 import requests
-from requests.auth import HTTPBasicAuth
 from mock import Mock
-from mock import ANY
 
 from dependency_manager.jenkins_project import JenkinsProject
+from dependency_manager.jenkins_project import is_finished_build
+from dependency_manager.jenkins_project import project_info_query
 
 
 class TestJenkinsProject(unittest.TestCase):
@@ -143,7 +143,9 @@ class TestJenkinsProject(unittest.TestCase):
         JenkinsProject._get_project_info = Mock(return_value=self.project_info)
         JenkinsProject._get_project_config = Mock(return_value=self.project_config)
 
-        jp = JenkinsProject("jenkins_url/", "project_name", build_number=100)
+        client = Mock()
+        client.get_json = Mock(side_effect=RuntimeError)
+        jp = JenkinsProject("jenkins_url/", "project_name", build_number=100, jenkins_client=client)
 
         self.assertRaises(RuntimeError,  jp.get_artifacts)
 
@@ -187,7 +189,9 @@ class TestJenkinsProject(unittest.TestCase):
         JenkinsProject._get_project_info = Mock(return_value=self.project_info)
         JenkinsProject._get_project_config = Mock(return_value=self.project_config)
 
-        jp = JenkinsProject("jenkins_url/", "project_name", build_number=18)
+        client = Mock()
+        client.get_json = Mock(return_value=[x for x in self.project_info['builds'] if x['number'] == 18][0])
+        jp = JenkinsProject("jenkins_url/", "project_name", build_number=18, jenkins_client=client)
 
         now = datetime(2014, 1, 1)
         self.assertEqual(130282, jp.get_seconds_since_build(now))
@@ -249,60 +253,119 @@ class TestJenkinsProject(unittest.TestCase):
 
         self.assertEqual(expected_svn_info, jp.get_svn_info())
 
+    def test_that_nothing_is_retrieved_before_it_is_needed(self):
+        """ Test that neither project information nor configuration is retrieved on creation """
+        JenkinsProject._get_project_info = Mock(return_value=self.project_info)
+        JenkinsProject._get_project_config = Mock(return_value=self.project_config)
 
-    def test_get_dependency_file_content_requests_with_expected_url(self):
-        """ Test that get_dependency_file_content requests and reads the expected url """
+        jp = JenkinsProject("jenkins_url/", "project_name", build_number=20)
+
+        self.assertEqual(20, jp.build_number)
+        self.assertFalse(JenkinsProject._get_project_info.called)
+        self.assertFalse(JenkinsProject._get_project_config.called)
+
+    def test_that_artifacts_are_retrieved_without_configuration(self):
+        """ Test that get_artifacts only retrieves project information """
         JenkinsProject._get_project_info = Mock(return_value=self.project_info)
         JenkinsProject._get_project_config = Mock(return_value=self.project_config)
 
         jp = JenkinsProject("jenkins_url/", "project_name")
+        jp.get_artifacts()
 
-        url_object = Mock()
-        url_object.read = Mock(return_value="DEPENDENCY-FILE CONTENT")
-        requests.get = Mock(return_value=url_object)
+        self.assertEqual(1, JenkinsProject._get_project_info.call_count)
+        self.assertFalse(JenkinsProject._get_project_config.called)
 
-        jp.get_dependency_file_content("dependencies.txt")
-        requests.get.assert_called_once_with('jenkins_url/job/project_name/20/artifact/dependencies.txt')
+    def test_that_a_known_build_is_fetched_by_number(self):
+        """ Test that a build with known number is fetched directly, without project information """
+        JenkinsProject._get_project_info = Mock(return_value=self.project_info)
+        JenkinsProject._get_project_config = Mock(return_value=self.project_config)
 
+        client = Mock()
+        client.get_json = Mock(return_value=self.project_info['builds'][0])
+        jp = JenkinsProject("jenkins_url/", "project_name", build_number=20, jenkins_client=client)
 
-    def test_get_dependency_file_content_do_not_request_if_no_dependency_file_is_among_artifacts(self):
-        """ Test that get_dependency_file_content does not request if no dependency file is located among artifacts"""
+        self.assertEqual(['artifact-c.txt', 'dependencies.txt'], sorted(jp.get_artifacts().keys()))
+        self.assertFalse(JenkinsProject._get_project_info.called)
+        self.assertEqual('jenkins_url/job/project_name/20/api/json', client.get_json.call_args[0][0])
+
+    def test_that_only_finished_builds_are_immutable(self):
+        """ Test that build content is only considered immutable once the build has finished """
+        self.assertTrue(is_finished_build(b'{"number": 20, "building": false}'))
+        self.assertFalse(is_finished_build(b'{"number": 21, "building": true}'))
+        self.assertFalse(is_finished_build(b'<html>'))
+
+    def test_that_scm_info_is_only_looked_up_once(self):
+        """ Test that information and configuration are retrieved once for repeated get_scm_info calls """
         JenkinsProject._get_project_info = Mock(return_value=self.project_info)
         JenkinsProject._get_project_config = Mock(return_value=self.project_config)
 
         jp = JenkinsProject("jenkins_url/", "project_name")
 
-        url_object = Mock()
-        url_object.read = Mock(return_value="DEPENDENCY-FILE CONTENT")
-        requests.get = Mock(return_value=url_object)
+        expected_scm_info = [('https://svn.dbc.dk/repos/new-dependency-manager/trunk', 67541)]
+        self.assertEqual(expected_scm_info, jp.get_scm_info())
+        self.assertEqual(expected_scm_info, jp.get_scm_info())
+        self.assertEqual(1, JenkinsProject._get_project_info.call_count)
+        self.assertEqual(1, JenkinsProject._get_project_config.call_count)
 
-        jp.get_dependency_file_content("dependencies")
-        #self.assertEqual(None, requests.geturllib.request.urlopen.call_args)
+
+    def test_get_dependency_file_content_requests_with_expected_url(self):
+        """ Test that get_dependency_file_content requests and reads the expected url """
+        JenkinsProject._get_project_info = Mock(return_value=self.project_info)
+        JenkinsProject._get_project_config = Mock(return_value=self.project_config)
+
+        client = Mock()
+        client.get_text = Mock(return_value="DEPENDENCY-FILE CONTENT")
+        jp = JenkinsProject("jenkins_url/", "project_name", jenkins_client=client)
+
+        self.assertEqual("DEPENDENCY-FILE CONTENT", jp.get_dependency_file_content("dependencies.txt"))
+        client.get_text.assert_called_once_with('jenkins_url/job/project_name/20/artifact/dependencies.txt', immutable=True)
+
+
+    def test_get_dependency_file_content_do_not_request_if_no_dependency_file_is_among_artifacts(self):
+        """ Test that get_dependency_file_content does not request if no dependency file is located among artifacts"""
+        JenkinsProject._get_project_info = Mock(return_value=self.project_info)
+        JenkinsProject._get_project_config = Mock(return_value=self.project_config)
+
+        client = Mock()
+        jp = JenkinsProject("jenkins_url/", "project_name", jenkins_client=client)
+
+        self.assertEqual(None, jp.get_dependency_file_content("dependencies"))
+        self.assertFalse(client.get_text.called)
 
     def test_that_abort_build_uses_expected_url(self):
         """ Test that abort_build uses the expected url """
         JenkinsProject._get_project_info = Mock(return_value=self.project_info)
         JenkinsProject._get_project_config = Mock(return_value=self.project_config)
 
-        jp = JenkinsProject("jenkins_url/", "project_name", jenkins_credentials=":")
-
         url_object = Mock()
         url_object.status_code = requests.codes.ok
-        requests.get = Mock(return_value=url_object)
+        client = Mock()
+        client.get = Mock(return_value=url_object)
+
+        jp = JenkinsProject("jenkins_url/", "project_name", jenkins_client=client)
 
         jp.abort_build()
 
-        requests.get.assert_called_once_with('jenkins_url/job/project_name/20/stop', auth=ANY)
+        client.get.assert_called_once_with('jenkins_url/job/project_name/20/stop')
 
     def test_that_abort_build_throws_error_if_return_code_is_different_from_200(self):
         """ Test that abort_build raises error if return code is different from 200 """
         JenkinsProject._get_project_info = Mock(return_value=self.project_info)
         JenkinsProject._get_project_config = Mock(return_value=self.project_config)
 
-        jp = JenkinsProject("jenkins_url/", "project_name")
-
         url_object = Mock()
         url_object.status_code = requests.codes.not_found
-        requests.get = Mock(return_value=url_object)
+        client = Mock()
+        client.get = Mock(return_value=url_object)
+
+        jp = JenkinsProject("jenkins_url/", "project_name", jenkins_client=client)
 
         self.assertRaises(RuntimeError, jp.abort_build)
+
+    def test_that_project_information_is_queried_with_tree_filter(self):
+        """ Test that project information is requested from the json api with a tree filter """
+        url, params = project_info_query("jenkins_url/", "project_name")
+
+        self.assertEqual("jenkins_url/job/project_name/api/json", url)
+        self.assertTrue(params['tree'].startswith("lastSuccessfulBuild[number],lastStableBuild[number],upstreamProjects[name],builds["))
+        self.assertTrue(params['tree'].endswith("]{0,100}"))
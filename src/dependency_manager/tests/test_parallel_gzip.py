@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -*- mode: python -*-
+import gzip
+import hashlib
+import io
+import os
+import unittest
+
+from dependency_manager.parallel_gzip import ParallelGzipWriter
+
+
+class TestParallelGzipWriter(unittest.TestCase):
+
+    def compress(self, chunks, **kwargs):
+        output = io.BytesIO()
+        with ParallelGzipWriter(output, **kwargs) as writer:
+            for chunk in chunks:
+                writer.write(chunk)
+        return output.getvalue(), writer
+
+    def test_that_output_is_gzip_of_written_data(self):
+        """ Test that data written across many blocks decompresses to the written data """
+        data = os.urandom(50000) + b'repeated content ' * 20000
+        chunks = [data[x:x + 7000] for x in range(0, len(data), 7000)]
+
+        compressed, writer = self.compress(chunks, threads=4, block_size=16 * 1024)
+
+        self.assertEqual(data, gzip.decompress(compressed))
+
+    def test_that_empty_output_is_valid_gzip(self):
+        """ Test that closing writer without data gives a valid empty gzip file """
+        compressed, writer = self.compress([])
+
+        self.assertEqual(b'', gzip.decompress(compressed))
+
+    def test_that_md5_is_computed_on_compressed_output(self):
+        """ Test that md5 sum of writer is the md5 sum of the written gzip file """
+        compressed, writer = self.compress([b'content'] * 1000, threads=2, block_size=1024, level=9)
+
+        self.assertEqual(hashlib.md5(compressed).hexdigest(), writer.md5.hexdigest())
+
+    def test_that_previous_block_is_used_as_dictionary(self):
+        """ Test that repeated content across blocks compresses as well as in a single block """
+        data = os.urandom(8 * 1024) * 8
+
+        compressed, writer = self.compress([data], threads=4, block_size=8 * 1024)
+
+        self.assertLess(len(compressed), 2 * 8 * 1024)
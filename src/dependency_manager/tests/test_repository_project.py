@@ -2,10 +2,14 @@
 # -*- coding: utf-8 -*-
 # -*- mode: python -*-
 import pkg_resources
+import re
 import unittest
 from mock import Mock
 
 from dependency_manager.repository_project import JenkinsRepositoryProject
+from dependency_manager.repository_project import RepositoryIndex
+from dependency_manager.repository_project import get_repository_index
+from dependency_manager.jenkins_project import is_finished_build
 
 
 class TestRepositoryProject(unittest.TestCase):
@@ -21,13 +25,22 @@ class TestRepositoryProject(unittest.TestCase):
         with open(project_config_filename) as fh:
             self.project_config = fh.read()
 
+        self.client = Mock()
+        self.client.get_json = Mock(side_effect=self.get_json)
+
+    def get_json(self, url, params=None, immutable=False):
+        match = re.search(r'/(\d+)/api/json$', url)
+        if match is None:
+            return self.project_info
+        return [x for x in self.project_info['builds'] if x['number'] == int(match.group(1))][0]
+
     def test_url_without_slash_looks_as_expected(self):
         """ Test that jenkins_url without slash looks as expected """
         JenkinsRepositoryProject._get_project_info = Mock(return_value=self.project_info)
         JenkinsRepositoryProject._get_project_config = Mock(return_value=self.project_config)
         JenkinsRepositoryProject.get_last_successful_build = Mock(return_value=57)
 
-        jp = JenkinsRepositoryProject("jenkins_url", "apache-solr-4.4.0", "repository_name")
+        jp = JenkinsRepositoryProject("jenkins_url", "apache-solr-4.4.0", "repository_name", jenkins_client=self.client)
 
         self.assertEqual("jenkins_url/", jp.url)
 
@@ -37,7 +50,7 @@ class TestRepositoryProject(unittest.TestCase):
         JenkinsRepositoryProject._get_project_config = Mock(return_value=self.project_config)
         JenkinsRepositoryProject.get_last_successful_build = Mock(return_value=57)
 
-        jp = JenkinsRepositoryProject("jenkins_url/", "apache-solr-4.4.0", "repository_name")
+        jp = JenkinsRepositoryProject("jenkins_url/", "apache-solr-4.4.0", "repository_name", jenkins_client=self.client)
 
         self.assertEqual("jenkins_url/", jp.url)
 
@@ -48,9 +61,9 @@ class TestRepositoryProject(unittest.TestCase):
         JenkinsRepositoryProject._get_project_config = Mock(return_value=self.project_config)
         JenkinsRepositoryProject.get_last_successful_build = Mock(return_value=57)
 
-        self.assertRaises(RuntimeError, JenkinsRepositoryProject, "jenkins_url/", "non-existing-artifact", "repository_name")
+        self.assertRaises(RuntimeError, JenkinsRepositoryProject, "jenkins_url/", "non-existing-artifact", "repository_name", jenkins_client=self.client)
         # with self.assertRaises(RuntimeError):
-        #     jp = JenkinsRepositoryProject("jenkins_url/", "non-existing-artifact", "repository_name")
+        #     jp = JenkinsRepositoryProject("jenkins_url/", "non-existing-artifact", "repository_name", jenkins_client=self.client)
 
     def test_build_number_looks_as_expected_if_supplied(self):
         """ Test that build number looks as expected if supplied """
@@ -58,7 +71,7 @@ class TestRepositoryProject(unittest.TestCase):
         JenkinsRepositoryProject._get_project_config = Mock(return_value=self.project_config)
         JenkinsRepositoryProject.get_last_successful_build = Mock(return_value=57)
 
-        jp = JenkinsRepositoryProject("jenkins_url/", "apache-solr-1.4.1", "repository_name", build_number=56)
+        jp = JenkinsRepositoryProject("jenkins_url/", "apache-solr-1.4.1", "repository_name", build_number=56, jenkins_client=self.client)
 
         self.assertEqual(56, jp.build_number)
 
@@ -67,7 +80,7 @@ class TestRepositoryProject(unittest.TestCase):
         JenkinsRepositoryProject._get_project_info = Mock(return_value=self.project_info)
         JenkinsRepositoryProject._get_project_config = Mock(return_value=self.project_config)
 
-        jp = JenkinsRepositoryProject("jenkins_url/", "apache-solr-1.4.1", "repository_name")
+        jp = JenkinsRepositoryProject("jenkins_url/", "apache-solr-1.4.1", "repository_name", jenkins_client=self.client)
 
         self.assertEqual(57, jp.build_number)
 
@@ -76,7 +89,7 @@ class TestRepositoryProject(unittest.TestCase):
         JenkinsRepositoryProject._get_project_info = Mock(return_value=self.project_info)
         JenkinsRepositoryProject._get_project_config = Mock(return_value=self.project_config)
 
-        jp = JenkinsRepositoryProject("jenkins_url/", "apache-solr-1.4.1", "repository_name")
+        jp = JenkinsRepositoryProject("jenkins_url/", "apache-solr-1.4.1", "repository_name", jenkins_client=self.client)
 
         self.assertEqual(57, jp.get_last_successful_build())
 
@@ -85,7 +98,7 @@ class TestRepositoryProject(unittest.TestCase):
         JenkinsRepositoryProject._get_project_info = Mock(return_value=self.project_info)
         JenkinsRepositoryProject._get_project_config = Mock(return_value=self.project_config)
 
-        jp = JenkinsRepositoryProject("jenkins_url/", "apache-solr-1.4.1", "repository_name")
+        jp = JenkinsRepositoryProject("jenkins_url/", "apache-solr-1.4.1", "repository_name", jenkins_client=self.client)
 
         expected_artifact_dict = {'apache-solr-1.4.1.zip.md5': 'jenkins_url/job/repository_name/57/artifact/trunk/ARTIFACTS/apache-solr-1.4.1/apache-solr-1.4.1.zip.md5',
                                   'apache-solr-1.4.1.zip': 'jenkins_url/job/repository_name/57/artifact/trunk/ARTIFACTS/apache-solr-1.4.1/apache-solr-1.4.1.zip'}
@@ -97,7 +110,7 @@ class TestRepositoryProject(unittest.TestCase):
         JenkinsRepositoryProject._get_project_info = Mock(return_value=self.project_info)
         JenkinsRepositoryProject._get_project_config = Mock(return_value=self.project_config)
 
-        jp = JenkinsRepositoryProject("jenkins_url/", "apache-solr-1.4.1", "repository_name")
+        jp = JenkinsRepositoryProject("jenkins_url/", "apache-solr-1.4.1", "repository_name", jenkins_client=self.client)
 
         self.assertEqual([], jp.get_upstreams())
 
@@ -106,7 +119,7 @@ class TestRepositoryProject(unittest.TestCase):
         JenkinsRepositoryProject._get_project_info = Mock(return_value=self.project_info)
         JenkinsRepositoryProject._get_project_config = Mock(return_value=self.project_config)
 
-        jp = JenkinsRepositoryProject("jenkins_url/", "apache-solr-1.4.1", "repository_name")
+        jp = JenkinsRepositoryProject("jenkins_url/", "apache-solr-1.4.1", "repository_name", jenkins_client=self.client)
 
         self.assertEqual([('repository_name', 'NA')], jp.get_scm_info())
 
@@ -115,6 +128,54 @@ class TestRepositoryProject(unittest.TestCase):
         JenkinsRepositoryProject._get_project_info = Mock(return_value=self.project_info)
         JenkinsRepositoryProject._get_project_config = Mock(return_value=self.project_config)
 
-        jp = JenkinsRepositoryProject("jenkins_url/", "apache-solr-1.4.1", "repository_name")
+        jp = JenkinsRepositoryProject("jenkins_url/", "apache-solr-1.4.1", "repository_name", jenkins_client=self.client)
 
         self.assertEqual(None, jp.get_dependency_file_content())
+
+    def test_that_repository_index_fetches_info_once(self):
+        """ Test that the repository information is fetched once for all accesses """
+        client = Mock()
+        client.get_json = Mock(return_value=self.project_info)
+        index = RepositoryIndex("jenkins_url/", "repository_name", client)
+
+        self.assertEqual(57, index.info['lastSuccessfulBuild']['number'])
+        self.assertEqual(57, index.info['lastSuccessfulBuild']['number'])
+        self.assertEqual(1, client.get_json.call_count)
+
+    def test_that_repository_index_parses_each_build_once(self):
+        """ Test that the artifacts of a build are parsed once and shared by all artifacts of the build """
+        build = [x for x in self.project_info['builds'] if x['number'] == 57][0]
+        load_build = Mock(return_value=build)
+        index = RepositoryIndex("jenkins_url/", "repository_name", Mock())
+
+        artifacts = index.get_artifacts(57, load_build)
+
+        self.assertIs(artifacts, index.get_artifacts(57, load_build))
+        self.assertEqual(1, load_build.call_count)
+        self.assertEqual(('apache-solr-1.4.1.zip', 'jenkins_url/job/repository_name/57/artifact/trunk/ARTIFACTS/apache-solr-1.4.1/apache-solr-1.4.1.zip'),
+                         artifacts['apache-solr-1.4.1']['artifact'])
+
+    def test_that_repository_projects_share_index(self):
+        """ Test that repository projects of the same repository and client use the same index """
+        first = JenkinsRepositoryProject("jenkins_url/", "apache-solr-1.4.1", "repository_name", build_number=57, jenkins_client=self.client)
+        second = JenkinsRepositoryProject("jenkins_url", "apache-solr-4.4.0", "repository_name", build_number=57, jenkins_client=self.client)
+
+        self.assertIs(first.index, second.index)
+        self.assertIs(first.index, get_repository_index("jenkins_url/", "repository_name", self.client))
+
+    def test_that_known_build_is_fetched_by_number(self):
+        """ Test that a repository build with a known number is fetched by number without the repository information """
+        jp = JenkinsRepositoryProject("jenkins_url/", "apache-solr-1.4.1", "repository_name", build_number=56, jenkins_client=self.client)
+
+        self.assertEqual(56, jp.build_number)
+        self.assertEqual(['jenkins_url/job/repository_name/56/api/json'], [x[0][0] for x in self.client.get_json.call_args_list])
+
+    def test_that_repository_index_caches_builds_as_immutable(self):
+        """ Test that the index fetches a build by its number, cached as immutable when finished """
+        index = RepositoryIndex("jenkins_url/", "repository_name", self.client)
+
+        artifacts = index.get_artifacts(56)
+
+        self.assertIn('apache-solr-1.4.1', artifacts)
+        self.assertEqual('jenkins_url/job/repository_name/56/api/json', self.client.get_json.call_args[0][0])
+        self.assertIs(is_finished_build, self.client.get_json.call_args[1]['immutable'])
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -*- mode: python -*-
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from mock import Mock
+
+from dependency_manager.jenkins_client import JenkinsClient
+from dependency_manager.response_cache import ResponseCache
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_folder)
+
+    def _response(self, status_code, content=b'', headers=None):
+        response = Mock()
+        response.status_code = status_code
+        response.content = content
+        response.headers = headers or {}
+        return response
+
+    def test_stored_content_is_returned(self):
+        """ Test that stored content is returned, also by a new cache instance """
+        ResponseCache(self.cache_folder).put("key", b"content", immutable=True)
+
+        entry = ResponseCache(self.cache_folder).get("key")
+        self.assertEqual(b"content", entry.content)
+        self.assertTrue(entry.immutable)
+
+    def test_unknown_key_returns_none(self):
+        """ Test that get returns None for unknown keys """
+        self.assertEqual(None, ResponseCache(self.cache_folder).get("key"))
+
+    def test_mutable_entries_expire_after_ttl(self):
+        """ Test that mutable entries are only fresh within the ttl, and immutable entries always are """
+        cache = ResponseCache(self.cache_folder, ttl=60)
+        cache.put("mutable", b"content")
+        cache.put("immutable", b"content", immutable=True)
+
+        self.assertTrue(cache.is_fresh(cache.get("mutable")))
+
+        stale = cache.get("mutable")._replace(stored=time.time() - 120)
+        self.assertFalse(cache.is_fresh(stale))
+        self.assertTrue(cache.is_fresh(cache.get("immutable")._replace(stored=time.time() - 120)))
+
+    def test_mutable_entries_without_validators_are_not_stored_by_default(self):
+        """ Test that job level data is requested again on every use by default, unless it can be revalidated """
+        client = JenkinsClient("user:pass", cache=ResponseCache(self.cache_folder))
+        client.session.get = Mock(return_value=self._response(200, b"content"))
+
+        self.assertEqual(b"content", client.get_content("url"))
+        self.assertEqual(b"content", client.get_content("url"))
+        self.assertEqual(2, client.session.get.call_count)
+        self.assertEqual(None, client.cache.get("url"))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        """ Test that the least recently used entry is evicted when the size cap is exceeded """
+        cache = ResponseCache(self.cache_folder, max_size=10, ttl=60)
+        cache.put("a", b"aaaa")
+        cache.put("b", b"bbbb")
+        body_a, meta_a = cache._paths("a")
+        body_b, meta_b = cache._paths("b")
+        os.utime(body_a, (1000, 1000))
+        os.utime(body_b, (2000, 2000))
+
+        cache.put("c", b"cccc")
+
+        self.assertEqual(None, cache.get("a"))
+        self.assertEqual(b"bbbb", cache.get("b").content)
+        self.assertEqual(b"cccc", cache.get("c").content)
+
+    def test_client_uses_fresh_entries_without_request(self):
+        """ Test that the client does not request url if a fresh entry is cached """
+        client = JenkinsClient("user:pass", cache=ResponseCache(self.cache_folder))
+        client.session.get = Mock(return_value=self._response(200, b"content"))
+
+        self.assertEqual(b"content", client.get_content("url", immutable=True))
+        self.assertEqual(b"content", client.get_content("url", immutable=True))
+        self.assertEqual(1, client.session.get.call_count)
+
+    def test_client_revalidates_stale_entries(self):
+        """ Test that the client revalidates stale entries with the stored etag """
+        client = JenkinsClient("user:pass", cache=ResponseCache(self.cache_folder, ttl=0))
+        client.session.get = Mock(return_value=self._response(200, b"content", {'ETag': '"1"'}))
+        client.get_content("url", params={'depth': 1})
+
+        client.session.get = Mock(return_value=self._response(304))
+        self.assertEqual(b"content", client.get_content("url", params={'depth': 1}))
+        client.session.get.assert_called_once_with("url", params={'depth': 1}, stream=False, headers={'If-None-Match': '"1"'})
+
+    def test_client_does_not_cache_failed_responses(self):
+        """ Test that responses with an error status are not cached """
+        client = JenkinsClient("user:pass", cache=ResponseCache(self.cache_folder))
+        client.session.get = Mock(return_value=self._response(404, b"not found"))
+        client.get_content("url", immutable=True)
+        client.get_content("url", immutable=True)
+
+        self.assertEqual(2, client.session.get.call_count)